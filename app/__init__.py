@@ -1,42 +1,66 @@
 from flask import Flask
 import app.extensions as extensions
 from app.config import Config
-import os
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
     # db = SQLAlchemy(app)
+    from app.general_helpers.database import init_database_profile, init_read_replicas
+    init_database_profile(app)
+    init_read_replicas(app)
     extensions.db.init_app(app)
     extensions.ckeditor.init_app(app)
     extensions.login_manager.init_app(app)
+    extensions.page_cache.init_app(app)
+    extensions.compression.init_app(app)
+
+    from app.account.identity import init_identity_cache
+    init_identity_cache(app)
+
+    from app.models.counters import init_stats_counters
+    init_stats_counters(app)
+
+    from app.general_helpers.mailer import init_outbox
+    init_outbox(app)
+
+    from app.general_helpers.images import init_images
+    init_images(app)
+
+    from app.general_helpers.static_assets import init_static_assets
+    init_static_assets(app)
+
+    from app.general_helpers.rendering import init_rendering
+    init_rendering(app)
+
+    # csrf_token() for the forms written by hand in the templates (the FlaskForms render their own token)
+    from flask_wtf.csrf import generate_csrf
+    app.jinja_env.globals["csrf_token"] = generate_csrf
+
+    from app.general_helpers.metrics import init_metrics
+    init_metrics(app)
+
+    from app.general_helpers.slow_queries import init_slow_query_log
+    init_slow_query_log(app)
 
     from app.account.routes import account
     from app.dashboard.routes import dashboard
     from app.website.routes import website
     from app.error_handlers.routes import error_handler
-    from config import Config
-    from flask import current_app
 
-    from app.models import user, posts, themes, contact, bookmarks, comments, stats
+    from app.models import user, posts, themes, contact, bookmarks, comments, stats, outbox
 
     app.register_blueprint(account)
     app.register_blueprint(dashboard)
     app.register_blueprint(website)
     app.register_blueprint(error_handler)
 
+    from app.commands import register_commands
+    register_commands(app)
+
     @app.route('/test/')
     def test_page():
         return '<h1> Testing the App </h1>'
 
-    ABS_PATH = os.path.dirname(__file__)
-    REL_PATH = "static"
-
-    STATIC_PATH = repr(str(app.config["STATIC_FOLDER"]))
-    
-    @app.route("/../static/<filename>")
-    def static_path():
-        pass
-
     return app
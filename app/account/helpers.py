@@ -1,10 +1,39 @@
 from flask import current_app
-from werkzeug.security import generate_password_hash  # Used in signup
+from werkzeug.security import generate_password_hash, check_password_hash  # Used in signup and login
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+# Password hashing
+# Hashing and checking a password is deliberately slow (PASSWORD_HASH_ITERATIONS rounds of PBKDF2). It runs in a small
+# pool of PASSWORD_HASH_WORKERS threads: PBKDF2 releases the GIL while it works, so a burst of logins or signups uses
+# at most that many CPUs and the other requests of the worker keep being served.
+# Hashes made with older settings are upgraded when their owner logs in (see needs_rehash).
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=current_app.config.get("PASSWORD_HASH_WORKERS", 2),
+                                       thread_name_prefix="password-hash")
+        return _pool
+
+
+def _hash_method():
+    return f"pbkdf2:sha256:{current_app.config.get('PASSWORD_HASH_ITERATIONS', 600000)}"
+
+
+def _salt_length():
+    return current_app.config.get("PASSWORD_SALT_LENGTH", 16)
+
 
 # Helper function to hash and salt passwords
 def hash_password(password):
     """
-    Hashes and salts the given password using PBKDF2 algorithm with SHA256.
+    Hashes and salts the given password using PBKDF2 algorithm with SHA256, in the hashing pool.
 
     Args:
         password (str): The password to be hashed and salted.
@@ -12,8 +41,37 @@ def hash_password(password):
     Returns:
         str: The hashed and salted password.
     """
-    return generate_password_hash(
-        password,
-        method="pbkdf2:sha256",
-        salt_length=8
-    )
+    return _get_pool().submit(generate_password_hash, password, _hash_method(), _salt_length()).result()
+
+
+def hash_passwords(passwords):
+    """
+    Hashes a list of passwords in parallel in the hashing pool (e.g. when creating the seed accounts).
+
+    Returns:
+        list: The hashed passwords, in the same order.
+    """
+    method = _hash_method()
+    salt_length = _salt_length()
+    futures = [_get_pool().submit(generate_password_hash, password, method, salt_length) for password in passwords]
+    return [future.result() for future in futures]
+
+
+def verify_password(password_hash, password):
+    """
+    Checks a password against its hash, in the hashing pool.
+
+    Returns:
+        bool: True if the password is correct.
+    """
+    return _get_pool().submit(check_password_hash, password_hash, password).result()
+
+
+def needs_rehash(password_hash):
+    """
+    Whether a hash was made with other settings than the current ones (method, number of iterations or salt length),
+    e.g. "pbkdf2:sha256" hashes with an 8 characters salt made by earlier versions of the blog.
+    """
+    method, _, rest = password_hash.partition("$")
+    salt = rest.partition("$")[0]
+    return method != _hash_method() or len(salt) != _salt_length()
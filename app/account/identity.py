@@ -0,0 +1,103 @@
+from app.extensions import db
+from app.models.user import Blog_User
+from app.general_helpers.page_cache import LRU_Cache_Backend
+from flask_login import UserMixin
+from sqlalchemy import event
+
+# Identity cache for Flask-Login
+# The user_loader runs on every request of a logged-in user (pages, but also every like, bookmark and comment call).
+# Instead of loading the whole Blog_User row each time, it returns a User_Identity holding the few columns the
+# pages use (id, name, type, blocked, picture), kept per worker in an LRU cache for IDENTITY_CACHE_TTL seconds.
+#   - Any other attribute (email, about, ...) loads the Blog_User row on first use, so current_user works as before.
+#   - Blocked users get no identity: they are logged out.
+#   - Committing a change to (or the deletion of) a Blog_User drops its identity from the cache of this worker at
+#     once (see _forget_changed_users); the other workers see the change within IDENTITY_CACHE_TTL seconds at most.
+
+IDENTITY_FIELDS = ("id", "name", "type", "blocked", "picture")
+
+_identities = LRU_Cache_Backend(1024)
+_ttl = 30
+
+
+class User_Identity(UserMixin):
+    """
+    Lightweight stand-in for Blog_User, used as current_user.
+    """
+
+    def __init__(self, id, name, type, blocked, picture):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.blocked = blocked
+        self.picture = picture
+
+    @property
+    def is_active(self):
+        return not self.blocked
+
+    def __getattr__(self, name):
+        # only called for the attributes which are not part of the identity
+        if name.startswith("_"):
+            raise AttributeError(name)
+        user = self.__dict__.get("_user")
+        if user is None:
+            user = self.__dict__["_user"] = db.session.get(Blog_User, self.id)
+        return getattr(user, name)
+
+    def __repr__(self):
+        return f"<User identity: {self.id} {self.name}>"
+
+
+def load_identity(user_id):
+    """
+    Returns the User_Identity of an active user, from the cache if possible, or None if the user doesn't exist or
+    is blocked.
+    """
+    values = _identities.get(user_id)
+    if values is None:
+        values = db.session.query(*[getattr(Blog_User, field) for field in IDENTITY_FIELDS]).filter(
+            Blog_User.id == user_id).first()
+        if values is None:
+            return None
+        values = tuple(values)
+        _identities.set(user_id, values, _ttl)
+
+    # a new object per request: the lazily loaded Blog_User belongs to this request's session
+    identity = User_Identity(*values)
+    return identity if identity.is_active else None
+
+
+def invalidate_identity(user_id):
+    """
+    Drops a user's identity from the cache of this worker.
+    """
+    _identities.delete(user_id)
+
+
+def _collect_changed_users(session, flush_context, instances):
+    changed = session.info.setdefault("changed_user_ids", set())
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Blog_User) and instance.id is not None:
+            changed.add(instance.id)
+
+
+def _forget_changed_users(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        invalidate_identity(user_id)
+
+
+def _discard_changed_users(session):
+    session.info.pop("changed_user_ids", None)
+
+
+def init_identity_cache(app):
+    global _identities, _ttl
+    app.config.setdefault("IDENTITY_CACHE_MAX_ENTRIES", 1024)
+    app.config.setdefault("IDENTITY_CACHE_TTL", 30)
+    _identities = LRU_Cache_Backend(app.config["IDENTITY_CACHE_MAX_ENTRIES"])
+    _ttl = app.config["IDENTITY_CACHE_TTL"]
+
+    if not event.contains(db.session, "before_flush", _collect_changed_users):
+        event.listen(db.session, "before_flush", _collect_changed_users)
+        event.listen(db.session, "after_commit", _forget_changed_users)
+        event.listen(db.session, "after_rollback", _discard_changed_users)
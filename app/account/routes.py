@@ -2,18 +2,22 @@ from flask import Blueprint, render_template, request, redirect, flash, url_for,
 from app.extensions import db, login_manager
 from app.models.user import Blog_User
 from app.models.posts import Blog_Posts
-from app.account.forms import The_Accounts
+from app.account.forms import AccountInformationForm
 from app.models.stats import Blog_Stats
 from app.models.bookmarks import Blog_Bookmarks
 from app.models.likes import Blog_Likes
 from app.models.comments import Blog_Comments, Blog_Replies
-from app.account.helpers import hash_password
-from app.models.helpers import update_stats_users_total, update_stats_users_active, delete_comment, delete_reply, change_authorship_of_all_post, update_bookmarks, update_likes
+from app.account.helpers import hash_password, verify_password, needs_rehash
+from app.account.identity import load_identity
+from app.models.helpers import update_stats_users_total, update_stats_users_active, delete_comment, delete_reply, delete_post, change_authorship_of_all_post, update_bookmarks, update_likes
 from app.general_helpers.helpers import check_image_filename
+from app.general_helpers.page_cache import bump_content_version
+from app.general_helpers.images import queue_derivatives, delete_derivatives
+from app.dashboard.tables import USERS_TABLE
 from flask_login import login_user, login_required, current_user, logout_user
-from werkzeug.security import check_password_hash  # Used in login
 from werkzeug.utils import secure_filename
 from sqlalchemy import desc
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 import uuid as uuid
 import os
@@ -27,7 +31,8 @@ account = Blueprint('account', __name__)
 # LOGIN, SIGN UP, LOG OUT
 @login_manager.user_loader
 def load_user(user_id):
-    return Blog_User.query.get(int(user_id))
+    # lightweight identity, cached per worker (see account/identity.py)
+    return load_identity(int(user_id))
 
 @account.route("/signup", methods=["GET", "POST"])
 def signup():
@@ -45,9 +50,9 @@ def signup():
             type="user"
         )
         db.session.add(new_user)
-        db.session.commit()
         update_stats_users_total()
         update_stats_users_active(1)
+        db.session.commit()
 
         login_user(new_user)
 
@@ -66,15 +71,19 @@ def login():
             flash("This email does not exist in our database.")
             return redirect(url_for("account.login"))
         # wrong password:
-        elif not check_password_hash(the_user.password, password):
+        elif not verify_password(the_user.password, password):
             flash("Incorrect password, please try again.")
             return redirect(url_for("account.login"))
         # user is blocked:
-        elif the_user.blocked == "TRUE":
+        elif the_user.blocked:
             flash("Your account has been blocked. Please contact us for more information")
             return redirect(url_for("account.login"))
         # email exists and password is correct:
         else:
+            # upgrade hashes made with older settings while the plain password is at hand
+            if needs_rehash(the_user.password):
+                the_user.password = hash_password(password)
+                db.session.commit()
             login_user(the_user)
             return redirect(url_for('account.dashboard'))
     return render_template("account/login.html", logged_in=current_user.is_authenticated)
@@ -93,20 +102,24 @@ def logout():
 @login_required
 def dashboard():
     if current_user.type == "user":
+        # the authors (and the bookmarked posts) are loaded with the rows, not one by one by the template
         latest_posts = db.session.query(Blog_Posts).filter(
-            Blog_Posts.admin_approved == "TRUE", Blog_Posts.date_to_post <= datetime.utcnow()).order_by(desc(Blog_Posts.date_to_post)).limit(3)
-        latest_bookmarks = Blog_Bookmarks.query.filter_by(user_id=current_user.id).limit(9)
+            Blog_Posts.admin_approved == db.true(), Blog_Posts.date_to_post <= datetime.utcnow()).order_by(desc(Blog_Posts.date_to_post)).limit(3).options(
+            selectinload(Blog_Posts.author))
+        latest_bookmarks = Blog_Bookmarks.query.filter_by(user_id=current_user.id).limit(9).options(
+            selectinload(Blog_Bookmarks.post).selectinload(Blog_Posts.author))
         if latest_bookmarks.count() == 0:
             latest_bookmarks = None
         return render_template('account/dashboard_user.html', name=current_user.name, logged_in=True, latest_posts=latest_posts, latest_bookmarks=latest_bookmarks)
     elif current_user.type == "author":
-        posts_pending_admin = Blog_Posts.query.filter(Blog_Posts.admin_approved == "FALSE").filter(
-            Blog_Posts.author_id == current_user.id).all()
+        posts_pending_admin = Blog_Posts.query.filter(Blog_Posts.admin_approved == db.false()).filter(
+            Blog_Posts.author_id == current_user.id).options(selectinload(Blog_Posts.theme_group)).all()
         return render_template('account/dashboard_author_dash.html', name=current_user.name, logged_in=True, posts_pending_admin=posts_pending_admin)
     else:
         current_stats = Blog_Stats.query.get_or_404(1)
-        posts_pending_approval = Blog_Posts.query.filter_by(
-            admin_approved="FALSE").all()
+        posts_pending_approval = Blog_Posts.query.filter(
+            Blog_Posts.admin_approved == db.false()).options(
+            selectinload(Blog_Posts.theme_group), selectinload(Blog_Posts.author)).all()
         return render_template('account/dashboard_admin_dash.html', name=current_user.name, logged_in=True, posts_pending_approval=posts_pending_approval, current_stats=current_stats)
 
 # ***********************************************************************************************
@@ -122,7 +135,7 @@ def manage_acct():
 @account.route("/dashboard/manage_account/update/<int:id>", methods=["GET", "POST"])
 @login_required
 def update_own_acct_info(id):
-    form = The_Accounts()
+    form = AccountInformationForm()
     user_at_hand = Blog_User.query.get_or_404(id)
 
     if form.validate_on_submit():
@@ -132,6 +145,7 @@ def update_own_acct_info(id):
 
         try:
             db.session.commit()
+            bump_content_version("users")
             flash("Account information updated successfully!")
             return redirect(url_for('account.manage_acct'))
         except:
@@ -148,7 +162,7 @@ def update_own_acct_info(id):
 @account.route("/dashboard/manage_account/update_picture/<int:id>", methods=["GET", "POST"])
 @login_required
 def update_own_acct_picture(id):
-    form = The_Accounts()
+    form = AccountInformationForm()
     user_at_hand = Blog_User.query.get_or_404(id)
     if user_at_hand.picture == "" or user_at_hand.picture == "Picture_default.jpg":
         profile_picture = None
@@ -179,8 +193,12 @@ def update_own_acct_picture(id):
             if profile_picture != None and os.path.exists(os.path.join(current_app.config["PROFILE_IMG_FOLDER"], profile_picture)):
                 os.remove(os.path.join(
                     current_app.config["PROFILE_IMG_FOLDER"], profile_picture))
+                delete_derivatives("users", profile_picture)
 
             db.session.commit()
+            # resized copies are generated in the background, the pages use the original until they are ready
+            queue_derivatives("users", pic_filename_unique)
+            bump_content_version("users")
             flash("Picture updated successfully!")
             return redirect(url_for('account.manage_acct'))
         except:
@@ -242,11 +260,13 @@ def delete_own_acct(id):
                 if user_at_hand.picture != "" and user_at_hand.picture != "Picture_default.jpg" and os.path.exists(os.path.join(current_app.config["PROFILE_IMG_FOLDER"], user_at_hand.picture)):
                     os.remove(os.path.join(
                         current_app.config["PROFILE_IMG_FOLDER"], user_at_hand.picture))
+                    delete_derivatives("users", user_at_hand.picture)
 
                 # delete the user
                 db.session.delete(user_at_hand)
-                db.session.commit()
                 update_stats_users_active(-1)
+                db.session.commit()
+                bump_content_version("users", "posts")
 
                 flash("Account has been successfully deleted. We'll miss you!")
                 return redirect(url_for('website.home'))
@@ -262,9 +282,10 @@ def delete_own_acct(id):
 @login_required
 def stats():
     if current_user.type == "admin":
-        users = Blog_User.query.all()
+        users_page = USERS_TABLE.page()
         stats = Blog_Stats.query.get(1)
-        return render_template("account/stats.html", logged_in=current_user.is_authenticated, stats=stats, users=users)
+        return render_template("account/stats.html", logged_in=current_user.is_authenticated, stats=stats,
+                               users=users_page.rows, users_page=users_page)
     else:
         return redirect(url_for('account.dashboard'))
 
@@ -274,7 +295,9 @@ def stats():
 @account.route("/dashboard/bookmarks", methods=["GET", "POST"])
 @login_required
 def bookmarks():
-    bookmarks = Blog_Bookmarks.query.filter_by(user_id=current_user.id).all()
+    # the posts (and their authors) are loaded with the bookmarks, not one by one by the template
+    bookmarks = Blog_Bookmarks.query.filter_by(user_id=current_user.id).options(
+        selectinload(Blog_Bookmarks.post).selectinload(Blog_Posts.author)).all()
     return render_template('account/bookmarks.html', logged_in=current_user.is_authenticated, bookmarks=bookmarks)
 
 
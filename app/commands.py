@@ -0,0 +1,265 @@
+import click
+from flask.cli import with_appcontext
+from app.models.helpers import recount_post_counters
+from app.general_helpers.mailer import drain_outbox
+from app.website.search import rebuild_search_index
+from app.general_helpers.images import build_all_derivatives
+from app.general_helpers.static_assets import build_static_assets
+from app.general_helpers.database import replicate_sqlite
+from app.general_helpers.query_plans import check_query_plans
+from app.general_helpers.query_budget import check_query_budgets
+from app.general_helpers.dataset import generate_dataset, DEFAULT_END_DATE, SYNTHETIC_PASSWORD
+from app.general_helpers.benchmark import (run_benchmark, run_compression_benchmark, run_login_benchmark,
+                                           run_database_benchmark, run_search_benchmark, compare_to_baseline,
+                                           suite_baseline, load_baseline, save_baseline, MODES, SUITES,
+                                           LOGIN_ITERATIONS, SEARCH_CORPUS_POSTS)
+from app.migrations import upgrade_database, load_migrations, current_version
+from app.extensions import db
+from flask import current_app
+import time
+import os
+
+# Maintenance commands, available through the flask CLI once the app is created, e.g.:
+#   flask --app run recount-post-counters
+
+
+@click.command("recount-post-counters")
+@with_appcontext
+def recount_post_counters_command():
+    """Backfill or repair the like/bookmark/comment/reply counters of every post."""
+    repaired = recount_post_counters()
+    for counter, posts in repaired.items():
+        click.echo(f"{counter}: {posts} posts with a non-zero count")
+
+
+@click.command("drain-outbox")
+@with_appcontext
+def drain_outbox_command():
+    """Send every email of the outbox that is due."""
+    sent, failed = drain_outbox()
+    click.echo(f"{sent} emails sent, {failed} failed attempts")
+
+
+@click.command("rebuild-search-index")
+@click.option("--batch-size", default=1000, help="Number of posts read and indexed at a time.")
+@with_appcontext
+def rebuild_search_index_command(batch_size):
+    """Recreate the full-text search index of the posts."""
+    indexed = rebuild_search_index(batch_size)
+    click.echo(f"{indexed} posts indexed")
+
+
+@click.command("build-image-derivatives")
+@with_appcontext
+def build_image_derivatives_command():
+    """Generate the missing resized WebP/JPEG copies of every post, theme and profile picture."""
+    pictures, written = build_all_derivatives()
+    click.echo(f"{pictures} pictures checked, {written} derivatives written")
+
+
+@click.command("build-static-assets")
+@with_appcontext
+def build_static_assets_command():
+    """Write the fingerprinted, precompressed copies of the css and js files and their manifest."""
+    manifest = build_static_assets(current_app.static_folder)
+    for name, fingerprinted in manifest.items():
+        click.echo(f"{name} -> {fingerprinted}")
+
+
+@click.command("replicate-sqlite")
+@click.option("--interval", default=1.0, help="Seconds between two copies.")
+@click.option("--once", is_flag=True, help="Copy once and exit.")
+@with_appcontext
+def replicate_sqlite_command(interval, once):
+    """Keep the SQLite replicas (DATABASE_REPLICA_URLS) in sync with the SQLite primary, for local testing."""
+    source = db.engines[None].url.database
+    replicas = [db.engines[key].url.database for key in current_app.config["SQLALCHEMY_REPLICA_BINDS"]]
+    if not replicas:
+        raise click.ClickException("No replica configured: set DATABASE_REPLICA_URLS.")
+    while True:
+        replicate_sqlite(source, replicas)
+        if once:
+            break
+        time.sleep(interval)
+
+
+@click.command("db-upgrade")
+@with_appcontext
+def db_upgrade_command():
+    """Apply the pending schema migrations (creates the tables of a new database)."""
+    applied = upgrade_database()
+    for migration in applied:
+        click.echo(f"{migration.version:04d} {migration.description}")
+    click.echo(f"{len(applied)} migrations applied")
+
+
+@click.command("db-status")
+@with_appcontext
+def db_status_command():
+    """Show the schema version of the database and the pending migrations."""
+    with db.engine.connect() as connection:
+        version = current_version(connection)
+    click.echo(f"Schema version: {version}")
+    for migration in load_migrations()[version:]:
+        click.echo(f"pending: {migration.version:04d} {migration.description}")
+
+
+@click.command("check-query-plans")
+@click.option("--verbose", is_flag=True, help="Show the plan of every query, not only the full scans.")
+@with_appcontext
+def check_query_plans_command(verbose):
+    """Explain the queries of the website and account pages and fail on full table scans (SQLite)."""
+    plans = check_query_plans()
+    failing = [plan for plan in plans if plan.problems]
+    for plan in plans:
+        if plan.problems or verbose:
+            click.echo(f"{plan.page}\n  {plan.statement}")
+            for line in plan.plan:
+                click.echo(f"  {'!!' if line in plan.problems else '--'} {line}")
+    click.echo(f"{len(plans)} queries explained, {len(failing)} with a full table scan")
+    if failing:
+        raise SystemExit(1)
+
+
+@click.command("check-query-budgets")
+@click.option("--verbose", is_flag=True, help="Show the queries of every page, not only those over their budget.")
+@with_appcontext
+def check_query_budgets_command(verbose):
+    """Count the queries of the website and account pages and fail when a page goes over its endpoint's budget."""
+    checks = check_query_budgets()
+    over = [check for check in checks if check.budget is not None and check.counter.count > check.budget]
+    for check in checks:
+        budget = "no budget" if check.budget is None else f"budget {check.budget}"
+        status = f", status {check.status}" if check.status >= 500 else ""
+        if check in over or verbose:
+            click.echo(f"{'!!' if check in over else '--'} {check.page} [{check.endpoint}] {budget}{status}\n"
+                       f"{check.counter.report()}")
+        elif check.budget is None or status:
+            click.echo(f"?? {check.page} [{check.endpoint}] {check.counter.count} queries, {budget}{status}")
+    click.echo(f"{len(checks)} pages checked, {len(over)} over their query budget")
+    if over:
+        raise SystemExit(1)
+
+
+@click.command("generate-dataset")
+@click.option("--users", default=1000, show_default=True, help="Synthetic users (5% of them authors).")
+@click.option("--themes", default=0, show_default=True, help="New themes (0: use the existing ones).")
+@click.option("--posts", default=1000, show_default=True)
+@click.option("--comments", default=10000, show_default=True)
+@click.option("--replies", default=10000, show_default=True)
+@click.option("--likes", default=50000, show_default=True)
+@click.option("--bookmarks", default=10000, show_default=True)
+@click.option("--seed", default=0, show_default=True, help="Same seed, same dataset.")
+@click.option("--skew", default=1.1, show_default=True, help="Zipf exponent of the popularity of posts and users.")
+@click.option("--end-date", type=click.DateTime(["%Y-%m-%d"]), default=DEFAULT_END_DATE.strftime("%Y-%m-%d"),
+              show_default=True, help="Date of the newest content; posts are spread over the 3 years before.")
+@click.option("--batch-size", default=10000, show_default=True, help="Rows per insert.")
+@click.option("--search-index/--no-search-index", default=True, show_default=True,
+              help="Rebuild the search index afterwards.")
+@with_appcontext
+def generate_dataset_command(users, themes, posts, comments, replies, likes, bookmarks, seed, skew, end_date,
+                             batch_size, search_index):
+    """Add a large synthetic dataset (users, posts, comments, likes...) for load testing."""
+    started = time.perf_counter()
+    try:
+        inserted = generate_dataset(users=users, themes=themes, posts=posts, comments=comments, replies=replies,
+                                    likes=likes, bookmarks=bookmarks, seed=seed, skew=skew, end_date=end_date,
+                                    batch_size=batch_size)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    for table, rows in inserted.items():
+        click.echo(f"{table}: {rows} rows")
+    click.echo(f"{sum(inserted.values())} rows in {time.perf_counter() - started:.1f}s "
+               f"(synthetic users' password: {SYNTHETIC_PASSWORD})")
+    if search_index and posts:
+        click.echo(f"{rebuild_search_index()} posts indexed for search")
+
+
+
+@click.command("benchmark")
+@click.option("--suite", type=click.Choice(SUITES), default="pages", show_default=True,
+              help="pages: the scenarios; compression: CPU against bytes saved of /post/<id>; login: the login with "
+                   "several --iterations; databases: the scenarios on each --database-url; search: the search on "
+                   "a corpus of --posts posts.")
+@click.option("--requests", default=200, show_default=True, help="Requests per scenario.")
+@click.option("--concurrency", default=8, show_default=True, help="Simultaneous clients of the server mode.")
+@click.option("--mode", type=click.Choice(MODES + ("both",)), default="both", show_default=True)
+@click.option("--scenario", "scenarios", multiple=True, help="Run only this scenario (repeatable).")
+@click.option("--iterations", multiple=True, type=int,
+              help=f"PASSWORD_HASH_ITERATIONS of the login suite (repeatable, default: {LOGIN_ITERATIONS}).")
+@click.option("--database-url", "database_urls", multiple=True,
+              help="Database of the databases suite (repeatable), or of the search corpus "
+                   "(default: BENCHMARK_SEARCH_DATABASE_URL).")
+@click.option("--posts", default=SEARCH_CORPUS_POSTS, show_default=True, help="Posts of the search corpus.")
+@click.option("--baseline", type=click.Path(dir_okay=False), default=None,
+              help="Baseline file (default: BENCHMARK_BASELINE, suffixed with the suite name for the other suites).")
+@click.option("--save-baseline", "save", is_flag=True, help="Save the results as the new baseline.")
+@click.option("--tolerance", default=0.25, show_default=True, help="p95 growth accepted before a regression.")
+@with_appcontext
+def benchmark_command(suite, requests, concurrency, mode, scenarios, iterations, database_urls, posts, baseline,
+                      save, tolerance):
+    """Measure the latency, throughput and queries of the main pages and compare them to the baseline."""
+    def progress(mode, name, summary):
+        if isinstance(summary, str):
+            click.echo(f"{mode:12} {name:22} skipped: {summary}")
+            return
+        line = (f"{mode:12} {name:22} p50 {summary['p50_ms']:8.2f}  p95 {summary['p95_ms']:8.2f}  "
+                f"p99 {summary['p99_ms']:8.2f} ms  {summary['throughput_rps']:8.1f} req/s  "
+                f"{summary['queries']} queries  {summary['errors']} errors")
+        if "saved_bytes" in summary:
+            line += (f"  {summary['cpu_ms']:.2f} ms cpu ({summary['compress_cpu_ms']:+.2f} compressing)  "
+                     f"{summary['bytes']} bytes ({summary['saved_share']:.0%} saved)")
+        if summary.get("counter_drift"):
+            line += f"  counter drift {summary['counter_drift']}"
+        click.echo(line)
+
+    modes = MODES if mode == "both" else (mode,)
+    if suite == "databases" and not database_urls:
+        raise click.UsageError("The databases suite needs at least one --database-url.")
+    try:
+        if suite == "compression":
+            results = run_compression_benchmark(requests, progress=progress)
+        elif suite == "login":
+            results = run_login_benchmark(requests, concurrency, modes, iterations or LOGIN_ITERATIONS,
+                                          progress=progress)
+        elif suite == "databases":
+            results = run_database_benchmark(database_urls, requests, concurrency, scenarios, progress=progress)
+        elif suite == "search":
+            results = run_search_benchmark(posts, requests, concurrency, modes,
+                                           database_urls[0] if database_urls else None, progress=progress)
+            if results["index_seconds"] is not None:
+                click.echo(f"{results['posts']} posts indexed in {results['index_seconds']} s")
+        else:
+            results = run_benchmark(requests, concurrency, modes, scenarios, progress=progress)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    baseline = baseline or suite_baseline(current_app.config["BENCHMARK_BASELINE"], suite)
+    regressions = [name for runs in results["results"].values() for name, summary in runs.items()
+                   if summary.get("counter_drift")]
+    if os.path.exists(baseline) and not save:
+        for mode, name, message, is_regression in compare_to_baseline(results, load_baseline(baseline), tolerance):
+            click.echo(f"{'!!' if is_regression else '--'} {mode:12} {name:22} {message}")
+            if is_regression and name not in regressions:
+                regressions.append(name)
+        click.echo(f"{len(regressions)} regressions against {baseline}")
+    if save:
+        save_baseline(baseline, results)
+        click.echo(f"Baseline saved to {baseline}")
+    if regressions:
+        raise SystemExit(1)
+
+
+def register_commands(app):
+    app.cli.add_command(recount_post_counters_command)
+    app.cli.add_command(drain_outbox_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(build_image_derivatives_command)
+    app.cli.add_command(build_static_assets_command)
+    app.cli.add_command(replicate_sqlite_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(db_status_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(check_query_budgets_command)
+    app.cli.add_command(generate_dataset_command)
+    app.cli.add_command(benchmark_command)
@@ -2,17 +2,92 @@ import os
 from dotenv import load_dotenv  # getting .env variables
 from datetime import timedelta
 
+load_dotenv()  # EMAIL_ADDRESS and EMAIL_PASSWORD for the contact form emails
+
 class Config:
     SECRET_KEY = "myFlaskApp4Fun"  # needed for login with wtforms
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///admin.db' 
+    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", 'sqlite:///admin.db')
+    # Engine profile (see general_helpers/database.py): SQLite pragmas, or the connection pool of a server database
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))  # milliseconds
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -64000))  # negative: in KiB
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))  # bytes
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # seconds
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "TRUE").upper() == "TRUE"
+    # Read replicas (comma separated URLs): GET requests read from them, except for a visitor who just wrote
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if uri]
+    READ_YOUR_WRITES_SECONDS = 5
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    TEMPLATES_AUTO_RELOAD = True
+    TEMPLATES_AUTO_RELOAD = None  # None: templates are reloaded when they change in debug mode only
     ABSOLUTE_PATH = os.path.dirname(__file__)
     RELATIVE_PATH = "static/Pictures_Users"
     BLOG_PICTURES_PATH = "static/Pictures_Posts"
     PROFILE_IMG_FOLDER = os.path.join(ABSOLUTE_PATH, RELATIVE_PATH)
     BLOG_IMG_FOLDER = os.path.join(ABSOLUTE_PATH, BLOG_PICTURES_PATH)
+    THEME_IMG_FOLDER = os.path.join(ABSOLUTE_PATH, "static/Pictures_Themes")
     STATIC_FOLDER = os.path.join(ABSOLUTE_PATH, "static")
+    # Compiled templates are kept on disk for the next workers; the heavy pages can be streamed (see rendering.py)
+    JINJA_BYTECODE_CACHE_DIR = os.path.join(ABSOLUTE_PATH, "..", "instance", "jinja_cache")
+    STREAM_TEMPLATES = os.getenv("STREAM_TEMPLATES", "FALSE").upper() == "TRUE"
     ALLOWED_IMG_EXTENSIONS = ['PNG', 'JPG', 'JPEG']
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+    # Processes resizing the uploaded pictures into their WebP/JPEG derivatives (see general_helpers/images.py)
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+    # css/js served from content-hashed, precompressed copies in static/dist (see general_helpers/static_assets.py)
+    STATIC_ASSETS_FINGERPRINT = True
+    # gzip/brotli compression of html, JSON, css and js responses larger than COMPRESS_MIN_SIZE bytes
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4
+    # Full-page cache for logged-out readers: "memory" (per worker LRU) or "filesystem" (shared between workers)
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_BACKEND = os.getenv("PAGE_CACHE_BACKEND", "memory")
+    PAGE_CACHE_MAX_ENTRIES = 512
+    PAGE_CACHE_DIR = os.path.join(ABSOLUTE_PATH, "..", "instance", "page_cache")
+    # content versions, shared by every worker (see general_helpers/page_cache.py)
+    PAGE_CACHE_VERSION_DIR = os.getenv("PAGE_CACHE_VERSION_DIR",
+                                       os.path.join(ABSOLUTE_PATH, "..", "instance", "page_cache_versions"))
+    PAGE_CACHE_MAX_AGE = 600  # seconds
+    # Results of "flask benchmark --save-baseline", which the later runs are compared against
+    BENCHMARK_BASELINE = os.path.join(ABSOLUTE_PATH, "..", "instance", "benchmark_baseline.json")
+    # Database of the 100k posts corpus of "flask benchmark --suite search", built on its first run
+    BENCHMARK_SEARCH_DATABASE_URL = os.getenv(
+        "BENCHMARK_SEARCH_DATABASE_URL",
+        "sqlite:///" + os.path.join(ABSOLUTE_PATH, "..", "instance", "benchmark_search.db"))
+    # Per-request SQL/render timings: Server-Timing header, and /metrics for the admins or a scraper sending the token
+    METRICS_ENABLED = True
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "TRUE").upper() == "TRUE"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    METRICS_DIR = os.getenv("METRICS_DIR")  # shared by the workers of a host, to merge their metrics at scrape time
+    METRICS_FLUSH_INTERVAL = 5  # seconds
+    # Slow query log (see general_helpers/slow_queries.py), listed on the admin dashboard; negative threshold: off
+    SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 250))
+    SLOW_QUERY_EXPLAIN = True
+    SLOW_QUERY_LOG_SIZE = 200
+    SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE")  # JSON lines, appended by every worker
+    # Password hashing: PBKDF2 work factor, and number of threads hashing passwords (see account/helpers.py)
+    PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", 600000))
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = 2
+    # Identities of the logged-in users cached per worker: a change made in another worker is seen within the TTL
+    IDENTITY_CACHE_MAX_ENTRIES = 1024
+    IDENTITY_CACHE_TTL = 30  # seconds
+    # Blog statistics counters: "atomic" (in-SQL increments) or "buffered" (per worker, flushed every few seconds)
+    STATS_COUNTER_MODE = os.getenv("STATS_COUNTER_MODE", "atomic")
+    STATS_FLUSH_INTERVAL = 5  # seconds
+    # Outgoing emails (contact form), sent by the outbox workers. Username and password come from the .env file
+    MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+    MAIL_PORT = int(os.getenv("MAIL_PORT", 465))
+    MAIL_USE_SSL = os.getenv("MAIL_USE_SSL", "TRUE").upper() == "TRUE"
+    MAIL_USERNAME = os.getenv("EMAIL_ADDRESS")
+    MAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+    OUTBOX_WORKERS = 2
+    OUTBOX_BATCH_SIZE = 20
+    OUTBOX_POLL_INTERVAL = 30  # seconds
+    OUTBOX_MAX_ATTEMPTS = 8
 
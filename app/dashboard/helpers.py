@@ -1,4 +1,5 @@
 from app.general_helpers.helpers import check_image_filename
+from app.general_helpers.images import delete_derivatives
 from werkzeug.utils import secure_filename
 from flask import current_app
 import os
@@ -41,5 +42,6 @@ def delete_blog_img(img):
     if img and os.path.exists(os.path.join(current_app.config["BLOG_IMG_FOLDER"], img)):
         try:
             os.remove(os.path.join(current_app.config["BLOG_IMG_FOLDER"], img))
+            delete_derivatives("posts", img)
         except Exception as e:
             raise NameError("Blog post image could not be deleted.") from e
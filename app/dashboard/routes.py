@@ -1,19 +1,28 @@
 from flask import Blueprint, render_template, request, redirect, flash, url_for, current_app
 from app.extensions import db
-from app.models.user import BlogUser
-from app.models.posts import BlogPost
-from app.dashboard.forms import PostForm
+from app.models.user import Blog_User
+from app.models.posts import Blog_Posts
+from app.dashboard.forms import The_Posts
 from app.dashboard.helpers import check_blog_picture, delete_blog_img
-from app.models.themes import BlogTheme
+from app.models.themes import Blog_Theme
 from app.models.helpers import (
     update_stats_users_active,
     update_approved_post_stats,
-    change_authorship_of_all_posts,
+    change_authorship_of_all_post,
+    block_comments_replies,
+)
+from app.models.likes import Blog_Likes
+from app.models.bookmarks import Blog_Bookmarks
+from app.models.comments import Blog_Comments, Blog_Replies
+from app.models.helpers import update_likes, update_bookmarks, update_post_counter
+from app.models import helpers as model_helpers
+from app.general_helpers.page_cache import bump_content_version
+from app.website.search import index_post, remove_post_from_index
+from app.general_helpers.images import delete_derivatives
+from app.general_helpers.slow_queries import recent_slow_queries
+from app.dashboard.tables import (
+    USERS_TABLE, POSTS_TABLE, LIKES_TABLE, BOOKMARKS_TABLE, COMMENTS_TABLE, REPLIES_TABLE,
 )
-from app.models.likes import BlogLike
-from app.models.bookmarks import BlogBookmark
-from app.models.comments import BlogComment, BlogReply
-from app.models.helpers import update_likes, update_bookmarks, delete_comment, delete_reply
 from datetime import datetime
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
@@ -28,8 +37,7 @@ dashboard = Blueprint('dashboard', __name__)
 def manage_users():
     user_type = current_user.type
     if user_type in ["admin", "super_admin"]:
-        all_users = BlogUser.query.order_by(BlogUser.id).all()
-        return render_template("dashboard/users_table.html", logged_in=current_user.is_authenticated, all_users=all_users)
+        return render_template("dashboard/admin_table.html", logged_in=current_user.is_authenticated, page=USERS_TABLE.page())
     else:
         flash("Access denied: admin access only.")
         return redirect(url_for('website.home'))
@@ -39,11 +47,11 @@ def manage_users():
 def update_user(id):
     account_types = ["admin", "author", "user"]
     account_blocked = ["FALSE", "TRUE"]
-    user = BlogUser.query.get_or_404(id)
+    user = Blog_User.query.get_or_404(id)
 
     if request.method == "POST":
-        email_exists = BlogUser.query.filter(BlogUser.id != id, BlogUser.email == request.form.get("email_update")).first()
-        username_exists = BlogUser.query.filter(BlogUser.id != id, BlogUser.name == request.form.get("username_update")).first()
+        email_exists = Blog_User.query.filter(Blog_User.id != id, Blog_User.email == request.form.get("email_update")).first()
+        username_exists = Blog_User.query.filter(Blog_User.id != id, Blog_User.name == request.form.get("username_update")).first()
 
         if email_exists:
             flash("This email is already registered.")
@@ -51,7 +59,7 @@ def update_user(id):
             flash("This username is already taken.")
         else:
             if user.type == "author" and request.form.get("accttype_update") != "author":
-                change_authorship_of_all_posts(user.id, 2)
+                change_authorship_of_all_post(user.id, 2)
 
             user.name = request.form.get("username_update")
             user.email = request.form.get("email_update")
@@ -65,6 +73,7 @@ def update_user(id):
                     block_comments_replies(user.id, False)
 
                 db.session.commit()
+                bump_content_version("users")
                 flash("User updated successfully!")
                 return redirect(url_for('dashboard.manage_users'))
             except:
@@ -75,7 +84,7 @@ def update_user(id):
 @dashboard.route("/dashboard/manage_users/delete/<int:id>", methods=["GET", "POST"])
 @login_required
 def delete_user(id):
-    user = BlogUser.query.get_or_404(id)
+    user = Blog_User.query.get_or_404(id)
 
     if request.method == "POST":
         if id == 1:
@@ -83,38 +92,42 @@ def delete_user(id):
         else:
             try:
                 if user.type == "author":
-                    change_authorship_of_all_posts(user.id, 2)
+                    change_authorship_of_all_post(user.id, 2)
 
                 if user.comments:
                     for comment in user.comments:
                         comment.user_id = 3
-                        delete_comment(comment.id)
+                        model_helpers.delete_comment(comment.id)
 
                 if user.replies:
                     for reply in user.replies:
                         reply.user_id = 3
-                        delete_reply(reply.id)
+                        model_helpers.delete_reply(reply.id)
 
                 if user.likes:
                     for like in user.likes:
                         db.session.delete(like)
+                        update_post_counter(like.post_id, "like_count", -1)
                         update_likes(-1)
 
                 if user.bookmarks:
                     for bookmark in user.bookmarks:
                         db.session.delete(bookmark)
+                        update_post_counter(bookmark.post_id, "bookmark_count", -1)
                         update_bookmarks(-1)
 
                 if user.picture and (user.picture != "" or user.picture != "Picture_default.jpg"):
                     profile_picture_path = os.path.join(current_app.config["PROFILE_IMG_FOLDER"], user.picture)
                     if os.path.exists(profile_picture_path):
                         os.remove(profile_picture_path)
+                        delete_derivatives("users", user.picture)
 
                 db.session.delete(user)
+                update_stats_users_active(-1)
                 db.session.commit()
+                bump_content_version("users", "posts")
 
                 flash("User deleted successfully.")
-                update_stats_users_active(-1)
 
                 return redirect(url_for('dashboard.manage_users'))
 
@@ -126,19 +139,20 @@ def delete_user(id):
 @dashboard.route("/dashboard/manage_users/block/<int:id>", methods=["GET", "POST"])
 @login_required
 def block_user(id):
-    user = BlogUser.query.get_or_404(id)
+    user = Blog_User.query.get_or_404(id)
 
     if request.method == "POST":
         if id == 1:
             flash("Authorization error: cannot block this user.")
         else:
-            user.blocked = "TRUE"
+            user.blocked = True
 
             if user.comments:
                 block_comments_replies(user.id, True)
 
             try:
                 db.session.commit()
+                bump_content_version("users")
                 flash("User blocked successfully.")
                 return redirect(url_for('dashboard.manage_users'))
             except:
@@ -149,7 +163,7 @@ def block_user(id):
 @dashboard.route("/dashboard/manage_users/preview/<int:id>")
 @login_required
 def preview_user(id):
-    user = BlogUser.query.get_or_404(id)
+    user = Blog_User.query.get_or_404(id)
     return render_template("dashboard/users_user_preview.html", logged_in=current_user.is_authenticated, user=user)
 
 # POST MANAGEMENT
@@ -157,12 +171,12 @@ def preview_user(id):
 @dashboard.route("/dashboard/submit_new_post", methods=["GET", "POST"])
 @login_required
 def submit_new_post():
-    form = PostForm()
+    form = The_Posts()
 
     if form.validate_on_submit():
         author_id = current_user.id
 
-        post = BlogPost(
+        post = Blog_Posts(
             theme_id=form.theme.data,
             date_to_post=form.date.data,
             title=form.title.data,
@@ -179,6 +193,8 @@ def submit_new_post():
 
         try:
             db.session.add(post)
+            db.session.flush()
+            index_post(post)
             db.session.commit()
             flash("Post submitted successfully!")
         except:
@@ -192,21 +208,22 @@ def submit_new_post():
 @dashboard.route("/dashboard/manage_posts")
 @login_required
 def manage_posts():
-    posts = BlogPost.query.order_by(BlogPost.id).all()
-    return render_template("dashboard/posts_table.html", logged_in=current_user.is_authenticated, posts=posts)
+    return render_template("dashboard/admin_table.html", logged_in=current_user.is_authenticated, page=POSTS_TABLE.page())
 
 @dashboard.route("/dashboard/manage_posts/approve_post/<int:id>", methods=["GET", "POST"])
 @login_required
 def approve_post(id):
-    post = BlogPost.query.get_or_404(id)
+    post = Blog_Posts.query.get_or_404(id)
 
     if request.method == "POST":
         post.admin_approved = True
 
         try:
+            update_approved_post_stats(1)
+            index_post(post)
             db.session.commit()
+            bump_content_version("posts", f"post:{post.id}", valid_until=post.date_to_post)
             flash("Post approved successfully.")
-            update_approved_post_stats(1)
             return redirect(url_for('dashboard.manage_posts'))
         except:
             db.session.rollback()
@@ -217,15 +234,16 @@ def approve_post(id):
 @dashboard.route("/dashboard/manage_posts/disallow_post/<int:id>", methods=["GET", "POST"])
 @login_required
 def disallow_post(id):
-    post = BlogPost.query.get_or_404(id)
+    post = Blog_Posts.query.get_or_404(id)
 
     if request.method == "POST":
         post.admin_approved = False
 
         try:
+            update_approved_post_stats(-1)
             db.session.commit()
+            bump_content_version("posts", f"post:{post.id}", valid_until=post.date_to_post)
             flash("Post disallowed successfully.")
-            update_approved_post_stats(-1)
             return redirect(url_for('dashboard.manage_posts'))
         except:
             db.session.rollback()
@@ -236,20 +254,20 @@ def disallow_post(id):
 @dashboard.route("/dashboard/manage_posts_author")
 @login_required
 def manage_posts_author():
-    posts = BlogPost.query.filter_by(author_id=current_user.id).all()
+    posts = Blog_Posts.query.filter_by(author_id=current_user.id).all()
     return render_template("dashboard/posts_table_author.html", logged_in=current_user.is_authenticated, posts=posts)
 
 @dashboard.route("/dashboard/manage_posts_author/preview_post/<int:id>")
 @login_required
 def preview_post_author(id):
-    post = BlogPost.query.get_or_404(id)
+    post = Blog_Posts.query.get_or_404(id)
     return render_template("dashboard/posts_preview_post.html", logged_in=current_user.is_authenticated, post=post)
 
 @dashboard.route("/dashboard/manage_posts_author/edit_post/<int:id>", methods=["GET", "POST"])
 @login_required
 def edit_post_author(id):
-    post = BlogPost.query.get_or_404(id)
-    form = PostForm(obj=post)
+    post = Blog_Posts.query.get_or_404(id)
+    form = The_Posts(obj=post)
 
     if form.validate_on_submit():
         post.theme_id = form.theme.data
@@ -265,7 +283,9 @@ def edit_post_author(id):
         post.title_tag = form.title_tag.data
 
         try:
+            index_post(post)
             db.session.commit()
+            bump_content_version("posts", f"post:{post.id}", valid_until=post.date_to_post)
             flash("Post updated successfully.")
             return redirect(url_for('dashboard.manage_posts_author'))
         except:
@@ -277,12 +297,14 @@ def edit_post_author(id):
 @dashboard.route("/dashboard/manage_posts_author/delete_post/<int:id>", methods=["GET", "POST"])
 @login_required
 def delete_post_author(id):
-    post = BlogPost.query.get_or_404(id)
+    post = Blog_Posts.query.get_or_404(id)
 
     if request.method == "POST":
         try:
+            remove_post_from_index(post.id)
             db.session.delete(post)
             db.session.commit()
+            bump_content_version("posts", f"post:{post.id}", valid_until=post.date_to_post)
             flash("Post deleted successfully.")
             return redirect(url_for('dashboard.manage_posts_author'))
         except:
@@ -296,7 +318,7 @@ def delete_post_author(id):
 @dashboard.route("/dashboard/manage_themes")
 @login_required
 def manage_themes():
-    themes = BlogTheme.query.order_by(BlogTheme.id).all()
+    themes = Blog_Theme.query.order_by(Blog_Theme.id).all()
     return render_template("dashboard/themes_table.html", logged_in=current_user.is_authenticated, themes=themes)
 
 @dashboard.route("/dashboard/manage_themes/add_theme", methods=["GET", "POST"])
@@ -305,13 +327,14 @@ def add_theme():
     if request.method == "POST":
         theme_name = request.form.get("theme_name")
 
-        if BlogTheme.query.filter_by(name=theme_name).first():
+        if Blog_Theme.query.filter_by(name=theme_name).first():
             flash("This theme already exists.")
         else:
-            theme = BlogTheme(name=theme_name)
+            theme = Blog_Theme(name=theme_name)
             try:
                 db.session.add(theme)
                 db.session.commit()
+                bump_content_version("themes", "posts")
                 flash("Theme added successfully.")
                 return redirect(url_for('dashboard.manage_themes'))
             except:
@@ -323,12 +346,13 @@ def add_theme():
 @dashboard.route("/dashboard/manage_themes/delete_theme/<int:id>", methods=["GET", "POST"])
 @login_required
 def delete_theme(id):
-    theme = BlogTheme.query.get_or_404(id)
+    theme = Blog_Theme.query.get_or_404(id)
 
     if request.method == "POST":
         try:
             db.session.delete(theme)
             db.session.commit()
+            bump_content_version("themes", "posts")
             flash("Theme deleted successfully.")
             return redirect(url_for('dashboard.manage_themes'))
         except:
@@ -342,19 +366,20 @@ def delete_theme(id):
 @dashboard.route("/dashboard/manage_likes")
 @login_required
 def manage_likes():
-    likes = BlogLike.query.order_by(BlogLike.id).all()
-    return render_template("dashboard/likes_table.html", logged_in=current_user.is_authenticated, likes=likes)
+    return render_template("dashboard/admin_table.html", logged_in=current_user.is_authenticated, page=LIKES_TABLE.page())
 
 @dashboard.route("/dashboard/manage_likes/delete_like/<int:id>", methods=["GET", "POST"])
 @login_required
 def delete_like(id):
-    like = BlogLike.query.get_or_404(id)
+    like = Blog_Likes.query.get_or_404(id)
 
     if request.method == "POST":
         try:
             db.session.delete(like)
+            update_post_counter(like.post_id, "like_count", -1)
             update_likes(-1)
             db.session.commit()
+            bump_content_version(f"post:{like.post_id}")
             flash("Like deleted successfully.")
             return redirect(url_for('dashboard.manage_likes'))
         except:
@@ -366,17 +391,17 @@ def delete_like(id):
 @dashboard.route("/dashboard/manage_bookmarks")
 @login_required
 def manage_bookmarks():
-    bookmarks = BlogBookmark.query.order_by(BlogBookmark.id).all()
-    return render_template("dashboard/bookmarks_table.html", logged_in=current_user.is_authenticated, bookmarks=bookmarks)
+    return render_template("dashboard/admin_table.html", logged_in=current_user.is_authenticated, page=BOOKMARKS_TABLE.page())
 
 @dashboard.route("/dashboard/manage_bookmarks/delete_bookmark/<int:id>", methods=["GET", "POST"])
 @login_required
 def delete_bookmark(id):
-    bookmark = BlogBookmark.query.get_or_404(id)
+    bookmark = Blog_Bookmarks.query.get_or_404(id)
 
     if request.method == "POST":
         try:
             db.session.delete(bookmark)
+            update_post_counter(bookmark.post_id, "bookmark_count", -1)
             update_bookmarks(-1)
             db.session.commit()
             flash("Bookmark deleted successfully.")
@@ -392,18 +417,19 @@ def delete_bookmark(id):
 @dashboard.route("/dashboard/manage_comments")
 @login_required
 def manage_comments():
-    comments = BlogComment.query.order_by(BlogComment.id).all()
-    return render_template("dashboard/comments_table.html", logged_in=current_user.is_authenticated, comments=comments)
+    return render_template("dashboard/admin_table.html", logged_in=current_user.is_authenticated, page=COMMENTS_TABLE.page())
 
 @dashboard.route("/dashboard/manage_comments/delete_comment/<int:id>", methods=["GET", "POST"])
 @login_required
 def delete_comment(id):
-    comment = BlogComment.query.get_or_404(id)
+    comment = Blog_Comments.query.get_or_404(id)
 
     if request.method == "POST":
         try:
             db.session.delete(comment)
+            update_post_counter(comment.post_id, "comment_count", -1)
             db.session.commit()
+            bump_content_version(f"post:{comment.post_id}")
             flash("Comment deleted successfully.")
             return redirect(url_for('dashboard.manage_comments'))
         except:
@@ -415,18 +441,19 @@ def delete_comment(id):
 @dashboard.route("/dashboard/manage_replies")
 @login_required
 def manage_replies():
-    replies = BlogReply.query.order_by(BlogReply.id).all()
-    return render_template("dashboard/replies_table.html", logged_in=current_user.is_authenticated, replies=replies)
+    return render_template("dashboard/admin_table.html", logged_in=current_user.is_authenticated, page=REPLIES_TABLE.page())
 
 @dashboard.route("/dashboard/manage_replies/delete_reply/<int:id>", methods=["GET", "POST"])
 @login_required
 def delete_reply(id):
-    reply = BlogReply.query.get_or_404(id)
+    reply = Blog_Replies.query.get_or_404(id)
 
     if request.method == "POST":
         try:
             db.session.delete(reply)
+            update_post_counter(reply.post_id, "reply_count", -1)
             db.session.commit()
+            bump_content_version(f"post:{reply.post_id}")
             flash("Reply deleted successfully.")
             return redirect(url_for('dashboard.manage_replies'))
         except:
@@ -464,11 +491,24 @@ def delete_image(filename):
 @dashboard.route("/dashboard/manage_stats")
 @login_required
 def manage_stats():
-    users_count = BlogUser.query.count()
-    posts_count = BlogPost.query.count()
-    likes_count = BlogLike.query.count()
-    bookmarks_count = BlogBookmark.query.count()
-    comments_count = BlogComment.query.count()
-    replies_count = BlogReply.query.count()
+    users_count = Blog_User.query.count()
+    posts_count = Blog_Posts.query.count()
+    likes_count = Blog_Likes.query.count()
+    bookmarks_count = Blog_Bookmarks.query.count()
+    comments_count = Blog_Comments.query.count()
+    replies_count = Blog_Replies.query.count()
 
     return render_template("dashboard/stats_table.html", logged_in=current_user.is_authenticated, users_count=users_count, posts_count=posts_count, likes_count=likes_count, bookmarks_count=bookmarks_count, comments_count=comments_count, replies_count=replies_count)
+
+
+# SLOW QUERIES: Admin access only
+
+@dashboard.route("/dashboard/slow_queries")
+@login_required
+def slow_queries():
+    if current_user.type in ["admin", "super_admin"]:
+        return render_template("dashboard/slow_queries.html", logged_in=current_user.is_authenticated,
+                               slow_queries=recent_slow_queries(), threshold=current_app.config["SLOW_QUERY_THRESHOLD_MS"])
+    else:
+        flash("Access denied: admin access only.")
+        return redirect(url_for('website.home'))
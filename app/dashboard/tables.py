@@ -0,0 +1,109 @@
+from app.models.user import Blog_User
+from app.models.posts import Blog_Posts
+from app.models.themes import Blog_Theme
+from app.models.likes import Blog_Likes
+from app.models.bookmarks import Blog_Bookmarks
+from app.models.comments import Blog_Comments, Blog_Replies
+from app.general_helpers.admin_tables import Admin_Table, Admin_Column, Admin_Action
+
+# The admin tables of the dashboard (see general_helpers/admin_tables.py), rendered by dashboard/admin_table.html.
+# Sortable columns and filters must be backed by an index, search columns by a lower(column) index.
+
+USERS_TABLE = Admin_Table(
+    "Users", Blog_User,
+    columns=[
+        Admin_Column("id", "ID", Blog_User.id, sortable=True),
+        Admin_Column("name", "Name", Blog_User.name, sortable=True),
+        Admin_Column("email", "Email", Blog_User.email, sortable=True),
+        Admin_Column("type", "Type", Blog_User.type),
+        Admin_Column("blocked", "Blocked", Blog_User.blocked),
+        Admin_Column("date_created", "Created", Blog_User.date_created),
+    ],
+    search=[Blog_User.name, Blog_User.email],
+    actions=[
+        Admin_Action("Preview", "dashboard.preview_user"),
+        Admin_Action("Update", "dashboard.update_user"),
+        Admin_Action("Block", "dashboard.block_user"),
+        Admin_Action("Delete", "dashboard.delete_user"),
+    ],
+    default_sort="name",
+)
+
+POSTS_TABLE = Admin_Table(
+    "Posts", Blog_Posts,
+    columns=[
+        Admin_Column("id", "ID", Blog_Posts.id, sortable=True),
+        Admin_Column("title", "Title", Blog_Posts.title, sortable=True),
+        Admin_Column("author", "Author", Blog_User.name),
+        Admin_Column("theme", "Theme", Blog_Theme.theme),
+        Admin_Column("date_to_post", "Publication", Blog_Posts.date_to_post),
+        Admin_Column("admin_approved", "Approved", Blog_Posts.admin_approved),
+    ],
+    joins=[(Blog_User, Blog_User.id == Blog_Posts.author_id), (Blog_Theme, Blog_Theme.id == Blog_Posts.theme_id)],
+    search=[Blog_Posts.title],
+    actions=[
+        Admin_Action("Approve", "dashboard.approve_post"),
+        Admin_Action("Disallow", "dashboard.disallow_post"),
+    ],
+)
+
+LIKES_TABLE = Admin_Table(
+    "Likes", Blog_Likes,
+    columns=[
+        Admin_Column("id", "ID", Blog_Likes.id, sortable=True),
+        Admin_Column("user", "User", Blog_User.name),
+        Admin_Column("post", "Post", Blog_Posts.title),
+        Admin_Column("date_submitted", "Date", Blog_Likes.date_submitted),
+    ],
+    joins=[(Blog_User, Blog_User.id == Blog_Likes.user_id), (Blog_Posts, Blog_Posts.id == Blog_Likes.post_id)],
+    filters={"post": Blog_Likes.post_id, "user": Blog_Likes.user_id},
+    actions=[Admin_Action("Delete", "dashboard.delete_like")],
+    default_order="desc",
+)
+
+BOOKMARKS_TABLE = Admin_Table(
+    "Bookmarks", Blog_Bookmarks,
+    columns=[
+        Admin_Column("id", "ID", Blog_Bookmarks.id, sortable=True),
+        Admin_Column("user", "User", Blog_User.name),
+        Admin_Column("post", "Post", Blog_Posts.title),
+        Admin_Column("date_submitted", "Date", Blog_Bookmarks.date_submitted),
+    ],
+    joins=[(Blog_User, Blog_User.id == Blog_Bookmarks.user_id),
+           (Blog_Posts, Blog_Posts.id == Blog_Bookmarks.post_id)],
+    filters={"post": Blog_Bookmarks.post_id, "user": Blog_Bookmarks.user_id},
+    actions=[Admin_Action("Delete", "dashboard.delete_bookmark")],
+    default_order="desc",
+)
+
+COMMENTS_TABLE = Admin_Table(
+    "Comments", Blog_Comments,
+    columns=[
+        Admin_Column("id", "ID", Blog_Comments.id, sortable=True),
+        Admin_Column("text", "Comment", Blog_Comments.text),
+        Admin_Column("user", "User", Blog_User.name),
+        Admin_Column("post", "Post", Blog_Posts.title),
+        Admin_Column("blocked", "Blocked", Blog_Comments.blocked),
+        Admin_Column("date_submitted", "Date", Blog_Comments.date_submitted),
+    ],
+    joins=[(Blog_User, Blog_User.id == Blog_Comments.user_id), (Blog_Posts, Blog_Posts.id == Blog_Comments.post_id)],
+    filters={"post": Blog_Comments.post_id},
+    actions=[Admin_Action("Delete", "dashboard.delete_comment")],
+    default_order="desc",
+)
+
+REPLIES_TABLE = Admin_Table(
+    "Replies", Blog_Replies,
+    columns=[
+        Admin_Column("id", "ID", Blog_Replies.id, sortable=True),
+        Admin_Column("text", "Reply", Blog_Replies.text),
+        Admin_Column("user", "User", Blog_User.name),
+        Admin_Column("comment_id", "Comment", Blog_Replies.comment_id),
+        Admin_Column("blocked", "Blocked", Blog_Replies.blocked),
+        Admin_Column("date_submitted", "Date", Blog_Replies.date_submitted),
+    ],
+    joins=[(Blog_User, Blog_User.id == Blog_Replies.user_id)],
+    filters={"comment": Blog_Replies.comment_id},
+    actions=[Admin_Action("Delete", "dashboard.delete_reply")],
+    default_order="desc",
+)
@@ -1,7 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_ckeditor import CKEditor
 from flask_login import LoginManager
+from app.general_helpers.page_cache import Page_Cache
+from app.general_helpers.compression import Compression
+from app.general_helpers.database import Routing_Session
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": Routing_Session})
 ckeditor = CKEditor()
 login_manager = LoginManager()
+page_cache = Page_Cache()
+compression = Compression()
@@ -0,0 +1,130 @@
+from app.extensions import db
+from app.general_helpers.pagination import keyset_paginate
+from flask import request, url_for
+from sqlalchemy import and_, or_, func
+from collections import namedtuple
+
+# Admin tables
+# The dashboard tables (users, posts, likes, bookmarks, comments, replies) list tables which grow with the traffic, so
+# they are never loaded whole: an Admin_Table declares the columns to show and reads one page of them at a time.
+#   - Only the columns shown are selected (as plain rows, not ORM objects): large columns such as the body of a post
+#     are never read, and nothing is lazy loaded row by row.
+#   - Keyset pagination (general_helpers/pagination.py) on the sort column and the id: every page costs the same.
+#   - Sorting (?sort=<column key>&order=asc|desc) on the columns declared sortable, each of them backed by an index.
+#   - Prefix search (?q=...) on the search columns, case insensitive: lower(column) between the prefix and the prefix
+#     followed by the highest character, which the lower(column) indexes answer (see migrations/v0005).
+#   - Filters (?post=<id>, ?user=<id>...) on the indexed id columns declared as filters.
+
+# key: name of the column in the rows and in ?sort=; expression: a column of the model or of a joined model
+Admin_Column = namedtuple("Admin_Column", ["key", "label", "expression", "sortable"], defaults=[False])
+# a button of every row, linking to endpoint(id=row.id)
+Admin_Action = namedtuple("Admin_Action", ["label", "endpoint"])
+
+MAX_SEARCH_LENGTH = 100
+_HIGHEST_CHARACTER = "\U0010ffff"
+
+
+class Admin_Table:
+    """
+    Declaration of a paginated, sortable and searchable admin table over a model.
+
+    Args:
+        columns (list): Admin_Column, the first one being the primary key of the model (key "id").
+        joins (list): (model, on clause) outer joined to show their columns, e.g. the name of a post's author.
+        search (list): columns matched by the search prefix.
+        filters (dict): ?<name>=<integer> filters, name -> column.
+        actions (list): Admin_Action buttons of every row.
+    """
+
+    def __init__(self, title, model, columns, joins=(), search=(), filters=None, actions=(), per_page=50,
+                 default_sort="id", default_order="asc"):
+        self.title = title
+        self.model = model
+        self.columns = columns
+        self.joins = joins
+        self.search = search
+        self.filters = filters or {}
+        self.actions = actions
+        self.per_page = per_page
+        self.default_sort = default_sort
+        self.default_order = default_order
+        self._by_key = {column.key: column for column in columns}
+
+    def _prefix_filter(self, prefix):
+        prefix = prefix.lower()
+        return or_(*[and_(func.lower(column) >= prefix, func.lower(column) < prefix + _HIGHEST_CHARACTER)
+                     for column in self.search])
+
+    def query(self, search="", filters=None):
+        """
+        The rows of the table (one per model row, with the column keys as attributes), filtered, not ordered.
+        """
+        query = db.session.query(*[column.expression.label(column.key) for column in self.columns]).select_from(
+            self.model)
+        for model, on_clause in self.joins:
+            query = query.outerjoin(model, on_clause)
+        if search and self.search:
+            query = query.filter(self._prefix_filter(search))
+        for name, value in (filters or {}).items():
+            query = query.filter(self.filters[name] == value)
+        return query
+
+    def page(self, args=None):
+        """
+        Reads the page asked for by the query string (request.args by default): cursor, sort, order, q and filters.
+
+        Returns:
+            Admin_Table_Page
+        """
+        args = request.args if args is None else args
+        sort = args.get("sort", self.default_sort)
+        if sort != "id" and not (sort in self._by_key and self._by_key[sort].sortable):
+            sort = self.default_sort
+        order = args.get("order", self.default_order)
+        if order not in ("asc", "desc"):
+            order = self.default_order
+        search = args.get("q", "").strip()[:MAX_SEARCH_LENGTH]
+        filters = {}
+        for name in self.filters:
+            value = args.get(name, type=int)
+            if value is not None:
+                filters[name] = value
+
+        key_columns = [self._by_key["id"]]
+        if sort != "id":
+            key_columns.insert(0, self._by_key[sort])
+        keyset = keyset_paginate(self.query(search, filters),
+                                 [column.expression.label(column.key) for column in key_columns],
+                                 cursor=args.get("cursor"), per_page=self.per_page, descending=order == "desc")
+        return Admin_Table_Page(self, keyset, sort, order, search, filters)
+
+
+class Admin_Table_Page:
+    """
+    One page of an Admin_Table, with the links to the other pages and sort orders.
+    """
+
+    def __init__(self, table, keyset, sort, order, search, filters):
+        self.table = table
+        self.rows = keyset.rows
+        self.next_cursor = keyset.next_cursor
+        self.prev_cursor = keyset.prev_cursor
+        self.sort = sort
+        self.order = order
+        self.search = search
+        self.filters = filters
+
+    def url(self, **changes):
+        """
+        The url of this table with the current sort, search and filters, changed by the keyword arguments.
+        """
+        args = {"sort": self.sort, "order": self.order, "q": self.search or None, **self.filters, **changes}
+        return url_for(request.endpoint, **(request.view_args or {}),
+                       **{name: value for name, value in args.items() if value is not None})
+
+    def sort_url(self, key):
+        """
+        The url sorting the table by a column: ascending, or descending if it is already sorted ascending by it.
+        """
+        order = "desc" if self.sort == key and self.order == "asc" else "asc"
+        return self.url(sort=key, order=order)
@@ -0,0 +1,636 @@
+from app.extensions import db
+from flask import current_app, request_started, request_finished
+from sqlalchemy import event, func
+from sqlalchemy.engine.url import make_url
+from werkzeug.serving import make_server, WSGIRequestHandler
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlencode
+import http.client
+import threading
+import json
+import math
+import time
+import os
+
+# End-to-end benchmark ("flask benchmark")
+# Requests the main pages and actions of the blog (reading, login, like/bookmark toggles, commenting, dashboards) and
+# reports, for each scenario: the p50/p95/p99 latency, the throughput and the number of SQL queries per request.
+# Every scenario is run in two modes:
+#   - "test-client": one request at a time through the Flask test client, i.e. the cost of the application itself,
+#   - "server": the app served by a real multi-threaded WSGI server (werkzeug) on a local port, requested by
+#     `concurrency` clients at once over keep-alive HTTP connections: adds the server, sockets, and the contention on
+#     the database and the caches.
+# Run it against a seeded database, e.g. after "flask generate-dataset" (the login scenario logs in as one of the
+# synthetic users, whose password is known), never against production data: the toggles and comments are written.
+#
+# The results can be saved as a baseline (JSON, BENCHMARK_BASELINE) which the later runs are compared against: a
+# scenario whose p95 grew by more than the tolerance, or which runs more queries or fails more often, is a regression.
+#
+# Besides the pages ("pages" suite), targeted suites measure one trade-off each, with a baseline file of their own:
+#   - "compression": CPU time against bytes saved of /post/<id> for every encoding and level
+#     (run_compression_benchmark),
+#   - "login": login latency and throughput for several PASSWORD_HASH_ITERATIONS (run_login_benchmark),
+#   - "databases": the scenarios on SQLite and on a server database, each with its engine profile
+#     (run_database_benchmark),
+#   - "search": the full-text search on a corpus of 100k posts built in a database of its own (run_search_benchmark).
+
+Scenario = namedtuple("Scenario", ["name", "user_type", "method", "path", "form", "json", "share", "counter"],
+                      defaults=[None])
+
+# user_type: None (logged out), "user", "author" or "admin". path: formatted with the ids of the dataset, {post}
+# rotating over the most commented posts, {hot_post} always the most commented one. share: fraction of the requests
+# of the run made by that scenario. counter: post counter of {hot_post} checked against its rows after the scenario.
+SCENARIOS = [
+    Scenario("home", None, "GET", "/", None, None, 1),
+    Scenario("all", None, "GET", "/all/0", None, None, 1),
+    Scenario("all_theme", None, "GET", "/all/{theme}", None, None, 1),
+    Scenario("post", None, "GET", "/post/{post}", None, None, 1),
+    Scenario("post_logged_in", "user", "GET", "/post/{post}", None, None, 1),
+    Scenario("comments", None, "GET", "/post/{post}/comments", None, None, 1),
+    Scenario("about", None, "GET", "/about/", None, None, 1),
+    Scenario("search", None, "GET", "/search?q=travel", None, None, 1),
+    # password hashing is slow on purpose (see account/helpers.py): fewer logins
+    Scenario("login", None, "POST", "/login", {"email": "{email}", "password": "{password}"}, None, 0.1),
+    Scenario("like_toggle", "user", "POST", "/like_post/{post}", None, None, 1),
+    Scenario("bookmark_toggle", "user", "POST", "/bookmark_post/{post}", None, None, 1),
+    # one user clicking on one post from every client at once (server mode): the toggle race of models/helpers.py
+    Scenario("like_toggle_same_post", "user", "POST", "/like_post/{hot_post}", None, None, 1, "like_count"),
+    Scenario("bookmark_toggle_same_post", "user", "POST", "/bookmark_post/{hot_post}", None, None, 1, "bookmark_count"),
+    Scenario("comment_post", "user", "POST", "/comment_post/{post}", None, {"comment": "Benchmark comment"}, 1),
+    Scenario("dashboard", "user", "GET", "/dashboard", None, None, 1),
+    Scenario("bookmarks", "user", "GET", "/dashboard/bookmarks", None, None, 1),
+    Scenario("admin_dashboard", "admin", "GET", "/dashboard", None, None, 1),
+    Scenario("admin_stats", "admin", "GET", "/dashboard/stats", None, None, 1),
+    Scenario("admin_manage_users", "admin", "GET", "/dashboard/manage_users", None, None, 1),
+    Scenario("admin_manage_posts", "admin", "GET", "/dashboard/manage_posts", None, None, 1),
+    Scenario("admin_manage_comments", "admin", "GET", "/dashboard/manage_comments", None, None, 1),
+    Scenario("admin_manage_stats", "admin", "GET", "/dashboard/manage_stats", None, None, 1),
+]
+MODES = ("test-client", "server")
+ROTATING_POSTS = 50
+ACCEPT_ENCODING = "gzip, deflate, br"
+MIN_REGRESSION_MS = 2  # p95 differences smaller than this are noise, whatever the tolerance
+SUITES = ("pages", "compression", "login", "databases", "search")
+# (name, Accept-Encoding, level): gzip levels and brotli qualities (brotli ones only if it is installed)
+COMPRESSION_VARIANTS = [
+    ("identity", "identity", None),
+    ("gzip-1", "gzip", 1), ("gzip-6", "gzip", 6), ("gzip-9", "gzip", 9),
+    ("br-1", "br", 1), ("br-4", "br", 4), ("br-11", "br", 11),
+]
+LOGIN_ITERATIONS = (100000, 300000, 600000)
+SEARCH_CORPUS_POSTS = 100000
+# the requests of the search suite: a word found in most posts, several words, a prefix, a page far down the
+# results, a word found nowhere, and the html page
+SEARCH_SCENARIOS = [
+    Scenario("search_common_word", None, "GET", "/search/json?q=travel", None, None, 1),
+    Scenario("search_two_words", None, "GET", "/search/json?q=beach+sunset", None, None, 1),
+    Scenario("search_prefix", None, "GET", "/search/json?q=mount", None, None, 1),
+    Scenario("search_deep_page", None, "GET", "/search/json?q=travel&page=50", None, None, 1),
+    Scenario("search_no_match", None, "GET", "/search/json?q=zanzibar", None, None, 1),
+    Scenario("search_page", None, "GET", "/search?q=beach+sunset", None, None, 1),
+]
+
+# cpu: CPU time of the request in the test client (the thread serving it), None in the server mode
+_Sample = namedtuple("_Sample", ["seconds", "status", "size", "cpu"])
+
+
+def _targets():
+    """
+    The ids the scenarios request, taken from the database: posts, a theme, a user of each type, and the credentials
+    of a synthetic user for the login.
+    """
+    from app.models.user import Blog_User
+    from app.models.posts import Blog_Posts
+    from app.general_helpers.dataset import SYNTHETIC_PASSWORD
+
+    post_ids = [post_id for post_id, in db.session.query(Blog_Posts.id).filter(
+        Blog_Posts.admin_approved == db.true()).order_by(
+        Blog_Posts.comment_count.desc(), Blog_Posts.id).limit(ROTATING_POSTS)]
+    theme_id = db.session.query(Blog_Posts.theme_id).filter(Blog_Posts.id == post_ids[0]).scalar() if post_ids else None
+    users = {}
+    for user_type in ("user", "author", "admin"):
+        users[user_type] = db.session.query(Blog_User.id).filter(
+            Blog_User.type == user_type, Blog_User.blocked == db.false()).order_by(Blog_User.id).limit(1).scalar()
+    email = db.session.query(Blog_User.email).filter(
+        Blog_User.email.like("%@synthetic.test"), Blog_User.blocked == db.false()).order_by(
+        Blog_User.id.desc()).limit(1).scalar()
+    return {"posts": post_ids, "theme": theme_id, "users": users, "email": email, "password": SYNTHETIC_PASSWORD}
+
+
+def _skip_reason(scenario, targets):
+    if ("{post}" in scenario.path or "{hot_post}" in scenario.path) and not targets["posts"]:
+        return "no approved post"
+    if "{theme}" in scenario.path and targets["theme"] is None:
+        return "no theme"
+    if scenario.user_type and targets["users"][scenario.user_type] is None:
+        return f"no {scenario.user_type} account"
+    if scenario.name == "login" and not targets["email"]:
+        return "no synthetic user (flask generate-dataset)"
+    return None
+
+
+def _session_cookie(app, user_id):
+    """
+    A Cookie header logging the request in as user_id, as Flask-Login would after a login.
+    """
+    if user_id is None:
+        return {}
+    value = app.session_interface.get_signing_serializer(app).dumps({"_user_id": str(user_id), "_fresh": True})
+    return {"Cookie": f"{app.config['SESSION_COOKIE_NAME']}={value}"}
+
+
+def _requests(scenario, targets, count):
+    """
+    (method, path, headers, body) of the count requests of a scenario.
+    """
+    values = {"theme": targets["theme"], "email": targets["email"], "password": targets["password"]}
+    requests = []
+    for i in range(count):
+        if targets["posts"]:
+            values["post"] = targets["posts"][i % len(targets["posts"])]
+            values["hot_post"] = targets["posts"][0]
+        headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        body = None
+        if scenario.form:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            body = urlencode({key: value.format(**values) for key, value in scenario.form.items()}).encode()
+        elif scenario.json:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps(scenario.json).encode()
+        requests.append((scenario.method, scenario.path.format(**values), headers, body))
+    return requests
+
+
+class _Quiet_Request_Handler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class _Query_Counter:
+    """
+    Counts the SQL queries of every request, per thread: works with the test client and the threaded server alike.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.engines = set(db.engines.values())
+        self.local = threading.local()
+        self.counts = []
+
+    def _started(self, sender, **extra):
+        self.local.count = 0
+
+    def _finished(self, sender, **extra):
+        self.counts.append(getattr(self.local, "count", 0))
+        self.local.count = None
+
+    def _executed(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self.local, "count", None) is not None:
+            self.local.count += 1
+
+    def __enter__(self):
+        request_started.connect(self._started, self.app)
+        request_finished.connect(self._finished, self.app)
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._executed)
+        return self
+
+    def __exit__(self, *exc_info):
+        request_started.disconnect(self._started, self.app)
+        request_finished.disconnect(self._finished, self.app)
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._executed)
+
+    def take(self):
+        counts, self.counts = self.counts, []
+        return counts
+
+
+def _run_test_client(app, requests, cookie):
+    # no cookie jar: the session cookie is sent in the headers, as with the server
+    client = app.test_client(use_cookies=False)
+    samples = []
+    for method, path, headers, body in requests:
+        started = time.perf_counter()
+        cpu_started = time.thread_time()
+        # a fresh app context (and g) per request, as in a real worker
+        with app.app_context():
+            response = client.open(path, method=method, headers={**headers, **cookie}, data=body)
+            size = len(response.get_data())
+            response.close()
+        samples.append(_Sample(time.perf_counter() - started, response.status_code, size,
+                               time.thread_time() - cpu_started))
+    return samples
+
+
+def _run_server(port, requests, cookie, concurrency):
+    samples = []
+
+    def client(requests):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        try:
+            for method, path, headers, body in requests:
+                started = time.perf_counter()
+                try:
+                    connection.request(method, path, body=body, headers={**headers, **cookie})
+                    response = connection.getresponse()
+                    size = len(response.read())
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    size, status = 0, 599
+                samples.append(_Sample(time.perf_counter() - started, status, size, None))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=client, args=(requests[i::concurrency],)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def _percentile(sorted_values, percent):
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+def _summary(samples, seconds, query_counts):
+    latencies = sorted(sample.seconds * 1000 for sample in samples)
+    cpu = [sample.cpu * 1000 for sample in samples if sample.cpu is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if sample.status >= 400),
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "throughput_rps": round(len(samples) / seconds, 1),
+        "queries": round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+        "bytes": round(sum(sample.size for sample in samples) / len(samples)),
+        "cpu_ms": round(sum(cpu) / len(cpu), 2) if cpu else None,
+    }
+
+
+@contextmanager
+def _serving(app, modes):
+    """
+    Serves the app with a threaded werkzeug server on a free local port while the block runs, if the server mode is
+    among the modes. Yields the server, or None.
+    """
+    if "server" not in modes:
+        yield None
+        return
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=_Quiet_Request_Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+
+def _request_count(mode, scenario, requests, concurrency):
+    return max(concurrency if mode == "server" else 1, round(requests * scenario.share))
+
+
+def _measure(app, mode, planned, cookie, warmup, concurrency, server, counter):
+    """
+    Sends the planned requests (the first warmup of them not measured) in a mode and returns their summary.
+    """
+    if mode == "server":
+        _run_server(server.port, planned[:warmup], cookie, 1)
+        counter.take()
+        started = time.perf_counter()
+        samples = _run_server(server.port, planned[warmup:], cookie, concurrency)
+    else:
+        _run_test_client(app, planned[:warmup], cookie)
+        counter.take()
+        started = time.perf_counter()
+        samples = _run_test_client(app, planned[warmup:], cookie)
+    return _summary(samples, time.perf_counter() - started, counter.take())
+
+
+def _counter_drift(counter, post_id):
+    """
+    How far a post counter is from the number of rows it counts (0 when they agree).
+    """
+    from app.models.helpers import POST_COUNTERS
+    from app.models.posts import Blog_Posts
+
+    model = POST_COUNTERS[counter]
+    try:
+        stored = db.session.query(getattr(Blog_Posts, counter)).filter(Blog_Posts.id == post_id).scalar()
+        rows = db.session.query(func.count(model.id)).filter(model.post_id == post_id).scalar()
+    finally:
+        db.session.remove()
+    return stored - rows
+
+
+def _results(suite, requests, concurrency, skipped, results, database=None):
+    return {
+        "date": datetime.utcnow().isoformat(timespec="seconds"),
+        "suite": suite,
+        "database": database or db.engine.dialect.name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "skipped": skipped,
+        "results": results,
+    }
+
+
+def run_benchmark(requests=200, concurrency=8, modes=MODES, scenarios=None, warmup=5, progress=None):
+    """
+    Runs the scenarios (all of them, or those named in scenarios) in each mode.
+
+    Args:
+        requests: requests per scenario (times its share).
+        progress: optional function called with (mode, scenario name, summary or skip reason) after every scenario.
+
+    Returns:
+        dict: The machine-readable results, {"results": {mode: {scenario: summary}}, ...}, as saved as a baseline.
+    """
+    app = current_app._get_current_object()
+    selected = [scenario for scenario in SCENARIOS if not scenarios or scenario.name in scenarios]
+    unknown = set(scenarios or []) - {scenario.name for scenario in SCENARIOS}
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    targets = _targets()
+    db.session.remove()
+
+    results = {mode: {} for mode in modes}
+    skipped = {}
+    with _serving(app, modes) as server, _Query_Counter(app) as counter:
+        for mode in modes:
+            for scenario in selected:
+                reason = _skip_reason(scenario, targets)
+                if reason:
+                    skipped[scenario.name] = reason
+                    if progress:
+                        progress(mode, scenario.name, reason)
+                    continue
+                count = _request_count(mode, scenario, requests, concurrency)
+                cookie = _session_cookie(app, targets["users"].get(scenario.user_type))
+                planned = _requests(scenario, targets, warmup + count)
+                drift = _counter_drift(scenario.counter, targets["posts"][0]) if scenario.counter else None
+                summary = _measure(app, mode, planned, cookie, warmup, concurrency, server, counter)
+                if scenario.counter:
+                    summary["counter_drift"] = _counter_drift(scenario.counter, targets["posts"][0]) - drift
+                results[mode][scenario.name] = summary
+                if progress:
+                    progress(mode, scenario.name, summary)
+
+    return _results("pages", requests, concurrency, skipped, results)
+
+
+def run_compression_benchmark(requests=200, warmup=5, progress=None):
+    """
+    Requests /post/<id> logged out through the test client with each of the COMPRESSION_VARIANTS, the page cache off
+    so that every response is rendered and compressed. Besides the latency, each summary has the CPU time per request
+    (cpu_ms), its part spent compressing (compress_cpu_ms, against "identity") and the bytes saved (saved_bytes,
+    saved_share).
+
+    Returns:
+        dict: As run_benchmark, the variants under the "compression" mode.
+    """
+    from app.general_helpers.compression import brotli
+
+    app = current_app._get_current_object()
+    scenario = next(scenario for scenario in SCENARIOS if scenario.name == "post")
+    targets = _targets()
+    db.session.remove()
+    variants = [variant for variant in COMPRESSION_VARIANTS if variant[1] != "br" or brotli is not None]
+    results = {"compression": {}}
+    skipped = {}
+    reason = _skip_reason(scenario, targets)
+    if reason:
+        skipped["compression"] = reason
+        return _results("compression", requests, 1, skipped, results)
+
+    settings = {key: app.config[key]
+                for key in ("PAGE_CACHE_ENABLED", "COMPRESS_GZIP_LEVEL", "COMPRESS_BROTLI_QUALITY")}
+    app.config["PAGE_CACHE_ENABLED"] = False
+    try:
+        with _Query_Counter(app) as counter:
+            for name, encoding, level in variants:
+                if encoding == "gzip":
+                    app.config["COMPRESS_GZIP_LEVEL"] = level
+                elif encoding == "br":
+                    app.config["COMPRESS_BROTLI_QUALITY"] = level
+                planned = [(method, path, {**headers, "Accept-Encoding": encoding}, body)
+                           for method, path, headers, body in _requests(scenario, targets, warmup + requests)]
+                summary = _measure(app, "test-client", planned, {}, warmup, 1, None, counter)
+                identity = results["compression"].get("identity", summary)
+                summary["compress_cpu_ms"] = round(summary["cpu_ms"] - identity["cpu_ms"], 2)
+                summary["saved_bytes"] = identity["bytes"] - summary["bytes"]
+                summary["saved_share"] = (round(summary["saved_bytes"] / identity["bytes"], 3)
+                                          if identity["bytes"] else 0)
+                results["compression"][name] = summary
+                if progress:
+                    progress("compression", name, summary)
+    finally:
+        app.config.update(settings)
+
+    return _results("compression", requests, 1, skipped, results)
+
+
+def run_login_benchmark(requests=20, concurrency=8, modes=MODES, iterations=LOGIN_ITERATIONS, warmup=2,
+                        progress=None):
+    """
+    Runs the login scenario with each number of PASSWORD_HASH_ITERATIONS. The password of the synthetic user logging
+    in is hashed again with that number first (so the logins do not rehash it), and put back at the end. In the server
+    mode the throughput is bounded by the hashing pool (PASSWORD_HASH_WORKERS), not by the clients.
+
+    Returns:
+        dict: As run_benchmark, the runs named "login-<iterations>".
+    """
+    from app.models.user import Blog_User
+    from app.account.helpers import hash_password
+
+    app = current_app._get_current_object()
+    scenario = next(scenario for scenario in SCENARIOS if scenario.name == "login")
+    targets = _targets()
+    results = {mode: {} for mode in modes}
+    skipped = {}
+    reason = _skip_reason(scenario, targets)
+    if reason:
+        db.session.remove()
+        skipped["login"] = reason
+        return _results("login", requests, concurrency, skipped, results)
+
+    user = db.session.query(Blog_User).filter(Blog_User.email == targets["email"]).one()
+    user_id, original_hash = user.id, user.password
+    original_iterations = app.config.get("PASSWORD_HASH_ITERATIONS")
+    db.session.remove()
+    try:
+        with _serving(app, modes) as server, _Query_Counter(app) as counter:
+            for count in iterations:
+                app.config["PASSWORD_HASH_ITERATIONS"] = count
+                db.session.query(Blog_User).filter(Blog_User.id == user_id).update(
+                    {Blog_User.password: hash_password(targets["password"])}, synchronize_session=False)
+                db.session.commit()
+                db.session.remove()
+                for mode in modes:
+                    planned = _requests(scenario, targets, warmup + max(concurrency if mode == "server" else 1,
+                                                                        requests))
+                    summary = _measure(app, mode, planned, {}, warmup, concurrency, server, counter)
+                    results[mode][f"login-{count}"] = summary
+                    if progress:
+                        progress(mode, f"login-{count}", summary)
+    finally:
+        app.config["PASSWORD_HASH_ITERATIONS"] = original_iterations
+        db.session.query(Blog_User).filter(Blog_User.id == user_id).update(
+            {Blog_User.password: original_hash}, synchronize_session=False)
+        db.session.commit()
+        db.session.remove()
+
+    return _results("login", requests, concurrency, skipped, results)
+
+
+def _database_label(url):
+    url = make_url(url)
+    return f"{url.get_backend_name()}:{os.path.basename(url.database or '')}"
+
+
+def run_database_benchmark(database_urls, requests=200, concurrency=8, scenarios=None, progress=None):
+    """
+    Runs the scenarios in the server mode against each database, e.g. the SQLite file and a Postgres server, each
+    through a fresh app (Config with that DATABASE_URL) and so with its engine profile: WAL and pragmas for SQLite, a
+    connection pool for the server databases (general_helpers/database.py). The databases must hold the same dataset
+    (flask db-upgrade then flask generate-dataset with the same volumes and seed).
+
+    Returns:
+        dict: As run_benchmark, the runs of each database under "server@<backend>:<database>".
+    """
+    from app import create_app
+    from app.config import Config
+
+    results = {}
+    skipped = {}
+    for url in database_urls:
+        label = f"server@{_database_label(url)}"
+        app = create_app(type("Benchmark_Config", (Config,), {"SQLALCHEMY_DATABASE_URI": url}))
+        with app.app_context():
+            try:
+                run = run_benchmark(requests, concurrency, ("server",), scenarios,
+                                    progress=progress and (lambda mode, name, summary: progress(label, name, summary)))
+            finally:
+                for engine in db.engines.values():
+                    engine.dispose()
+        results[label] = run["results"]["server"]
+        skipped.update({f"{label} {name}": reason for name, reason in run["skipped"].items()})
+
+    return _results("databases", requests, concurrency, skipped, results,
+                    database=", ".join(_database_label(url) for url in database_urls))
+
+
+def run_search_benchmark(posts=SEARCH_CORPUS_POSTS, requests=200, concurrency=8, modes=MODES, database_url=None,
+                         warmup=5, progress=None):
+    """
+    Runs the SEARCH_SCENARIOS on a corpus of at least `posts` synthetic posts, in a database of its own
+    (BENCHMARK_SEARCH_DATABASE_URL by default, never the blog's database) served by a fresh app with the page cache
+    off. The corpus is built on the first run (flask db-upgrade, generate-dataset, rebuild-search-index) and reused by
+    the next ones, so that their results compare.
+
+    Returns:
+        dict: As run_benchmark, with the number of posts of the corpus and the seconds taken to index it (None when
+        it was already built).
+    """
+    from app import create_app
+    from app.config import Config
+    from app.general_helpers.dataset import generate_dataset
+    from app.migrations import upgrade_database
+    from app.models.posts import Blog_Posts
+    from app.website.search import rebuild_search_index
+
+    database_url = database_url or current_app.config["BENCHMARK_SEARCH_DATABASE_URL"]
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database:
+        os.makedirs(os.path.dirname(os.path.abspath(url.database)), exist_ok=True)
+    app = create_app(type("Benchmark_Config", (Config,), {"SQLALCHEMY_DATABASE_URI": database_url,
+                                                          "PAGE_CACHE_ENABLED": False}))
+    targets = {"posts": [], "theme": None, "users": {}, "email": None, "password": None}
+    results = {mode: {} for mode in modes}
+    index_seconds = None
+    with app.app_context():
+        try:
+            upgrade_database()
+            existing = db.session.query(func.count(Blog_Posts.id)).scalar()
+            if existing < posts:
+                generate_dataset(users=max(1, (posts - existing) // 20), posts=posts - existing, comments=0,
+                                 replies=0, likes=0, bookmarks=0)
+                started = time.perf_counter()
+                rebuild_search_index()
+                index_seconds = round(time.perf_counter() - started, 1)
+            corpus = db.session.query(func.count(Blog_Posts.id)).scalar()
+            db.session.remove()
+
+            with _serving(app, modes) as server, _Query_Counter(app) as counter:
+                for mode in modes:
+                    for scenario in SEARCH_SCENARIOS:
+                        count = _request_count(mode, scenario, requests, concurrency)
+                        planned = _requests(scenario, targets, warmup + count)
+                        summary = _measure(app, mode, planned, {}, warmup, concurrency, server, counter)
+                        results[mode][scenario.name] = summary
+                        if progress:
+                            progress(mode, scenario.name, summary)
+        finally:
+            for engine in db.engines.values():
+                engine.dispose()
+
+    run = _results("search", requests, concurrency, {}, results, database=_database_label(database_url))
+    run.update({"posts": corpus, "index_seconds": index_seconds})
+    return run
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """
+    Compares the results of a run to a baseline (both as returned by run_benchmark).
+
+    Returns:
+        list: (mode, scenario, message, is_regression) of every scenario present in both.
+    """
+    comparison = []
+    for mode, scenarios in results["results"].items():
+        for name, summary in scenarios.items():
+            before = baseline.get("results", {}).get(mode, {}).get(name)
+            if not before:
+                continue
+            change = (summary["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0
+            slower = change > tolerance and summary["p95_ms"] - before["p95_ms"] > MIN_REGRESSION_MS
+            more_queries = (summary["queries"] or 0) > (before["queries"] or 0) + 0.5
+            more_errors = summary["errors"] > before["errors"]
+            drifted = bool(summary.get("counter_drift"))
+            message = f"p95 {before['p95_ms']} -> {summary['p95_ms']} ms ({change:+.0%})"
+            if summary["queries"] != before["queries"]:
+                message += f", queries {before['queries']} -> {summary['queries']}"
+            if more_errors:
+                message += f", errors {before['errors']} -> {summary['errors']}"
+            if drifted:
+                message += f", counter drift {summary['counter_drift']}"
+            comparison.append((mode, name, message, slower or more_queries or more_errors or drifted))
+    return comparison
+
+
+def suite_baseline(path, suite):
+    """
+    The baseline file of a suite: path for the pages, path with the suite name appended for the others.
+    """
+    if suite == "pages":
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}_{suite}{extension}"
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
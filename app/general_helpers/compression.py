@@ -0,0 +1,135 @@
+from flask import request, current_app
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are only gzipped
+    brotli = None
+
+# Response compression
+# Text responses (html pages, JSON, css, js) are compressed with brotli or gzip, whichever the browser prefers
+# among the ones it accepts (Accept-Encoding), brotli first when both are equally good.
+#   - small responses (under COMPRESS_MIN_SIZE bytes) and other content types are sent as they are,
+#   - responses which are already encoded (e.g. the precompressed static assets) are left alone,
+#   - streamed responses are compressed chunk by chunk and flushed after every chunk, so they still stream,
+#   - pages served by the page cache carry an ETag identifying their content: their compressed bytes are cached in
+#     the page cache backend under that ETag, so a cached page is compressed once, not on every hit.
+# The ETag of a compressed response is made weak (W/"..."): its bytes differ from the uncompressed ones.
+
+
+class Compression:
+    """
+    Flask extension compressing the responses in an after_request hook.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESS_ENABLED", True)
+        app.config.setdefault("COMPRESS_MIN_SIZE", 500)
+        app.config.setdefault("COMPRESS_GZIP_LEVEL", 6)
+        app.config.setdefault("COMPRESS_BROTLI_QUALITY", 4)
+        app.config.setdefault("COMPRESS_MIMETYPES", [
+            "text/html", "text/css", "text/plain", "text/xml", "text/javascript", "application/javascript",
+            "application/json", "application/xml", "image/svg+xml",
+        ])
+        app.after_request(self._after_request)
+        app.extensions["compression"] = self
+
+    # Negotiation
+    @staticmethod
+    def _choose_encoding():
+        accepted = request.accept_encodings
+        candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+        quality = {encoding: accepted[encoding] for encoding in candidates}
+        best = max(candidates, key=lambda encoding: quality[encoding])
+        return best if quality[best] > 0 else None
+
+    def _should_compress(self, response):
+        config = current_app.config
+        if not config["COMPRESS_ENABLED"] or request.method == "HEAD":
+            return False
+        if response.status_code != 200 or "Content-Encoding" in response.headers:
+            return False
+        if response.mimetype not in config["COMPRESS_MIMETYPES"] or response.cache_control.no_transform:
+            return False
+        length = response.content_length if response.is_streamed else len(response.get_data())
+        return length is None or length >= config["COMPRESS_MIN_SIZE"]
+
+    # Compressors
+    @staticmethod
+    def compress(data, encoding):
+        """
+        Compresses bytes in one go.
+        """
+        if encoding == "br":
+            return brotli.compress(data, quality=current_app.config["COMPRESS_BROTLI_QUALITY"])
+        return gzip.compress(data, compresslevel=current_app.config["COMPRESS_GZIP_LEVEL"], mtime=0)
+
+    @staticmethod
+    def _compress_stream(chunks, encoding, level):
+        """
+        Compresses an iterable of chunks, flushing after each chunk so the browser can render what it has received.
+        """
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=level)
+            compress_chunk = lambda chunk: compressor.process(chunk) + compressor.flush()
+            finish = compressor.finish
+        else:
+            # wbits 31: deflate stream with a gzip header and trailer
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            compress_chunk = lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            finish = compressor.flush
+        try:
+            for chunk in chunks:
+                data = compress_chunk(chunk.encode() if isinstance(chunk, str) else chunk)
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            # e.g. the file of a send_file response
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def _cached_compress(self, response, encoding):
+        """
+        Compressed body of a buffered response, taken from the page cache backend when the response has an ETag.
+        """
+        etag, weak = response.get_etag()
+        page_cache = current_app.extensions.get("page_cache")
+        if not etag or weak or page_cache is None or page_cache.backend is None:
+            return self.compress(response.get_data(), encoding)
+
+        key = f"compressed:{encoding}:{request.full_path}:{etag}"
+        data = page_cache.backend.get(key)
+        if data is None:
+            data = self.compress(response.get_data(), encoding)
+            page_cache.backend.set(key, data, current_app.config.get("PAGE_CACHE_MAX_AGE"))
+        return data
+
+    def _after_request(self, response):
+        if response.mimetype in current_app.config["COMPRESS_MIMETYPES"]:
+            response.vary.add("Accept-Encoding")
+        if not self._should_compress(response):
+            return response
+        encoding = self._choose_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            level = current_app.config[
+                "COMPRESS_BROTLI_QUALITY" if encoding == "br" else "COMPRESS_GZIP_LEVEL"]
+            response.response = self._compress_stream(response.response, encoding, level)
+            response.direct_passthrough = False
+            response.headers.pop("Content-Length", None)
+        else:
+            response.set_data(self._cached_compress(response, encoding))
+
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,181 @@
+from flask import current_app, g, request, session, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.sql.elements import TextClause
+import random
+import sqlite3
+import time
+
+# Database engine profile
+# The database is chosen with DATABASE_URL (SQLite file by default), and the engine is tuned for it:
+#   - SQLite: every new connection switches to WAL (readers no longer block the writer and the other way round),
+#     synchronous=NORMAL (safe in WAL mode, no fsync on every commit), a memory map and a larger page cache, and waits
+#     up to SQLITE_BUSY_TIMEOUT milliseconds for a lock instead of failing at once with "database is locked".
+#   - Server databases (Postgres, MySQL): a connection pool of DB_POOL_SIZE connections (+ DB_MAX_OVERFLOW), checked
+#     before use (pre-ping) and recycled after DB_POOL_RECYCLE seconds, so connections dropped by the server or a
+#     proxy are replaced instead of failing a request.
+# Options given in SQLALCHEMY_ENGINE_OPTIONS take precedence.
+
+_sqlite_pragmas = {}
+
+
+def engine_options(config):
+    """
+    Returns the create_engine options for the database of the config.
+    """
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite":
+        # pysqlite's own busy timeout, in seconds
+        return {"connect_args": {"timeout": config["SQLITE_BUSY_TIMEOUT"] / 1000}}
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection) or not _sqlite_pragmas:
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in _sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+    finally:
+        cursor.close()
+
+
+def init_database_profile(app):
+    """
+    Sets the engine options from the config. Must be called before db.init_app(app).
+    """
+    config = app.config
+    config.setdefault("SQLITE_JOURNAL_MODE", "WAL")
+    config.setdefault("SQLITE_SYNCHRONOUS", "NORMAL")
+    config.setdefault("SQLITE_BUSY_TIMEOUT", 5000)  # milliseconds
+    config.setdefault("SQLITE_CACHE_SIZE", -64000)  # negative: in KiB
+    config.setdefault("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)  # bytes
+    config.setdefault("DB_POOL_SIZE", 10)
+    config.setdefault("DB_MAX_OVERFLOW", 20)
+    config.setdefault("DB_POOL_TIMEOUT", 30)
+    config.setdefault("DB_POOL_RECYCLE", 1800)
+    config.setdefault("DB_POOL_PRE_PING", True)
+
+    config["SQLALCHEMY_ENGINE_OPTIONS"] = {**engine_options(config), **config.get("SQLALCHEMY_ENGINE_OPTIONS", {})}
+
+    _sqlite_pragmas.clear()
+    _sqlite_pragmas.update({
+        "journal_mode": config["SQLITE_JOURNAL_MODE"],
+        "synchronous": config["SQLITE_SYNCHRONOUS"],
+        "busy_timeout": int(config["SQLITE_BUSY_TIMEOUT"]),
+        "cache_size": int(config["SQLITE_CACHE_SIZE"]),
+        "mmap_size": int(config["SQLITE_MMAP_SIZE"]),
+    })
+    if not event.contains(Engine, "connect", _set_sqlite_pragmas):
+        event.listen(Engine, "connect", _set_sqlite_pragmas)
+
+
+# Read replicas
+# With DATABASE_REPLICA_URLS set, every replica becomes a bind ("replica_0", "replica_1", ...) and the reads of GET
+# requests (the public pages, the load more endpoints, ...) go to one of them, picked at random for each request.
+# Everything else stays on the primary:
+#   - the requests with another method (likes, comments, forms, dashboard actions),
+#   - the writes, and every statement that follows a write in the same request,
+#   - work done outside a request (CLI commands, background workers),
+#   - the reads building a result cached for every visitor (a page cache fill, the home feed), see use_primary():
+#     the cache entry outlives the request and would keep serving the replica's lag under the new versions.
+# Read your writes: a visitor who wrote to the database is kept on the primary for READ_YOUR_WRITES_SECONDS, so the
+# pages they load next show their change even if the replicas lag behind.
+# "flask replicate-sqlite" keeps SQLite replicas in sync with a SQLite primary, to try this locally.
+
+REPLICA_BIND_PREFIX = "replica_"
+
+
+def _is_read(clause):
+    if getattr(clause, "is_select", False):
+        return True
+    return isinstance(clause, TextClause) and clause.text.lstrip()[:6].upper() == "SELECT"
+
+
+class Routing_Session(Session):
+    """
+    db.session class sending the reads of read-only requests to a replica bind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if not self._flushing and _is_read(clause):
+                replica_key = g.get("replica_key")
+                if replica_key is not None and not _has_own_bind(mapper):
+                    return self._db.engines[replica_key]
+            elif self._flushing or clause is not None:
+                # a write: this request reads from the primary from now on, and so does the visitor for a while
+                g.replica_key = None
+                g.database_written = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_primary():
+    """
+    Sends the reads of the rest of the request to the primary.
+    """
+    if has_request_context():
+        g.replica_key = None
+
+
+def _has_own_bind(mapper):
+    return mapper is not None and inspect(mapper).persist_selectable.metadata.info.get("bind_key") is not None
+
+
+def _choose_database():
+    g.replica_key = None
+    if request.method in ("GET", "HEAD") and session.get("_primary_until", 0) < time.time():
+        g.replica_key = random.choice(current_app.config["SQLALCHEMY_REPLICA_BINDS"])
+
+
+def _remember_write(response):
+    if g.get("database_written"):
+        session["_primary_until"] = time.time() + current_app.config["READ_YOUR_WRITES_SECONDS"]
+    return response
+
+
+def init_read_replicas(app):
+    """
+    Adds the replica binds. Must be called before db.init_app(app).
+    """
+    app.config.setdefault("SQLALCHEMY_REPLICA_URIS", [])
+    app.config.setdefault("READ_YOUR_WRITES_SECONDS", 5)
+
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    replica_keys = []
+    for index, uri in enumerate(app.config["SQLALCHEMY_REPLICA_URIS"]):
+        key = f"{REPLICA_BIND_PREFIX}{index}"
+        binds[key] = uri
+        replica_keys.append(key)
+    app.config["SQLALCHEMY_BINDS"] = binds
+    app.config["SQLALCHEMY_REPLICA_BINDS"] = replica_keys
+
+    if replica_keys:
+        app.before_request(_choose_database)
+        app.after_request(_remember_write)
+
+
+def replicate_sqlite(source_path, replica_paths):
+    """
+    Stand-in replicator for local testing: copies a SQLite database into each replica with the backup API,
+    which takes a consistent snapshot even while the primary is being written to.
+    """
+    source = sqlite3.connect(source_path)
+    try:
+        for replica_path in replica_paths:
+            replica = sqlite3.connect(replica_path, timeout=30)
+            try:
+                source.backup(replica)
+            finally:
+                replica.close()
+    finally:
+        source.close()
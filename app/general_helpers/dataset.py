@@ -0,0 +1,230 @@
+from app.extensions import db
+from app.models.user import Blog_User
+from app.models.themes import Blog_Theme
+from app.models.posts import Blog_Posts
+from app.models.comments import Blog_Comments, Blog_Replies
+from app.models.likes import Blog_Likes
+from app.models.bookmarks import Blog_Bookmarks
+from app.models.counters import increment_stat
+from app.account.helpers import hash_password
+from sqlalchemy import func
+from collections import Counter
+from datetime import datetime, timedelta
+import itertools
+import random
+
+# Synthetic dataset for load testing ("flask generate-dataset")
+# Adds users, themes, posts, comments, replies, likes and bookmarks in the volumes asked for, e.g.
+#   flask --app run generate-dataset --users 100000 --posts 20000 --comments 200000 --replies 200000 --likes 1000000
+#   - Deterministic: the same seed, volumes and end date on the same database give the same rows.
+#   - Realistic skew: popularity follows a Zipf-like law (exponent skew), so a few posts get most of the likes,
+#     bookmarks and comments, a few users do most of the liking and commenting, and a few authors write most posts.
+#   - Fast: the rows are generated in memory and written with bulk Core inserts of batch_size rows, every synthetic
+#     user shares one password hash (SYNTHETIC_PASSWORD), texts and delays are drawn from pools generated once, and
+#     the post counters and blog statistics are computed while generating instead of being recounted.
+# Rows are added to what the database holds (new ids follow the existing ones). The synthetic users only like,
+# bookmark and comment the synthetic posts.
+
+SYNTHETIC_PASSWORD = "synthetic123"
+AUTHOR_SHARE = 0.05  # share of the synthetic users who are authors
+APPROVED_SHARE = 0.97  # share of the synthetic posts approved by the admin
+DEFAULT_END_DATE = datetime(2025, 1, 1)
+POOL_SIZE = 2000  # distinct texts (and delays) drawn from for each kind of row
+THEME_NAMES = ["Beaches", "Mountains", "Cities", "Countryside", "Islands", "Deserts", "Rivers", "Forests"]
+
+_WORDS = (
+    "travel trip journey road beach sea ocean island mountain trail hike valley river lake forest city street "
+    "market cafe museum bridge harbour village coast sunset sunrise morning evening night local food dinner "
+    "breakfast train bus ferry flight hotel hostel camp tent map guide view light colour wind rain sun snow "
+    "summer winter spring autumn week day hour walk ride swim climb explore discover visit return remember "
+    "quiet busy beautiful old new small big warm cold long short hidden famous friendly simple perfect"
+).split()
+
+
+def _sentence(rng, min_words, max_words):
+    words = rng.choices(_WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + "."
+
+
+def _title(rng):
+    return " ".join(word.capitalize() for word in rng.choices(_WORDS, k=rng.randint(3, 7)))
+
+
+def _body(rng):
+    paragraphs = (" ".join(_sentence(rng, 8, 20) for _ in range(rng.randint(3, 6))) for _ in range(rng.randint(3, 6)))
+    return "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+
+
+def _pool(rng, make):
+    return [make(rng) for _ in range(POOL_SIZE)]
+
+
+def _dates_after(rng, dates, mean_days, end_date):
+    """
+    For each date, a date later by a random delay (exponentially distributed, mean_days on average), at most end_date.
+    """
+    delays = _pool(rng, lambda rng: timedelta(seconds=rng.expovariate(1 / (mean_days * 86400))))
+    return [min(date + delay, end_date) for date, delay in zip(dates, rng.choices(delays, k=len(dates)))]
+
+
+def _popularity(rng, ids, skew):
+    """
+    Returns a function drawing k ids, the most popular ones (a random few) being drawn far more often than the others.
+    """
+    ids = list(ids)
+    rng.shuffle(ids)
+    cum_weights = list(itertools.accumulate(1 / rank ** skew for rank in range(1, len(ids) + 1)))
+    return lambda k: rng.choices(ids, cum_weights=cum_weights, k=k)
+
+
+def _unique_pairs(draw_users, draw_posts, count):
+    """
+    count distinct (user_id, post_id) pairs, in the order they were drawn. Returns fewer when the popular pairs are
+    exhausted and new draws keep hitting pairs already taken.
+    """
+    pairs = {}
+    stalled = 0
+    while len(pairs) < count and stalled < 5:
+        missing = count - len(pairs)
+        before = len(pairs)
+        pairs.update(dict.fromkeys(zip(draw_users(missing), draw_posts(missing))))
+        stalled = stalled + 1 if len(pairs) - before < missing // 100 else 0
+    return list(pairs)[:count]
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _insert(model, rows, batch_size, progress):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(model.__table__.insert(), rows[start:start + batch_size])
+        if progress:
+            progress(model.__tablename__, min(start + batch_size, len(rows)), len(rows))
+
+
+def generate_dataset(users=1000, themes=0, posts=1000, comments=10000, replies=10000, likes=50000, bookmarks=10000,
+                     seed=0, skew=1.1, end_date=DEFAULT_END_DATE, batch_size=10000, progress=None):
+    """
+    Generates and inserts a synthetic dataset, in one transaction.
+
+    Args:
+        progress: optional function called with (table name, rows inserted, rows to insert) after every batch.
+
+    Returns:
+        Counter: The number of rows inserted per table.
+    """
+    if posts and not users:
+        raise ValueError("Posts need authors: generate at least one user")
+    if (comments or replies or likes or bookmarks) and not (users and posts):
+        raise ValueError("Comments, replies, likes and bookmarks need users and posts")
+
+    rng = random.Random(seed)
+    start = end_date - timedelta(days=3 * 365)
+    span = (end_date - start).total_seconds()
+    inserted = Counter()
+
+    # themes: the new ones, or the existing ones (the 4 default themes are created if there are none)
+    theme_ids = [theme_id for theme_id, in db.session.query(Blog_Theme.id).order_by(Blog_Theme.id)]
+    if themes or not theme_ids:
+        count = themes or 4
+        first_id = _next_id(Blog_Theme)
+        rows = [{"id": first_id + i, "theme": f"{THEME_NAMES[i % len(THEME_NAMES)]} {first_id + i}",
+                 "picture": "Picture_default.jpg"} for i in range(count)]
+        _insert(Blog_Theme, rows, batch_size, progress)
+        inserted["blog_theme"] = count
+        theme_ids = theme_ids + [row["id"] for row in rows]
+
+    # users: one shared password hash, a few of them are authors
+    password = hash_password(SYNTHETIC_PASSWORD)
+    first_user_id = _next_id(Blog_User)
+    user_ids = list(range(first_user_id, first_user_id + users))
+    author_count = max(1, int(users * AUTHOR_SHARE)) if users else 0
+    author_ids = user_ids[:author_count]
+    abouts = _pool(rng, lambda rng: _sentence(rng, 10, 30))
+    user_rows = [{
+        "id": user_id, "name": f"Synthetic User {user_id}", "email": f"user{user_id}@synthetic.test",
+        "password": password, "date_created": start + timedelta(seconds=rng.random() * span),
+        "about": rng.choice(abouts) if index < author_count else "", "picture": "Picture_default.jpg",
+        "type": "author" if index < author_count else "user", "blocked": False,
+    } for index, user_id in enumerate(user_ids)]
+
+    # posts: written by the popular authors, spread over the 3 years before end_date
+    first_post_id = _next_id(Blog_Posts)
+    post_ids = list(range(first_post_id, first_post_id + posts))
+    pictures = db.session.query(Blog_Posts.picture_v, Blog_Posts.picture_h, Blog_Posts.picture_s,
+                                Blog_Posts.picture_alt).filter(Blog_Posts.picture_v.isnot(None)).limit(50).all()
+    intros = _pool(rng, lambda rng: _sentence(rng, 12, 25)[:200])
+    bodies = [_body(rng) for _ in range(min(posts, POOL_SIZE // 10))]
+    post_dates = {}
+    post_rows = []
+    draw_authors = _popularity(rng, author_ids, skew) if author_ids else None
+    authors_drawn = draw_authors(posts) if posts else []
+    for post_id, author_id in zip(post_ids, authors_drawn):
+        date_to_post = start + timedelta(seconds=rng.random() * span)
+        post_dates[post_id] = date_to_post
+        picture = rng.choice(pictures) if pictures else (None, None, None, None)
+        post_rows.append({
+            "id": post_id, "title": _title(rng), "intro": rng.choice(intros), "body": rng.choice(bodies),
+            "date_submitted": date_to_post - timedelta(seconds=rng.random() * 3 * 86400), "date_to_post": date_to_post,
+            "picture_v": picture[0], "picture_h": picture[1], "picture_s": picture[2], "picture_alt": picture[3],
+            "admin_approved": rng.random() < APPROVED_SHARE, "featured": False,
+            "author_id": author_id, "theme_id": rng.choice(theme_ids),
+        })
+
+    draw_users = _popularity(rng, user_ids, skew) if user_ids else None
+    draw_posts = _popularity(rng, post_ids, skew) if post_ids else None
+
+    comment_rows = []
+    if comments:
+        first_comment_id = _next_id(Blog_Comments)
+        commented_posts = draw_posts(comments)
+        texts = rng.choices(_pool(rng, lambda rng: _sentence(rng, 4, 40)[:500]), k=comments)
+        dates = _dates_after(rng, [post_dates[post_id] for post_id in commented_posts], 6, end_date)
+        comment_rows = [{"id": first_comment_id + i, "post_id": post_id, "user_id": user_id, "text": text,
+                         "date_submitted": date, "blocked": False}
+                        for i, (post_id, user_id, text, date) in enumerate(
+                            zip(commented_posts, draw_users(comments), texts, dates))]
+
+    reply_rows = []
+    if replies and comment_rows:
+        first_reply_id = _next_id(Blog_Replies)
+        replied_comments = [comment_rows[index] for index in _popularity(rng, range(len(comment_rows)), skew)(replies)]
+        texts = rng.choices(_pool(rng, lambda rng: _sentence(rng, 3, 30)[:500]), k=replies)
+        dates = _dates_after(rng, [comment["date_submitted"] for comment in replied_comments], 1, end_date)
+        reply_rows = [{"id": first_reply_id + i, "comment_id": comment["id"], "post_id": comment["post_id"],
+                       "user_id": user_id, "text": text, "date_submitted": date, "blocked": False, "likes": 0}
+                      for i, (comment, user_id, text, date) in enumerate(
+                          zip(replied_comments, draw_users(replies), texts, dates))]
+
+    # likes and bookmarks: inserted in the order of their (user_id, post_id) unique index, which is much faster
+    like_rows = []
+    bookmark_rows = []
+    for rows, count in ((like_rows, likes), (bookmark_rows, bookmarks)):
+        if count:
+            pairs = sorted(_unique_pairs(draw_users, draw_posts, count))
+            dates = _dates_after(rng, [post_dates[post_id] for _, post_id in pairs], 12, end_date)
+            rows.extend({"user_id": user_id, "post_id": post_id, "date_submitted": date}
+                        for (user_id, post_id), date in zip(pairs, dates))
+
+    # post counters, as maintained by the write paths
+    for counter, rows in (("like_count", like_rows), ("bookmark_count", bookmark_rows),
+                          ("comment_count", comment_rows), ("reply_count", reply_rows)):
+        counts = Counter(row["post_id"] for row in rows)
+        for post in post_rows:
+            post[counter] = counts[post["id"]]
+
+    for model, rows in ((Blog_User, user_rows), (Blog_Posts, post_rows), (Blog_Comments, comment_rows),
+                        (Blog_Replies, reply_rows), (Blog_Likes, like_rows), (Blog_Bookmarks, bookmark_rows)):
+        _insert(model, rows, batch_size, progress)
+        inserted[model.__tablename__] = len(rows)
+
+    for column, delta in (("user_total", users), ("user_active_total", users),
+                          ("posts_approved", sum(post["admin_approved"] for post in post_rows)),
+                          ("comments_total", len(comment_rows)), ("likes_total", len(like_rows)),
+                          ("bookmarks_total", len(bookmark_rows))):
+        if delta:
+            increment_stat(column, delta)
+
+    db.session.commit()
+    return inserted
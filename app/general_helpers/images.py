@@ -0,0 +1,215 @@
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import os
+import threading
+
+# Responsive image derivatives
+# Uploaded pictures (post, theme and profile pictures) are kept as they are, and resized copies are generated for the
+# pages, in WebP and JPEG, at every width of DERIVATIVE_WIDTHS:
+#   static/Pictures_Derivatives/<Pictures_Posts|Pictures_Themes|Pictures_Users>/<name>_<size>.<webp|jpg>
+# Resizing a multi-megabyte picture takes a CPU for a while, so it never happens in the request: queue_derivatives()
+# hands the file to a small process pool (IMAGE_WORKERS processes) and returns straight away.
+# Until the derivatives exist, pages keep using the original picture.
+# Profile pictures are queued when they are uploaded. Post and theme pictures are not uploaded through the app but
+# copied to their folders: "flask build-image-derivatives" generates the missing derivatives of every picture.
+
+DERIVATIVE_WIDTHS = {"thumb": 320, "card": 640, "hero": 1280}
+DERIVATIVE_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+DERIVATIVE_QUALITY = 80
+DERIVATIVES_PATH = "Pictures_Derivatives"
+
+# kind of picture -> folder of the originals, relative to the static folder
+PICTURE_FOLDERS = {
+    "posts": "Pictures_Posts",
+    "themes": "Pictures_Themes",
+    "users": "Pictures_Users",
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _derivative_name(filename, size, extension):
+    return f"{filename.rsplit('.', 1)[0]}_{size}.{extension}"
+
+
+def _static_folder():
+    return current_app.config.get("STATIC_FOLDER") or current_app.static_folder
+
+
+def _source_path(kind, filename):
+    return os.path.join(_static_folder(), PICTURE_FOLDERS[kind], filename)
+
+
+def _derivatives_folder(kind):
+    return os.path.join(_static_folder(), DERIVATIVES_PATH, PICTURE_FOLDERS[kind])
+
+
+def make_derivatives(source_path, output_folder, widths=None, quality=DERIVATIVE_QUALITY):
+    """
+    Writes the resized WebP and JPEG copies of a picture. Runs in the worker processes: it only takes paths and plain
+    values, and doesn't need the app. Derivatives that are newer than the original are left as they are.
+    Pictures narrower than a width are not enlarged.
+    Returns the number of files written.
+    """
+    from PIL import Image, ImageOps
+
+    widths = widths or DERIVATIVE_WIDTHS
+    filename = os.path.basename(source_path)
+    os.makedirs(output_folder, exist_ok=True)
+    source_modified = os.path.getmtime(source_path)
+
+    outputs = {}
+    for size, width in widths.items():
+        for extension, image_format in DERIVATIVE_FORMATS.items():
+            path = os.path.join(output_folder, _derivative_name(filename, size, extension))
+            if not os.path.exists(path) or os.path.getmtime(path) < source_modified:
+                outputs[path] = (width, image_format)
+    if not outputs:
+        return 0
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        # JPEG has no transparency: flatten PNGs on a white background
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        resized = {}
+        for path, (width, image_format) in outputs.items():
+            if width not in resized:
+                if image.width > width:
+                    height = round(image.height * width / image.width)
+                    resized[width] = image.resize((width, height), Image.LANCZOS)
+                else:
+                    resized[width] = image
+            # write to a temporary file first, so a page never links to a half written picture
+            temporary_path = f"{path}.tmp"
+            options = {"method": 4} if image_format == "WEBP" else {"optimize": True, "progressive": True}
+            resized[width].save(temporary_path, image_format, quality=quality, **options)
+            os.replace(temporary_path, path)
+    return len(outputs)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=current_app.config.get("IMAGE_WORKERS", 2))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def queue_derivatives(kind, filename):
+    """
+    Generates the derivatives of an uploaded picture in the process pool, off the request.
+    kind is "posts", "themes" or "users". Returns the future of the job, or None if there is no picture.
+    """
+    if not filename:
+        return None
+    future = _get_pool().submit(make_derivatives, _source_path(kind, filename), _derivatives_folder(kind))
+    logger = current_app.logger
+
+    def log_failure(done):
+        if done.exception() is not None:
+            logger.warning(f"Image derivatives of {filename} could not be generated: {done.exception()}")
+    future.add_done_callback(log_failure)
+    return future
+
+
+def delete_derivatives(kind, filename):
+    """
+    Deletes the derivatives of a picture, when the original is deleted or replaced.
+    """
+    if not filename:
+        return
+    folder = _derivatives_folder(kind)
+    for size in DERIVATIVE_WIDTHS:
+        for extension in DERIVATIVE_FORMATS:
+            path = os.path.join(folder, _derivative_name(filename, size, extension))
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def build_all_derivatives():
+    """
+    Generates the missing or outdated derivatives of every picture of the static folders, in the process pool.
+    Returns (pictures, files written).
+    """
+    jobs = []
+    for kind, folder in PICTURE_FOLDERS.items():
+        source_folder = os.path.join(_static_folder(), folder)
+        if not os.path.isdir(source_folder):
+            continue
+        for filename in sorted(os.listdir(source_folder)):
+            if filename.rsplit(".", 1)[-1].upper() in current_app.config["ALLOWED_IMG_EXTENSIONS"]:
+                jobs.append((os.path.join(source_folder, filename), _derivatives_folder(kind)))
+
+    written = 0
+    pool = _get_pool()
+    for source_path, future in [(job[0], pool.submit(make_derivatives, *job)) for job in jobs]:
+        try:
+            written += future.result()
+        except Exception as e:
+            current_app.logger.warning(f"Image derivatives of {source_path} could not be generated: {e}")
+    return len(jobs), written
+
+
+# Template helpers
+def _derivative_exists(kind, filename):
+    # the largest JPEG is written last: once it exists, the whole set does
+    name = _derivative_name(filename, list(DERIVATIVE_WIDTHS)[-1], list(DERIVATIVE_FORMATS)[-1])
+    return os.path.exists(os.path.join(_derivatives_folder(kind), name))
+
+
+def _derivative_url(kind, filename, size, extension):
+    name = _derivative_name(filename, size, extension)
+    return url_for("static", filename=f"{DERIVATIVES_PATH}/{PICTURE_FOLDERS[kind]}/{name}")
+
+
+def image_url(kind, filename, size=None, extension="jpg"):
+    """
+    URL of a picture: the derivative of the given size if it was generated, the original otherwise.
+    """
+    if size and filename and _derivative_exists(kind, filename):
+        return _derivative_url(kind, filename, size, extension)
+    return url_for("static", filename=f"{PICTURE_FOLDERS[kind]}/{filename}")
+
+
+def image_srcset(kind, filename, extension="jpg"):
+    """
+    srcset attribute value listing every derivative width, or "" if the derivatives were not generated yet.
+    """
+    if not filename or not _derivative_exists(kind, filename):
+        return ""
+    return ", ".join(f"{_derivative_url(kind, filename, size, extension)} {width}w"
+                     for size, width in DERIVATIVE_WIDTHS.items())
+
+
+def responsive_image(kind, filename, alt="", size="card", sizes="100vw", **attributes):
+    """
+    <picture> element serving the WebP derivatives to browsers that support them and the JPEG ones otherwise,
+    falling back to the original picture. Extra keyword arguments become attributes of the <img> (class_ for class).
+    Pictures are lazy loaded unless loading="eager" is given, e.g. for the first picture of the page.
+    """
+    attributes.setdefault("loading", "lazy")
+    attributes = "".join(f' {name.rstrip("_").replace("_", "-")}="{escape(value)}"'
+                         for name, value in attributes.items())
+    img = f'<img src="{escape(image_url(kind, filename, size))}" alt="{escape(alt)}"{attributes}'
+    webp_srcset = image_srcset(kind, filename, "webp")
+    if not webp_srcset:
+        return Markup(f'{img}>')
+    return Markup(
+        f'<picture><source type="image/webp" srcset="{escape(webp_srcset)}" sizes="{escape(sizes)}">'
+        f'{img} srcset="{escape(image_srcset(kind, filename))}" sizes="{escape(sizes)}"></picture>')
+
+
+def init_images(app):
+    app.config.setdefault("IMAGE_WORKERS", 2)
+    app.jinja_env.globals.update(image_url=image_url, image_srcset=image_srcset, responsive_image=responsive_image)
@@ -0,0 +1,247 @@
+from app.extensions import db
+from app.models.outbox import Blog_Outbox
+from email.message import EmailMessage
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
+import atexit
+import queue
+import smtplib
+import threading
+import uuid
+
+# Outbox worker
+# Emails are never sent from a request: the request adds a Blog_Outbox row in its own transaction (queue_email) and
+# wakes the worker up (notify_outbox). A small pool of background threads drains the outbox:
+#   - each thread claims a batch of due messages (pending ones, or ones stuck in "sending" after a crash),
+#   - sends them over an SMTP connection taken from a shared pool, which is kept open and reused between batches,
+#   - marks them as sent, or schedules a retry with exponential backoff, giving up after OUTBOX_MAX_ATTEMPTS.
+# Messages left over (e.g. SMTP server down) are retried on the next poll, every OUTBOX_POLL_INTERVAL seconds.
+# "flask drain-outbox" sends everything that is due from the command line.
+#
+# SMTP settings (MAIL_SERVER, MAIL_PORT, MAIL_USE_SSL, MAIL_USERNAME, MAIL_PASSWORD) are read from the config, e.g. to
+# test locally against aiosmtpd: python -m aiosmtpd -n -l localhost:8025, with MAIL_SERVER=localhost,
+# MAIL_PORT=8025 and MAIL_USE_SSL=False (tests/test_outbox.py runs the worker against one).
+
+_app = None
+_connections = None
+_wake_up = threading.Event()
+_stop = threading.Event()
+_workers = []
+_start_lock = threading.Lock()
+
+
+def init_outbox(app):
+    global _app, _connections
+    app.config.setdefault("OUTBOX_WORKERS", 2)
+    app.config.setdefault("OUTBOX_BATCH_SIZE", 20)
+    app.config.setdefault("OUTBOX_POLL_INTERVAL", 30)
+    app.config.setdefault("OUTBOX_MAX_ATTEMPTS", 8)
+    app.config.setdefault("OUTBOX_BACKOFF_SECONDS", 30)
+    app.config.setdefault("OUTBOX_CLAIM_TIMEOUT", 600)
+    app.config.setdefault("MAIL_TIMEOUT", 10)
+    _app = app
+    _connections = queue.LifoQueue(maxsize=max(app.config["OUTBOX_WORKERS"], 1))
+
+
+# Queueing
+def queue_email(subject, body, to_addr=None, reply_to=None):
+    """
+    Adds an email to the outbox. It is NOT committed: it is sent only if the caller's transaction is committed.
+    to_addr defaults to the blog's own address (MAIL_USERNAME). Call notify_outbox() after the commit.
+    Returns None, without queueing anything, when there is no address to send to (MAIL_USERNAME not configured).
+    """
+    sender = _app.config.get("MAIL_USERNAME")
+    if not (to_addr or sender):
+        _app.logger.warning(f"No email address configured (EMAIL_ADDRESS), email not sent: {subject}")
+        return None
+    message = Blog_Outbox(from_addr=sender, to_addr=to_addr or sender, reply_to=reply_to,
+                          subject=subject, body=body)
+    db.session.add(message)
+    return message
+
+
+def notify_outbox():
+    """
+    Wakes the outbox workers up, starting them the first time.
+    """
+    start_outbox_workers()
+    _wake_up.set()
+
+
+# SMTP connection pool
+def _connect():
+    config = _app.config
+    smtp_class = smtplib.SMTP_SSL if config.get("MAIL_USE_SSL", True) else smtplib.SMTP
+    connection = smtp_class(config.get("MAIL_SERVER", "smtp.gmail.com"), config.get("MAIL_PORT", 465),
+                            timeout=config["MAIL_TIMEOUT"])
+    if config.get("MAIL_USERNAME") and config.get("MAIL_PASSWORD"):
+        connection.login(config["MAIL_USERNAME"], config["MAIL_PASSWORD"])
+    return connection
+
+
+def _get_connection():
+    """
+    Returns a pooled connection that still answers, or a new one.
+    """
+    while True:
+        try:
+            connection = _connections.get_nowait()
+        except queue.Empty:
+            return _connect()
+        try:
+            if connection.noop()[0] == 250:
+                return connection
+        except smtplib.SMTPException:
+            pass
+        except OSError:
+            pass
+        _close(connection)
+
+
+def _release_connection(connection):
+    try:
+        _connections.put_nowait(connection)
+    except queue.Full:
+        _close(connection)
+
+
+def _close(connection):
+    try:
+        connection.quit()
+    except (smtplib.SMTPException, OSError):
+        pass
+
+
+# Draining
+def _to_email_message(message):
+    email = EmailMessage()
+    email["Subject"] = message.subject
+    email["From"] = message.from_addr or message.to_addr
+    email["To"] = message.to_addr
+    if message.reply_to:
+        email["Reply-To"] = message.reply_to
+    email.set_content(message.body)
+    return email
+
+
+def _claim_batch():
+    """
+    Marks up to OUTBOX_BATCH_SIZE due messages as "sending" with a token unique to this call, and returns them.
+    Another worker (or process) running the same update at the same time can't claim the same rows.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=_app.config["OUTBOX_CLAIM_TIMEOUT"])
+    due = or_(
+        and_(Blog_Outbox.status == "pending", Blog_Outbox.next_attempt_at <= now),
+        and_(Blog_Outbox.status == "sending", Blog_Outbox.claimed_at < stale)
+    )
+    ids = [row.id for row in db.session.query(Blog_Outbox.id).filter(due).order_by(
+        Blog_Outbox.next_attempt_at, Blog_Outbox.id).limit(_app.config["OUTBOX_BATCH_SIZE"])]
+    if not ids:
+        db.session.rollback()
+        return []
+
+    token = uuid.uuid4().hex
+    db.session.query(Blog_Outbox).filter(Blog_Outbox.id.in_(ids), due).update(
+        {Blog_Outbox.status: "sending", Blog_Outbox.claim_token: token, Blog_Outbox.claimed_at: now},
+        synchronize_session=False)
+    db.session.commit()
+    return db.session.query(Blog_Outbox).filter(Blog_Outbox.claim_token == token).order_by(Blog_Outbox.id).all()
+
+
+def _failed(message, error, permanent=False):
+    """
+    Schedules a retry, or gives up after OUTBOX_MAX_ATTEMPTS, or at once if the error is permanent.
+    """
+    message.attempts += 1
+    message.last_error = str(error)[:500]
+    message.claim_token = None
+    if permanent or message.attempts >= _app.config["OUTBOX_MAX_ATTEMPTS"]:
+        message.status = "failed"
+        _app.logger.error(f"Giving up on email {message.id} after {message.attempts} attempts: {error}")
+    else:
+        backoff = _app.config["OUTBOX_BACKOFF_SECONDS"] * 2 ** (message.attempts - 1)
+        message.status = "pending"
+        message.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+
+
+def drain_outbox():
+    """
+    Sends due messages batch after batch until none is left. Must be called within an app context.
+    Returns (sent, failed): the number of messages sent and the number of failed attempts.
+    Each message's status is committed as soon as it is sent, so a later error can't cause it to be sent twice.
+    """
+    sent = failed = 0
+    while True:
+        batch = _claim_batch()
+        if not batch:
+            return sent, failed
+
+        connection = None
+        server_failed = False
+        for position, message in enumerate(batch):
+            try:
+                email = _to_email_message(message)
+                if connection is None:
+                    connection = _get_connection()
+                connection.send_message(email)
+                message.status = "sent"
+                message.date_sent = datetime.utcnow()
+                message.claim_token = None
+                sent += 1
+            except ValueError as e:
+                # the message itself is malformed (e.g. a line break in a header): it would fail again
+                _failed(message, e, permanent=True)
+                failed += 1
+            except (smtplib.SMTPException, OSError) as e:
+                _failed(message, e)
+                failed += 1
+                # the connection may be broken: drop it, and don't hammer a failing server with the rest of the
+                # batch, which goes back to pending for the next poll
+                if connection is not None:
+                    _close(connection)
+                    connection = None
+                for unsent in batch[position + 1:]:
+                    unsent.status = "pending"
+                    unsent.claim_token = None
+                server_failed = True
+                break
+            finally:
+                db.session.commit()
+        if connection is not None:
+            _release_connection(connection)
+
+        if server_failed:
+            return sent, failed
+
+
+def _work():
+    while not _stop.is_set():
+        _wake_up.clear()
+        with _app.app_context():
+            try:
+                drain_outbox()
+            except Exception as e:
+                db.session.rollback()
+                _app.logger.warning(f"Outbox could not be drained, will retry: {e}")
+        _wake_up.wait(_app.config["OUTBOX_POLL_INTERVAL"])
+
+
+def start_outbox_workers():
+    with _start_lock:
+        if _workers or _app.config["OUTBOX_WORKERS"] < 1:
+            return
+        for i in range(_app.config["OUTBOX_WORKERS"]):
+            worker = threading.Thread(target=_work, name=f"outbox-worker-{i}", daemon=True)
+            _workers.append(worker)
+            worker.start()
+        atexit.register(stop_outbox_workers)
+
+
+def stop_outbox_workers():
+    _stop.set()
+    _wake_up.set()
+    for worker in _workers:
+        worker.join()
+    while not _connections.empty():
+        _close(_connections.get_nowait())
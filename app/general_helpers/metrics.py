@@ -0,0 +1,300 @@
+from flask import request, current_app, abort, before_render_template, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from bisect import bisect_left
+import threading
+import json
+import time
+import os
+
+# Request metrics
+# Every request measures its SQL (number of queries, time spent in the database, from the engine events) and its
+# template rendering (time between the before_render_template and template_rendered signals, minus the queries run
+# by the template itself, e.g. lazy loads). The rest of the request time is Python: view, hooks, serialisation.
+#   - Server-Timing header (SERVER_TIMING_ENABLED): db, render and total durations of the request, shown by the
+#     network panel of the browser. The render time of a streamed page only covers what was rendered before the
+#     headers were sent.
+#   - /metrics (Prometheus text format): per endpoint request counters, latency histograms and the total query
+#     count, database and render time. Reserved to the admins, or to a scraper sending METRICS_TOKEN as a Bearer token.
+#
+# Aggregation is lock-free: every thread adds its requests to its own aggregate, which only it writes, and a scrape
+# merges the aggregates of all the threads (those of finished threads are folded into a retired aggregate).
+# With several worker processes, set METRICS_DIR: every worker then writes a snapshot of its aggregates there every
+# METRICS_FLUSH_INTERVAL seconds, and a scrape merges the snapshots of all the workers.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+MAX_THREAD_AGGREGATES = 256  # the aggregates of the finished threads are folded when there are more
+
+# fields of the per-endpoint stats, followed by the histogram bucket counts (not cumulative, the last one is +Inf)
+_COUNT, _DURATION, _DB, _RENDER, _QUERIES = range(5)
+_FIELDS = 5
+
+_local = threading.local()
+_aggregates = {}  # thread -> _Aggregate, each written by its own thread only
+_scrape_lock = threading.Lock()  # taken by the scrapes and snapshots, never to record a request
+_settings = {"buckets": DEFAULT_BUCKETS, "dir": None, "flush_interval": 5, "last_flush": 0.0}
+
+
+class _Aggregate:
+    """
+    Request counts per (endpoint, method, status), and stats per endpoint, of one thread or merged.
+    """
+
+    def __init__(self):
+        self.requests = {}
+        self.endpoints = {}
+
+    def add(self, endpoint, method, status, timing, duration):
+        key = (endpoint, method, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = [0] * (_FIELDS + len(_settings["buckets"]) + 1)
+        stats[_COUNT] += 1
+        stats[_DURATION] += duration
+        stats[_DB] += timing.db
+        stats[_RENDER] += timing.render
+        stats[_QUERIES] += timing.queries
+        stats[_FIELDS + bisect_left(_settings["buckets"], duration)] += 1
+
+    def merge(self, requests, endpoints):
+        for key, count in requests:
+            self.requests[key] = self.requests.get(key, 0) + count
+        for endpoint, stats in endpoints:
+            merged = self.endpoints.get(endpoint)
+            if merged is None:
+                self.endpoints[endpoint] = list(stats)
+            elif len(merged) == len(stats):
+                self.endpoints[endpoint] = [a + b for a, b in zip(merged, stats)]
+
+    def snapshot(self):
+        # dict.copy() and list() are atomic: safe while the owning thread keeps adding requests
+        requests = self.requests.copy()
+        endpoints = self.endpoints.copy()
+        return list(requests.items()), [(endpoint, list(stats)) for endpoint, stats in endpoints.items()]
+
+
+_retired = _Aggregate()
+
+
+class Request_Timing:
+    """
+    What the current request has spent so far.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.rendering = []  # (start, db time at start) of the templates being rendered
+
+
+def current_timing():
+    """
+    The Request_Timing of the request handled by this thread, or None.
+    """
+    return getattr(_local, "timing", None)
+
+
+def _thread_aggregate():
+    aggregate = getattr(_local, "aggregate", None)
+    if aggregate is None:
+        if len(_aggregates) >= MAX_THREAD_AGGREGATES:
+            # e.g. a server starting a thread per request and never scraped
+            _worker_aggregate()
+        aggregate = _local.aggregate = _Aggregate()
+        _aggregates[threading.current_thread()] = aggregate
+    return aggregate
+
+
+# SQLAlchemy engine events (every engine, replicas included)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and current_timing() is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = current_timing()
+    started = getattr(context, "_metrics_started", None)
+    if timing is not None and started is not None:
+        timing.queries += 1
+        timing.db += time.perf_counter() - started
+
+
+# Template signals
+
+def _before_render(sender, template, context, **extra):
+    timing = current_timing()
+    if timing is not None:
+        timing.rendering.append((time.perf_counter(), timing.db))
+
+
+def _rendered(sender, template, context, **extra):
+    timing = current_timing()
+    if timing is not None and timing.rendering:
+        started, db_at_start = timing.rendering.pop()
+        if not timing.rendering:
+            # nested renders are part of the outer one; the queries of the template are database time
+            timing.render += time.perf_counter() - started - (timing.db - db_at_start)
+
+
+# Request hooks
+
+def _start_request():
+    _local.timing = Request_Timing()
+
+
+def _finish_request(response):
+    timing = current_timing()
+    if timing is None:
+        return response
+    _local.timing = None
+    duration = time.perf_counter() - timing.started
+
+    if current_app.config["SERVER_TIMING_ENABLED"]:
+        response.headers.add("Server-Timing", f'db;dur={timing.db * 1000:.1f};desc="{timing.queries} queries"')
+        response.headers.add("Server-Timing", f"render;dur={timing.render * 1000:.1f}")
+        response.headers.add("Server-Timing", f"total;dur={duration * 1000:.1f}")
+
+    _thread_aggregate().add(request.endpoint or "unmatched", request.method, response.status_code, timing, duration)
+    if _settings["dir"] and time.monotonic() - _settings["last_flush"] >= _settings["flush_interval"]:
+        _settings["last_flush"] = time.monotonic()
+        _write_worker_snapshot()
+    return response
+
+
+# Aggregation
+
+def _worker_aggregate():
+    """
+    The aggregates of every thread of this worker, merged. Folds the aggregates of the finished threads into the
+    retired one.
+    """
+    with _scrape_lock:
+        merged = _Aggregate()
+        merged.merge(*_retired.snapshot())
+        for thread, aggregate in _aggregates.copy().items():
+            if thread.is_alive():
+                merged.merge(*aggregate.snapshot())
+            else:
+                # a finished thread adds nothing anymore
+                _retired.merge(*aggregate.snapshot())
+                merged.merge(*aggregate.snapshot())
+                del _aggregates[thread]
+        return merged
+
+
+def _write_worker_snapshot():
+    requests, endpoints = _worker_aggregate().snapshot()
+    path = os.path.join(_settings["dir"], f"worker_{os.getpid()}.json")
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump({"buckets": list(_settings["buckets"]), "requests": [list(key) + [count] for key, count in requests],
+                   "endpoints": endpoints}, file)
+    os.replace(temporary, path)
+
+
+def collect_metrics():
+    """
+    The request metrics of this worker, merged with the snapshots of the other workers when METRICS_DIR is set.
+
+    Returns:
+        _Aggregate: requests {(endpoint, method, status): count} and endpoints {endpoint: stats}.
+    """
+    merged = _worker_aggregate()
+    directory = _settings["dir"]
+    if not directory:
+        return merged
+
+    own_snapshot = f"worker_{os.getpid()}.json"
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json") or name == own_snapshot:
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        if snapshot["buckets"] != list(_settings["buckets"]):
+            continue
+        merged.merge([(tuple(row[:3]), row[3]) for row in snapshot["requests"]],
+                     [(endpoint, stats) for endpoint, stats in snapshot["endpoints"]])
+    return merged
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(aggregate):
+    """
+    The metrics in the Prometheus text exposition format.
+    """
+    lines = ["# HELP blog_requests_total Requests handled.", "# TYPE blog_requests_total counter"]
+    for (endpoint, method, status), count in sorted(aggregate.requests.items()):
+        lines.append(f'blog_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} '
+                     f'{count}')
+
+    lines += ["# HELP blog_request_duration_seconds Request latency.",
+              "# TYPE blog_request_duration_seconds histogram"]
+    for endpoint, stats in sorted(aggregate.endpoints.items()):
+        label = _label(endpoint)
+        cumulative = 0
+        for bound, count in zip(list(_settings["buckets"]) + ["+Inf"], stats[_FIELDS:]):
+            cumulative += count
+            lines.append(f'blog_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'blog_request_duration_seconds_sum{{endpoint="{label}"}} {stats[_DURATION]:.6f}')
+        lines.append(f'blog_request_duration_seconds_count{{endpoint="{label}"}} {stats[_COUNT]}')
+
+    for name, field, description in (
+            ("blog_request_queries_total", _QUERIES, "SQL queries run by the requests."),
+            ("blog_request_db_seconds_total", _DB, "Time the requests spent running SQL queries."),
+            ("blog_request_render_seconds_total", _RENDER, "Time the requests spent rendering templates.")):
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+        for endpoint, stats in sorted(aggregate.endpoints.items()):
+            value = stats[field] if field == _QUERIES else f"{stats[field]:.6f}"
+            lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def metrics():
+    """
+    /metrics: for the admins, or for a scraper sending the METRICS_TOKEN as a Bearer token.
+    """
+    token = current_app.config["METRICS_TOKEN"]
+    authorization = request.headers.get("Authorization", "")
+    if not (token and authorization == f"Bearer {token}"):
+        if not current_user.is_authenticated or current_user.type not in ["admin", "super_admin"]:
+            abort(403)
+    return current_app.response_class(prometheus_text(collect_metrics()),
+                                      content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def init_metrics(app):
+    app.config.setdefault("METRICS_ENABLED", True)
+    app.config.setdefault("SERVER_TIMING_ENABLED", True)
+    app.config.setdefault("METRICS_TOKEN", None)
+    app.config.setdefault("METRICS_DIR", None)
+    app.config.setdefault("METRICS_FLUSH_INTERVAL", 5)
+    app.config.setdefault("METRICS_BUCKETS", DEFAULT_BUCKETS)
+    if not app.config["METRICS_ENABLED"]:
+        return
+
+    _settings["buckets"] = tuple(sorted(app.config["METRICS_BUCKETS"]))
+    _settings["dir"] = app.config["METRICS_DIR"]
+    _settings["flush_interval"] = app.config["METRICS_FLUSH_INTERVAL"]
+    if _settings["dir"]:
+        os.makedirs(_settings["dir"], exist_ok=True)
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    # first before_request and last after_request (they run in reverse order): the timing covers the other hooks
+    app.before_request_funcs.setdefault(None, []).insert(0, _start_request)
+    app.after_request_funcs.setdefault(None, []).insert(0, _finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
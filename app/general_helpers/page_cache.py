@@ -0,0 +1,236 @@
+from app.general_helpers.database import use_primary
+from flask import request, session, make_response, current_app, g
+from flask_login import current_user
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+
+# Full-page cache for anonymous (logged-out) readers.
+#
+# Every cached page declares the "content versions" it is built from, e.g. "posts", "post:12", "themes", "users".
+# A content version is a random token plus the time it was created. Write paths (comments, likes, approving or
+# editing a post, ...) call bump_content_version() on the versions they change, which makes every page built from
+# them stale at once.
+#
+# The ETag of a page is derived from its path and the current tokens of its versions, and Last-Modified from the
+# newest of them. A conditional GET whose ETag still matches is answered with 304 before the view or the template
+# run. Otherwise the rendered body is looked up in the backend under that ETag and only rendered on a miss.
+#
+# Versions expire after PAGE_CACHE_MAX_AGE seconds (or when a scheduled post goes live), which bounds the staleness
+# of anything that changes without going through a write path, such as posts reaching their date_to_post.
+#
+# Backends: "memory" (per-worker LRU) or "filesystem" (shared by all the workers of a host), for the pages only.
+# The content versions are always kept on the filesystem (PAGE_CACHE_VERSION_DIR), one file per key, so that a write
+# handled by any worker invalidates the pages cached by all of them, and so that a version is never evicted (an
+# evicted version would be recreated with a new token and could bring a stale ETag back). Deployments running on
+# several hosts must point PAGE_CACHE_VERSION_DIR to a directory shared by them.
+
+
+class LRU_Cache_Backend:
+    """
+    In-process cache holding up to max_entries values, dropping the least recently used first.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class Filesystem_Cache_Backend:
+    """
+    Cache stored as one pickle file per key in a directory, so that it is shared between worker processes.
+    Files are written to a temporary name and renamed, readers never see a partial file.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            return None
+        return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.time() + timeout if timeout else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((expires, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for filename in os.listdir(self.cache_dir):
+            os.remove(os.path.join(self.cache_dir, filename))
+
+
+class Page_Cache:
+    """
+    Flask extension holding the page cache backend. Views opt in with the @page_cache.cached(...) decorator.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.versions = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PAGE_CACHE_ENABLED", True)
+        app.config.setdefault("PAGE_CACHE_BACKEND", "memory")
+        app.config.setdefault("PAGE_CACHE_MAX_ENTRIES", 512)
+        app.config.setdefault("PAGE_CACHE_DIR", os.path.join(app.instance_path, "page_cache"))
+        app.config.setdefault("PAGE_CACHE_VERSION_DIR", os.path.join(app.instance_path, "page_cache_versions"))
+        app.config.setdefault("PAGE_CACHE_MAX_AGE", 600)
+
+        if app.config["PAGE_CACHE_BACKEND"] == "filesystem":
+            self.backend = Filesystem_Cache_Backend(app.config["PAGE_CACHE_DIR"])
+        else:
+            self.backend = LRU_Cache_Backend(app.config["PAGE_CACHE_MAX_ENTRIES"])
+        self.versions = Filesystem_Cache_Backend(app.config["PAGE_CACHE_VERSION_DIR"])
+        app.extensions["page_cache"] = self
+
+    # Content versions
+    def _new_version(self, valid_until=None):
+        max_age = current_app.config["PAGE_CACHE_MAX_AGE"]
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=max_age)
+        if valid_until is not None and now < valid_until < expires:
+            expires = valid_until
+        return {"token": uuid.uuid4().hex[:16], "modified": now.replace(microsecond=0), "expires": expires}
+
+    def get_versions(self, keys):
+        """
+        Returns the current version record of every key, creating the ones that are missing or expired.
+        """
+        versions = []
+        now = datetime.utcnow()
+        for key in keys:
+            version = self.versions.get(key)
+            if version is None or version["expires"] <= now:
+                version = self._new_version()
+                self.versions.set(key, version)
+            versions.append(version)
+        return versions
+
+    def bump(self, *keys, valid_until=None):
+        """
+        Gives the keys new versions, which makes every cached page built from them stale.
+        valid_until (datetime, UTC) can be used to expire the new version early, e.g. when a post goes live.
+        """
+        for key in keys:
+            self.versions.set(key, self._new_version(valid_until))
+
+    # View decorator
+    def cached(self, depends_on):
+        """
+        Caches a view for anonymous GET requests.
+        depends_on receives the view arguments and returns the list of content version keys the page is built from.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if (request.method != "GET" or not current_app.config["PAGE_CACHE_ENABLED"]
+                        or current_user.is_authenticated or session.get("_flashes")):
+                    return view(*args, **kwargs)
+
+                versions = self.get_versions(depends_on(**kwargs))
+                etag = hashlib.sha1(
+                    "|".join([request.full_path] + [v["token"] for v in versions]).encode()
+                ).hexdigest()
+                last_modified = max(v["modified"] for v in versions)
+
+                # weak comparison: compressed responses carry the weak form of the ETag (see compression.py)
+                if request.if_none_match.contains_weak(etag) or (
+                        not request.if_none_match and request.if_modified_since
+                        and request.if_modified_since.replace(tzinfo=None) >= last_modified):
+                    response = current_app.response_class(status=304)
+                    return self._add_validators(response, etag, last_modified)
+
+                cached = self.backend.get(f"page:{etag}")
+                if cached is not None:
+                    body, mimetype = cached
+                    response = current_app.response_class(body, mimetype=mimetype)
+                    return self._add_validators(response, etag, last_modified)
+
+                # the body is needed in one piece to be stored: tells render_page() not to stream it
+                g.page_cache_filling = True
+                use_primary()
+                response = make_response(view(*args, **kwargs))
+                # pages that wrote to the session (e.g. a csrf token) are specific to this visitor
+                if (response.status_code == 200 and not session.modified and not response.direct_passthrough
+                        and not response.is_streamed):
+                    self.backend.set(f"page:{etag}", (response.get_data(), response.mimetype),
+                                     current_app.config["PAGE_CACHE_MAX_AGE"])
+                    self._add_validators(response, etag, last_modified)
+                return response
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _add_validators(response, etag, last_modified):
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        response.vary.add("Cookie")
+        return response
+
+
+def bump_content_version(*keys, valid_until=None):
+    """
+    Shortcut used by the write paths: bump_content_version("posts", f"post:{post.id}").
+    """
+    current_app.extensions["page_cache"].bump(*keys, valid_until=valid_until)
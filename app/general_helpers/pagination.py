@@ -0,0 +1,123 @@
+from sqlalchemy import tuple_, literal, asc, desc
+from collections import namedtuple
+from datetime import datetime
+import base64
+import json
+
+# Keyset (cursor) pagination
+# Instead of OFFSET, every page is fetched with "WHERE (key columns) < (last key seen)", so the database seeks straight
+# to the right place in the index and page N costs the same as page 1.
+# The cursor handed to the browser is an opaque url-safe token holding the key values of the first or last row of
+# the page and the direction to move in.
+
+Keyset_Page = namedtuple("Keyset_Page", ["rows", "next_cursor", "prev_cursor"])
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values, direction):
+    """
+    Turns the key values of a row and a direction ("next" or "prev") into an opaque url-safe token.
+    """
+    payload = json.dumps({"k": [_dump_value(v) for v in values], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Reverses encode_cursor. Returns (values, direction).
+    Missing or tampered tokens return (None, "next"), which is the first page.
+    """
+    if not token:
+        return None, "next"
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values = [_load_value(v) for v in payload["k"]]
+        direction = payload["d"] if payload["d"] in ("next", "prev") else "next"
+        return values, direction
+    except (ValueError, KeyError, TypeError):
+        return None, "next"
+
+
+def _fits_columns(values, columns):
+    """
+    Whether the values of a decoded cursor can be compared with the key columns: one value per column, each of the
+    column's python type (or None). Columns whose type has no python type accept any value.
+    """
+    if len(values) != len(columns):
+        return False
+    for value, column in zip(values, columns):
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            continue
+        if value is not None and not isinstance(value, python_type):
+            return False
+    return True
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=25, descending=True, row_factory=None):
+    """
+    Fetches one page of a query using keyset pagination.
+
+    Args:
+        query: the filtered query, without order_by or limit.
+        columns (list): the key columns, the last one must be unique (usually the primary key). Each row must expose
+            them as attributes with the same name as the column key.
+        cursor (str): the token received from a previous page, or None for the first page.
+        per_page (int): the number of rows per page.
+        descending (bool): whether the listing is ordered from the highest to the lowest key.
+        row_factory (callable): optionally applied to every row while the result is being read.
+
+    Returns:
+        Keyset_Page: the rows of the page and the tokens of the next and previous pages (None when there are none).
+    """
+    values, direction = decode_cursor(cursor)
+    # a well-formed token may still hold values of the wrong type (e.g. lists), which the query can't bind
+    if values is not None and not _fits_columns(values, columns):
+        values, direction = None, "next"
+    forward = direction == "next"
+    # moving back through the listing is done by reading it in reverse from the cursor
+    fetch_descending = descending if forward else not descending
+
+    if values is not None:
+        key = tuple_(*columns)
+        bound = tuple_(*[literal(value, column.type) for value, column in zip(values, columns)])
+        query = query.filter(key < bound if fetch_descending else key > bound)
+
+    order = desc if fetch_descending else asc
+    query = query.order_by(*[order(column) for column in columns]).limit(per_page + 1)
+
+    rows = []
+    has_more = False
+    for row in query:
+        if len(rows) == per_page:
+            has_more = True
+            break
+        rows.append(row_factory(row) if row_factory else row)
+
+    if not forward:
+        rows.reverse()
+
+    def key_of(row):
+        return [getattr(row, column.key) for column in columns]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if (forward and has_more) or not forward:
+            next_cursor = encode_cursor(key_of(rows[-1]), "next")
+        if (forward and values is not None) or (not forward and has_more):
+            prev_cursor = encode_cursor(key_of(rows[0]), "prev")
+
+    return Keyset_Page(rows, next_cursor, prev_cursor)
@@ -0,0 +1,143 @@
+from app.extensions import db
+from flask import current_app
+from sqlalchemy import event
+from contextlib import contextmanager
+from collections import Counter, namedtuple
+import threading
+import re
+
+# Query budgets ("flask check-query-budgets")
+# An N+1 pattern (a template or a view walking a lazy relationship row by row, e.g. bookmark.post or comment.author)
+# runs one more query per row: it goes unnoticed on a small database and grows with the data.
+#   - count_queries(): context manager recording the SQL statements run by the current thread.
+#   - query_budget(max_queries): the same, raising Query_Budget_Exceeded when the block runs more queries than that.
+#     The message lists the statements grouped by their shape (literals and IN lists normalized), the most repeated
+#     first: an N+1 shows as one shape repeated once per row.
+#   - QUERY_BUDGETS: the maximum number of queries of a request to each endpoint. "flask check-query-budgets"
+#     requests the pages of the query plan check (logged out, and as a user, an author and an admin) and fails when a
+#     page goes over the budget of its endpoint. Run it against a database with data, where a page lists many rows.
+# A budget is a ceiling, not the current count: lower it when a page gets cheaper, never raise it to hide an N+1.
+
+QUERY_BUDGETS = {
+    "website.home": 4,
+    "website.all": 3,
+    "website.about": 2,
+    "website.blog_post": 10,
+    "website.more_comments": 4,
+    "website.more_replies": 3,
+    "website.search": 3,
+    "website.search_json": 3,
+    "account.dashboard": 8,
+    "account.manage_acct": 3,
+    "account.bookmarks": 3,
+    "account.stats": 4,
+}
+
+Query_Budget_Check = namedtuple("Query_Budget_Check", ["page", "endpoint", "status", "budget", "counter"])
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+")
+_IN_LIST = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_COLUMNS = re.compile(r"^SELECT .+? FROM ")
+
+
+class Query_Budget_Exceeded(AssertionError):
+    pass
+
+
+def normalize_sql(statement):
+    """
+    The shape of a statement: literals and parameters replaced by ?, IN lists of any length by (...), whitespace
+    collapsed.
+    """
+    shape = _STRING.sub("?", statement)
+    shape = _NUMBER.sub("?", shape)
+    shape = _PARAMETER.sub("?", shape)
+    shape = _IN_LIST.sub("IN (...)", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+class Query_Counter:
+    """
+    The SQL statements run by one thread (the one which created the counter) on every engine.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self._thread = threading.get_ident()
+        self._engines = set(db.engines.values())
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def shapes(self):
+        """
+        (shape, number of statements) of the statements run, the most repeated first.
+        """
+        return Counter(normalize_sql(statement) for statement in self.statements).most_common()
+
+    def report(self, limit=10):
+        lines = [f"{self.count} queries, {len(self.shapes())} distinct shapes:"]
+        for shape, count in self.shapes()[:limit]:
+            # the column lists are left out: the tables and conditions tell the shapes apart
+            shape = _COLUMNS.sub("SELECT ... FROM ", shape)
+            lines.append(f"  {count:4d} x {shape[:300]}")
+        return "\n".join(lines)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread:
+            self.statements.append(statement)
+
+    def __enter__(self):
+        for engine in self._engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine in self._engines:
+            event.remove(engine, "before_cursor_execute", self._record)
+
+
+def count_queries():
+    """
+    Context manager counting the queries of the block: with count_queries() as counter: ... counter.count
+    """
+    return Query_Counter()
+
+
+@contextmanager
+def query_budget(max_queries, label="block"):
+    """
+    Context manager failing (Query_Budget_Exceeded) when the block runs more than max_queries queries.
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > max_queries:
+        raise Query_Budget_Exceeded(f"{label}: {counter.count} queries for a budget of {max_queries}\n"
+                                    f"{counter.report()}")
+
+
+def check_query_budgets(budgets=None):
+    """
+    Requests the pages of the query plan check and counts their queries.
+
+    Returns:
+        list: A Query_Budget_Check per page; budget is None for an endpoint without a budget.
+    """
+    from app.general_helpers.query_plans import pages_to_check, request_pages
+
+    budgets = QUERY_BUDGETS if budgets is None else budgets
+    adapter = current_app.url_map.bind("localhost")
+    pages = pages_to_check()
+    db.session.remove()
+
+    checks = []
+    for description, path, get in request_pages(pages):
+        endpoint, _ = adapter.match(path.split("?")[0])
+        with count_queries() as counter:
+            status = get()
+        checks.append(Query_Budget_Check(f"{path} ({description})", endpoint, status, budgets.get(endpoint), counter))
+    return checks
@@ -0,0 +1,170 @@
+from app.extensions import db
+from flask import current_app
+from sqlalchemy import event
+from collections import namedtuple
+import re
+
+# Query plan check ("flask check-query-plans")
+# Requests every page of the website and account blueprints (logged out, and logged in as a user, an author and an
+# admin), records every SELECT they run and asks SQLite for its plan (EXPLAIN QUERY PLAN). A query reading a whole
+# table (SCAN <table> without an index), or needing SQLite to build a temporary index, is a problem: it gets slower
+# with every row added. Run it against a database with data (e.g. the seed data of run.py) after changing a query or
+# an index.
+#
+# Full scans are accepted on SCAN_ALLOWED_TABLES, tables which stay a few rows long whatever the traffic, and on the
+# pages of SCAN_ALLOWED_PAGES (path -> reason), which read a whole table on purpose. The admin tables are paginated
+# (general_helpers/admin_tables.py): none does anymore.
+
+SCAN_ALLOWED_TABLES = {"blog_theme", "blog_stats", "blog_schema_version"}
+SCAN_ALLOWED_PAGES = {}
+
+Query_Plan = namedtuple("Query_Plan", ["page", "statement", "plan", "problems"])
+
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+# SQLite names an aliased table by its alias in the plan ("SCAN p"): the aliases are read from the statement. The
+# pattern is a lookahead so that "FROM a JOIN b AS c" yields both (a, JOIN) and (b, c).
+_TABLE_ALIAS = re.compile(r"(?=\b(?:FROM|JOIN)\s+\"?(\w+)\"?(?:\s+AS)?\s+\"?(\w+))", re.IGNORECASE)
+
+
+def explain(connection, statement, parameters=()):
+    """
+    Returns the EXPLAIN QUERY PLAN lines of a statement, as run on a SQLite connection.
+    """
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def table_aliases(statement):
+    """
+    {alias: table} of the tables of a statement given an alias (FROM/JOIN <table> [AS] <alias>).
+    """
+    return {alias: table for table, alias in _TABLE_ALIAS.findall(statement) if table in db.metadata.tables}
+
+
+def plan_problems(plan, statement="", allowed_tables=SCAN_ALLOWED_TABLES):
+    """
+    The lines of a plan showing a full table scan or an automatic (temporary) index.
+    statement is the explained statement, needed to tell which table an alias in the plan stands for.
+    """
+    aliases = table_aliases(statement)
+    problems = []
+    for line in plan:
+        match = _FULL_SCAN.match(line)
+        table = match and aliases.get(match.group(1), match.group(1))
+        if table in db.metadata.tables and table not in allowed_tables:
+            problems.append(line)
+        elif "AUTOMATIC" in line:
+            problems.append(line)
+    return problems
+
+
+def pages_to_check():
+    """
+    (description, user id or None, path) of the pages to check, with ids taken from the database.
+    """
+    from app.models.user import Blog_User
+    from app.models.posts import Blog_Posts
+    from app.models.comments import Blog_Comments, Blog_Replies
+    from app.website.feed import get_posts_listing
+    from app.website.comments import load_comment_threads
+
+    post_id = db.session.query(Blog_Comments.post_id).join(
+        Blog_Posts, Blog_Posts.id == Blog_Comments.post_id).filter(Blog_Posts.admin_approved == db.true()).limit(1).scalar()
+    post_id = post_id or db.session.query(Blog_Posts.id).filter(
+        Blog_Posts.admin_approved == db.true()).limit(1).scalar() or 1
+    comment_id = db.session.query(Blog_Replies.comment_id).filter(Blog_Replies.post_id == post_id).limit(1).scalar()
+    comment_id = comment_id or db.session.query(Blog_Comments.id).filter(
+        Blog_Comments.post_id == post_id).limit(1).scalar() or 1
+    theme_id = db.session.query(Blog_Posts.theme_id).filter(Blog_Posts.id == post_id).scalar() or 1
+
+    with current_app.test_request_context():
+        listing_cursor = get_posts_listing(theme_id, None).next_cursor
+        comments_cursor = load_comment_threads(post_id).next_cursor
+
+    pages = [
+        "/", "/all/0", f"/all/{theme_id}", "/about/", f"/post/{post_id}", f"/post/{post_id}/comments",
+        f"/post/{post_id}/comments/{comment_id}/replies", "/search?q=travel", "/search/json?q=travel",
+    ]
+    if listing_cursor:
+        pages.append(f"/all/{theme_id}?cursor={listing_cursor}")
+    if comments_cursor:
+        pages.append(f"/post/{post_id}/comments?cursor={comments_cursor}")
+
+    checked = [("logged out", None, page) for page in pages]
+    for user_type in ("user", "author", "admin"):
+        user_id = db.session.query(Blog_User.id).filter(
+            Blog_User.type == user_type, Blog_User.blocked == db.false()).order_by(Blog_User.id.desc()).limit(1).scalar()
+        if user_id is None:
+            continue
+        for page in ("/dashboard", "/dashboard/manage_account", "/dashboard/bookmarks", "/dashboard/stats",
+                     f"/post/{post_id}"):
+            checked.append((user_type, user_id, page))
+    return checked
+
+
+def request_pages(pages):
+    """
+    Generator going through the pages (as returned by pages_to_check) with the page cache off. Yields
+    (description, path, get) for each of them: get() requests the page as its user, in a fresh app context (and g),
+    as in a real worker, and returns the response status code.
+    """
+    app = current_app._get_current_object()
+    page_cache_enabled = app.config.get("PAGE_CACHE_ENABLED")
+    app.config["PAGE_CACHE_ENABLED"] = False
+    try:
+        client = app.test_client()
+        for description, user_id, path in pages:
+            with client.session_transaction() as session:
+                session.clear()
+                if user_id is not None:
+                    session["_user_id"] = str(user_id)
+                    session["_fresh"] = True
+
+            def get(path=path):
+                with app.app_context():
+                    response = client.get(path)
+                    response.close()
+                    return response.status_code
+
+            yield description, path, get
+    finally:
+        app.config["PAGE_CACHE_ENABLED"] = page_cache_enabled
+
+
+def check_query_plans(allowed_tables=SCAN_ALLOWED_TABLES):
+    """
+    Requests the pages and explains their queries.
+
+    Returns:
+        list: A Query_Plan for every distinct SELECT run.
+    """
+    if db.engine.dialect.name != "sqlite":
+        raise RuntimeError("The query plan check needs a SQLite database")
+
+    pages = pages_to_check()
+    db.session.remove()
+    statements = {}
+    current_page = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.split(None, 1)[0].upper() in ("SELECT", "WITH") and statement not in statements:
+            statements[statement] = (current_page[0], current_page[1], conn.engine, parameters)
+
+    engines = set(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        for description, path, get in request_pages(pages):
+            current_page[:] = [f"{path} ({description})", path]
+            get()
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+
+    plans = []
+    for statement, (page, path, engine, parameters) in statements.items():
+        with engine.connect() as connection:
+            plan = explain(connection, statement, parameters)
+        problems = [] if path in SCAN_ALLOWED_PAGES else plan_problems(plan, statement, allowed_tables)
+        plans.append(Query_Plan(page, statement, plan, problems))
+    return plans
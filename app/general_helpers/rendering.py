@@ -0,0 +1,72 @@
+from flask import current_app, g, render_template, stream_template
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+import os
+
+# Template rendering
+#
+# Streamed pages: render_page() renders the heavy pages (post, listings) as a stream when STREAM_TEMPLATES is on.
+# The page is sent as it is generated instead of once the whole template has run, so the browser gets the head and
+# the top of the page (and starts loading css, js and pictures) while the rest of the template is still running its
+# lazy loads. Chunks are sent when a template calls {{ stream_flush() }}, or when STREAM_CHUNK_SIZE bytes are waiting.
+# Pages being stored by the page cache are always rendered in one go: the cache needs the whole body.
+#
+# Bytecode cache: compiled templates are stored in JINJA_BYTECODE_CACHE_DIR, so new workers load them instead of
+# compiling every template again.
+
+_FLUSH_MARKER = "\x00stream-flush\x00"
+
+
+def stream_flush():
+    """
+    Template helper marking a point where the page streamed so far is sent to the browser, e.g. after the
+    above-the-fold content. Outputs nothing.
+    """
+    return Markup(_FLUSH_MARKER) if g.get("streaming_template") else ""
+
+
+def _buffered(chunks, chunk_size):
+    """
+    Groups the small strings generated by Jinja into chunks, sent at every flush marker or once chunk_size is reached.
+    """
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        if _FLUSH_MARKER in chunk:
+            before, _, after = chunk.partition(_FLUSH_MARKER)
+            buffer.append(before)
+            yield "".join(buffer)
+            buffer, size = [after], len(after)
+            continue
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def render_page(template_name, **context):
+    """
+    Drop-in replacement of render_template for the heavy pages: returns a streamed response body when
+    STREAM_TEMPLATES is on and the page is not being stored in the page cache, the rendered string otherwise.
+    """
+    config = current_app.config
+    if not config["STREAM_TEMPLATES"] or g.get("page_cache_filling"):
+        return render_template(template_name, **context)
+
+    g.streaming_template = True
+    return current_app.response_class(
+        _buffered(stream_template(template_name, **context), config["STREAM_CHUNK_SIZE"]), mimetype="text/html")
+
+
+def init_rendering(app):
+    app.config.setdefault("STREAM_TEMPLATES", False)
+    app.config.setdefault("STREAM_CHUNK_SIZE", 16 * 1024)
+    app.config.setdefault("JINJA_BYTECODE_CACHE_DIR", os.path.join(app.instance_path, "jinja_cache"))
+
+    if app.config["JINJA_BYTECODE_CACHE_DIR"]:
+        os.makedirs(app.config["JINJA_BYTECODE_CACHE_DIR"], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config["JINJA_BYTECODE_CACHE_DIR"])
+    app.jinja_env.globals["stream_flush"] = stream_flush
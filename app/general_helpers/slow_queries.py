@@ -0,0 +1,113 @@
+from app.general_helpers.query_budget import normalize_sql
+from flask import request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import deque
+from datetime import datetime
+import threading
+import json
+import time
+
+# Slow query log
+# Every statement taking SLOW_QUERY_THRESHOLD_MS or more (on any engine: the database and its replicas) is recorded
+# (a negative threshold turns the log off):
+#   - its normalized SQL (literals replaced by ?) and the types of its parameters, never their values,
+#   - the endpoint (and method) of the request which ran it, or "-" outside a request (CLI commands, workers),
+#   - its duration, and its plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere) captured right after it ran, on
+#     the same connection (SLOW_QUERY_EXPLAIN).
+# The last SLOW_QUERY_LOG_SIZE entries of the worker are kept in memory and listed on the admin dashboard
+# (/dashboard/slow_queries). With SLOW_QUERY_LOG_FILE set, the entries are also appended to that file, one JSON
+# object per line, so they survive restarts and can be collected from every worker.
+
+EXPLAINED_STATEMENTS = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+_entries = deque(maxlen=200)
+_file_lock = threading.Lock()
+_settings = {"threshold": None, "explain": True, "file": None}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _settings["threshold"] is not None and context is not None:
+        context._slow_query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    duration = (time.perf_counter() - started) * 1000
+    if duration < _settings["threshold"]:
+        return
+
+    first_parameters = parameters[0] if executemany and parameters else parameters
+    entry = {
+        "date": datetime.utcnow().isoformat(timespec="seconds"),
+        "duration_ms": round(duration, 1),
+        "statement": normalize_sql(statement),
+        "parameters": _redacted(first_parameters),
+        "endpoint": f"{request.method} {request.endpoint}" if has_request_context() else "-",
+        "database": conn.engine.url.render_as_string(hide_password=True),
+        "plan": _explain(conn, statement, first_parameters) if _settings["explain"] else [],
+    }
+    _entries.append(entry)
+    if _settings["file"]:
+        _write(entry)
+
+
+def _redacted(parameters):
+    """
+    The types of the parameters, without their values.
+    """
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def _explain(conn, statement, parameters):
+    """
+    The plan of a statement, asked on the DBAPI connection which ran it (no engine events, no new transaction).
+    """
+    if statement.lstrip().split(None, 1)[0].upper() not in EXPLAINED_STATEMENTS:
+        return []
+    sqlite = conn.dialect.name == "sqlite"
+    try:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f"{'EXPLAIN QUERY PLAN' if sqlite else 'EXPLAIN'} {statement}", parameters or ())
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+    return [str(row[-1]) if sqlite else " | ".join(str(value) for value in row) for row in rows]
+
+
+def _write(entry):
+    with _file_lock:
+        with open(_settings["file"], "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry) + "\n")
+
+
+def recent_slow_queries():
+    """
+    The slow queries recorded by this worker, the latest first.
+    """
+    return list(reversed(_entries))
+
+
+def init_slow_query_log(app):
+    global _entries
+    app.config.setdefault("SLOW_QUERY_THRESHOLD_MS", 250)
+    app.config.setdefault("SLOW_QUERY_EXPLAIN", True)
+    app.config.setdefault("SLOW_QUERY_LOG_SIZE", 200)
+    app.config.setdefault("SLOW_QUERY_LOG_FILE", None)
+
+    threshold = app.config["SLOW_QUERY_THRESHOLD_MS"]
+    _settings["threshold"] = threshold if threshold is not None and threshold >= 0 else None
+    _settings["explain"] = app.config["SLOW_QUERY_EXPLAIN"]
+    _settings["file"] = app.config["SLOW_QUERY_LOG_FILE"]
+    _entries = deque(_entries, maxlen=app.config["SLOW_QUERY_LOG_SIZE"])
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,145 @@
+from flask import request, send_from_directory
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:  # optional: without it only the .gz copies are written
+    brotli = None
+
+# Fingerprinted static assets
+# The css and js files of the static folder are copied to static/dist/ with a hash of their content in their name
+# (css/style.css -> dist/css/style.3f2a1b4c.css), next to a .gz and a .br copy compressed once and for all.
+# dist/manifest.json maps every original name to its fingerprinted copy.
+#   - url_for('static', filename='css/style.css') returns the fingerprinted URL (see _fingerprinted_url),
+#   - the static view serves the fingerprinted files precompressed, with a one year, immutable Cache-Control:
+#     a changed file gets a new name, so browsers never have to revalidate the old one.
+# The assets are rebuilt when the app starts if a source file changed, or with "flask build-static-assets".
+
+DIST_PATH = "dist"
+MANIFEST_NAME = "manifest.json"
+FINGERPRINTED_EXTENSIONS = (".css", ".js")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Content-Encoding -> extension of the precompressed copy, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+def _fingerprint(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:8]
+
+
+def _write_atomically(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.tmp{os.getpid()}"
+    with open(temporary_path, "wb") as f:
+        f.write(content)
+    os.replace(temporary_path, path)
+
+
+def _source_files(static_folder):
+    for folder, subfolders, filenames in os.walk(static_folder):
+        # never fingerprint the fingerprinted copies
+        if folder == static_folder:
+            subfolders[:] = [name for name in subfolders if name != DIST_PATH]
+        for filename in sorted(filenames):
+            if filename.endswith(FINGERPRINTED_EXTENSIONS):
+                path = os.path.join(folder, filename)
+                yield os.path.relpath(path, static_folder).replace(os.sep, "/"), path
+
+
+def build_static_assets(static_folder):
+    """
+    Writes the fingerprinted and precompressed copies of the css and js files, and the manifest.
+    Copies which already exist are not written again. Returns the manifest: {original name: fingerprinted name}.
+    """
+    dist_folder = os.path.join(static_folder, DIST_PATH)
+    manifest = {}
+    for name, path in _source_files(static_folder):
+        stem, extension = os.path.splitext(name)
+        fingerprinted = f"{DIST_PATH}/{stem}.{_fingerprint(path)}{extension}"
+        manifest[name] = fingerprinted
+
+        output_path = os.path.join(static_folder, fingerprinted)
+        if os.path.exists(output_path):
+            continue
+        with open(path, "rb") as f:
+            content = f.read()
+        _write_atomically(output_path + ".gz", gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write_atomically(output_path + ".br", brotli.compress(content, quality=11))
+        # written last: the manifest only points to files whose compressed copies exist
+        _write_atomically(output_path, content)
+
+    manifest_content = json.dumps(manifest, indent=2, sort_keys=True).encode()
+    _write_atomically(os.path.join(dist_folder, MANIFEST_NAME), manifest_content)
+    return manifest
+
+
+def load_manifest(static_folder):
+    """
+    Returns the manifest written by the last build, or None if it is missing or outdated (a source file changed).
+    """
+    manifest_path = os.path.join(static_folder, DIST_PATH, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    built = os.path.getmtime(manifest_path)
+    for name, path in _source_files(static_folder):
+        if name not in manifest or os.path.getmtime(path) > built:
+            return None
+    return manifest
+
+
+def init_static_assets(app):
+    app.config.setdefault("STATIC_ASSETS_FINGERPRINT", True)
+    app.config.setdefault("STATIC_ASSETS_BUILD_ON_STARTUP", True)
+    if not app.config["STATIC_ASSETS_FINGERPRINT"]:
+        return
+
+    static_folder = app.static_folder
+    manifest = load_manifest(static_folder)
+    if manifest is None and app.config["STATIC_ASSETS_BUILD_ON_STARTUP"]:
+        manifest = build_static_assets(static_folder)
+    if not manifest:
+        return
+    fingerprinted_files = set(manifest.values())
+    precompressed = {filename + extension for filename in fingerprinted_files for extension in ENCODINGS.values()
+                     if os.path.exists(os.path.join(static_folder, filename + extension))}
+    app.config["STATIC_ASSETS_MANIFEST"] = manifest
+
+    @app.url_defaults
+    def _fingerprinted_url(endpoint, values):
+        if endpoint == "static" and values.get("filename") in manifest:
+            values["filename"] = manifest[values["filename"]]
+
+    def static(filename):
+        if filename not in fingerprinted_files:
+            return app.send_static_file(filename)
+
+        # the best precompressed copy the browser accepts
+        served, content_encoding = filename, None
+        for encoding, extension in ENCODINGS.items():
+            if request.accept_encodings[encoding] and filename + extension in precompressed:
+                served, content_encoding = filename + extension, encoding
+                break
+
+        response = send_from_directory(static_folder, served, max_age=IMMUTABLE_MAX_AGE)
+        # the type of the original file, not of the .gz/.br copy
+        response.mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        if content_encoding:
+            response.headers["Content-Encoding"] = content_encoding
+            response.headers.pop("Content-Disposition", None)
+        response.headers["Vary"] = "Accept-Encoding"
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions["static"] = static
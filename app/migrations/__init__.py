@@ -0,0 +1,185 @@
+from app.extensions import db
+from sqlalchemy import inspect, text, Table, MetaData, Index
+from sqlalchemy.exc import SAWarning
+from sqlalchemy.schema import CreateColumn
+from contextlib import contextmanager
+from collections import namedtuple
+from datetime import datetime
+import importlib
+import pkgutil
+import warnings
+import re
+
+# Versioned schema migrations
+# Every module of this package named v<4 digits>_<name>.py is a migration: its docstring describes it and its
+# upgrade(connection) function changes the schema (and moves the data) from the previous version to its own.
+# Each migration runs in its own transaction, together with the row recording it in blog_schema_version.
+#
+# upgrade_database() (called by run.py and "flask db-upgrade") brings any database to the latest version:
+#   - empty database: the tables are created from the models (db.create_all) and every migration is recorded as applied,
+#   - database created by db.create_all() before the migrations existed: it is recorded at version 1 (the baseline)
+#     and the migrations that follow are applied,
+#   - versioned database: the migrations newer than its version are applied.
+# Models and migrations must stay in step: a change to a model's columns or indexes comes with a new migration.
+
+VERSION_TABLE = "blog_schema_version"
+BASELINE_VERSION = 1
+
+Migration = namedtuple("Migration", ["version", "name", "description", "upgrade"])
+
+_MODULE_NAME = re.compile(r"v(\d{4})_\w+")
+
+
+def load_migrations():
+    """
+    Returns the migrations of this package, ordered by version.
+    """
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.fullmatch(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        description = (module.__doc__ or module_info.name).strip().splitlines()[0]
+        migrations.append(Migration(int(match.group(1)), module_info.name, description, module.upgrade))
+    migrations.sort(key=lambda migration: migration.version)
+
+    versions = [migration.version for migration in migrations]
+    if versions != list(range(1, len(versions) + 1)):
+        raise RuntimeError(f"Migration versions must follow each other from 1, found {versions}")
+    return migrations
+
+
+def current_version(connection):
+    """
+    The schema version of the database, 0 if it has no version table.
+    """
+    if not inspect(connection).has_table(VERSION_TABLE):
+        return 0
+    return connection.execute(text(f"SELECT MAX(version) FROM {VERSION_TABLE}")).scalar() or 0
+
+
+def _record(connection, migration):
+    connection.execute(text(
+        f"INSERT INTO {VERSION_TABLE} (version, name, date_applied) VALUES (:version, :name, :date_applied)"),
+        {"version": migration.version, "name": migration.name, "date_applied": datetime.utcnow()})
+
+
+def upgrade_database(engine=None):
+    """
+    Brings the database to the latest schema version.
+
+    Returns:
+        list: The migrations applied (or recorded as applied, for a new database).
+    """
+    engine = engine or db.engine
+    migrations = load_migrations()
+
+    with engine.begin() as connection:
+        version = current_version(connection)
+        if version == 0:
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+                "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, date_applied TIMESTAMP NOT NULL)"))
+            if inspect(connection).has_table("blog_posts"):
+                # tables made by db.create_all() before the migrations existed
+                baseline = migrations[:BASELINE_VERSION]
+            else:
+                db.metadata.create_all(connection)
+                baseline = migrations
+            for migration in baseline:
+                _record(connection, migration)
+            version = baseline[-1].version
+            applied = baseline
+        else:
+            applied = []
+
+    for migration in migrations[version:]:
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            _record(connection, migration)
+        applied.append(migration)
+    return applied
+
+
+# Helpers for the migrations, which work on the database as it is (reflected), never on the models
+
+def add_column(connection, table_name, column_ddl):
+    """
+    Adds a column given as "name TYPE ..." if the table doesn't have it yet.
+    """
+    column_name = column_ddl.split()[0]
+    if column_name not in [column["name"] for column in inspect(connection).get_columns(table_name)]:
+        connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_ddl}"))
+
+
+@contextmanager
+def _quiet_reflection():
+    # the reflection leaves the expression indexes (e.g. on lower(name)) out, with a warning
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "Skipped unsupported reflection of expression-based index", SAWarning)
+        yield
+
+
+def _index_names(connection, table_name):
+    """
+    The names of the indexes and unique constraints of a table, expression indexes included: they are read from the
+    catalogue on SQLite and PostgreSQL, as the reflection leaves them out.
+    """
+    if connection.dialect.name == "sqlite":
+        names = connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+                                   {"table": table_name}).scalars().all()
+    elif connection.dialect.name == "postgresql":
+        names = connection.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+                                   {"table": table_name}).scalars().all()
+    else:
+        names = []
+    with _quiet_reflection():
+        inspector = inspect(connection)
+        names += [index["name"] for index in inspector.get_indexes(table_name)]
+        names += [constraint["name"] for constraint in inspector.get_unique_constraints(table_name)]
+    return names
+
+
+def create_index(connection, name, table_name, columns, unique=False, **dialect_options):
+    """
+    Creates an index if there is no index or unique constraint of that name on the table yet.
+    columns are column names, or functions of the reflected table returning an expression (e.g. lower(name)).
+    dialect_options are passed to Index, e.g. sqlite_where / postgresql_where for a partial index.
+    """
+    if name in _index_names(connection, table_name):
+        return
+    with _quiet_reflection():
+        table = Table(table_name, MetaData(), autoload_with=connection)
+    expressions = [column(table) if callable(column) else table.c[column] for column in columns]
+    Index(name, *expressions, unique=unique, **dialect_options).create(connection)
+
+
+def drop_index(connection, name, table_name):
+    """
+    Drops an index if the table has it.
+    """
+    with _quiet_reflection():
+        table = Table(table_name, MetaData(), autoload_with=connection)
+    for index in table.indexes:
+        if index.name == name:
+            index.drop(connection)
+
+
+def replace_column(connection, table_name, column, value):
+    """
+    Replaces a column by a new definition (e.g. another type), filled from the old one: value(old_column) is the SQL
+    expression giving the new value of each row. The indexes using the old column must be dropped first.
+    The column is added under a temporary name, filled, then the old column is dropped and the new one renamed
+    (SQLite 3.35 or later).
+    """
+    final_name = column.name
+    column.name = column.key = f"{final_name}__new"
+    Table(table_name, MetaData(), column)
+    connection.execute(text(
+        f"ALTER TABLE {table_name} ADD COLUMN {CreateColumn(column).compile(dialect=connection.dialect)}"))
+
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    connection.execute(table.update().values({column.name: value(table.c[final_name])}))
+    connection.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {final_name}"))
+    connection.execute(text(f"ALTER TABLE {table_name} RENAME COLUMN {column.name} TO {final_name}"))
@@ -0,0 +1,10 @@
+"""
+Baseline schema: users, themes, posts, likes, bookmarks, comments, replies, stats and contact messages.
+
+The tables as created by db.create_all() before the migrations existed. Databases created that way are recorded at
+this version without running anything.
+"""
+
+
+def upgrade(connection):
+    pass
@@ -0,0 +1,61 @@
+"""
+Post counters, unique likes and bookmarks, listing indexes and the email outbox.
+
+The schema changes made to the models before the migrations existed:
+  - the denormalized like/bookmark/comment/reply counters of blog_posts, backfilled from the existing rows,
+  - a user can like or bookmark a post only once: duplicate likes and bookmarks (same user and post) are removed,
+    keeping the oldest, before the unique indexes are created,
+  - the indexes of the home feed and the theme listings (keyset pagination),
+  - the blog_outbox table of the email workers.
+"""
+from app.migrations import add_column, create_index
+from sqlalchemy import text, MetaData, Table, Column, Integer, String, Text, DateTime, Index
+
+COUNTERS = {
+    "like_count": ("blog_likes", "post_id"),
+    "bookmark_count": ("blog_bookmarks", "post_id"),
+    "comment_count": ("blog_comments", "post_id"),
+    "reply_count": ("blog_replies", "post_id"),
+}
+
+# blog_outbox as of this version
+_metadata = MetaData()
+blog_outbox = Table(
+    "blog_outbox", _metadata,
+    Column("id", Integer, primary_key=True),
+    Column("date_created", DateTime),
+    Column("from_addr", String(200)),
+    Column("to_addr", String(200), nullable=False),
+    Column("reply_to", String(200)),
+    Column("subject", String(300), nullable=False),
+    Column("body", Text, nullable=False),
+    Column("status", String(10), nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("next_attempt_at", DateTime),
+    Column("claim_token", String(32)),
+    Column("claimed_at", DateTime),
+    Column("last_error", String(500)),
+    Column("date_sent", DateTime),
+    Index("ix_blog_outbox_due", "status", "next_attempt_at", "id"),
+)
+
+
+def upgrade(connection):
+    for table_name, constraint in (("blog_likes", "uq_blog_likes_user_post"),
+                                   ("blog_bookmarks", "uq_blog_bookmarks_user_post")):
+        connection.execute(text(
+            f"DELETE FROM {table_name} WHERE user_id IS NOT NULL AND post_id IS NOT NULL AND id NOT IN "
+            f"(SELECT id FROM (SELECT MIN(id) AS id FROM {table_name} GROUP BY user_id, post_id) AS kept)"))
+        create_index(connection, constraint, table_name, ["user_id", "post_id"], unique=True)
+
+    for counter, (table_name, post_column) in COUNTERS.items():
+        add_column(connection, "blog_posts", f"{counter} INTEGER DEFAULT 0 NOT NULL")
+        connection.execute(text(
+            f"UPDATE blog_posts SET {counter} = "
+            f"(SELECT COUNT(*) FROM {table_name} WHERE {table_name}.{post_column} = blog_posts.id)"))
+
+    create_index(connection, "ix_blog_posts_theme_listing", "blog_posts",
+                 ["theme_id", "admin_approved", "date_to_post", "id"])
+    create_index(connection, "ix_blog_posts_listing", "blog_posts", ["admin_approved", "date_to_post", "id"])
+
+    blog_outbox.create(connection, checkfirst=True)
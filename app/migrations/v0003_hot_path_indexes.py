@@ -0,0 +1,24 @@
+"""
+Indexes of the hot queries: comments, replies, likes and bookmarks of a post, authors of the about page.
+
+  - blog_comments (post_id, date_submitted, id) and blog_replies (comment_id, date_submitted, id): the comment threads
+    of a post and their "load more" pages, in order, without reading the comments of the other posts,
+  - blog_likes (post_id, user_id) and blog_bookmarks (post_id, user_id): the likes and bookmarks of a post. The lookups
+    by user are served by the (user_id, post_id) unique indexes of version 2,
+  - blog_user (type, blocked): the authors listed on the about page.
+The (theme_id, admin_approved, date_to_post) index of the posts listings was added in version 2.
+"""
+from app.migrations import create_index
+
+INDEXES = [
+    ("ix_blog_comments_post_date", "blog_comments", ["post_id", "date_submitted", "id"]),
+    ("ix_blog_replies_comment_date", "blog_replies", ["comment_id", "date_submitted", "id"]),
+    ("ix_blog_likes_post_user", "blog_likes", ["post_id", "user_id"]),
+    ("ix_blog_bookmarks_post_user", "blog_bookmarks", ["post_id", "user_id"]),
+    ("ix_blog_user_type_blocked", "blog_user", ["type", "blocked"]),
+]
+
+
+def upgrade(connection):
+    for name, table_name, columns in INDEXES:
+        create_index(connection, name, table_name, columns)
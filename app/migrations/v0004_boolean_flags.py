@@ -0,0 +1,45 @@
+"""
+TRUE/FALSE string flags as booleans, with partial indexes on the approved posts and the active users.
+
+blog_posts.admin_approved and featured, blog_user.blocked, blog_comments.blocked and blog_replies.blocked were
+VARCHAR(5) columns holding "TRUE" or "FALSE" (and "1" where a Python True had been written to them). They become
+NOT NULL booleans: "TRUE" and "1" (any case) are true, anything else (including NULL) is false.
+The indexes of version 2 and 3 on these columns are replaced by partial indexes (see models/flags.py):
+  - blog_posts (theme_id, date_to_post, id) and (date_to_post, id) of the approved posts: home feed, listings, search,
+  - blog_posts (author_id) of the posts awaiting approval: author and admin dashboards,
+  - blog_user (type, id) of the users who are not blocked: about page.
+"""
+from app.migrations import create_index, drop_index, replace_column
+from app.models.flags import flag_index_where
+from sqlalchemy import Column, Boolean, case, func, true, false
+
+FLAGS = [
+    ("blog_posts", "admin_approved"),
+    ("blog_posts", "featured"),
+    ("blog_user", "blocked"),
+    ("blog_comments", "blocked"),
+    ("blog_replies", "blocked"),
+]
+
+
+def _flag_value(old_column):
+    return case((func.upper(old_column).in_(["TRUE", "1"]), true()), else_=false())
+
+
+def upgrade(connection):
+    drop_index(connection, "ix_blog_posts_theme_listing", "blog_posts")
+    drop_index(connection, "ix_blog_posts_listing", "blog_posts")
+    drop_index(connection, "ix_blog_user_type_blocked", "blog_user")
+
+    for table_name, column_name in FLAGS:
+        replace_column(connection, table_name, Column(column_name, Boolean, nullable=False, server_default=false()),
+                       _flag_value)
+
+    create_index(connection, "ix_blog_posts_published_theme", "blog_posts", ["theme_id", "date_to_post", "id"],
+                 **flag_index_where("admin_approved", True))
+    create_index(connection, "ix_blog_posts_published", "blog_posts", ["date_to_post", "id"],
+                 **flag_index_where("admin_approved", True))
+    create_index(connection, "ix_blog_posts_pending", "blog_posts", ["author_id"],
+                 **flag_index_where("admin_approved", False))
+    create_index(connection, "ix_blog_user_active_type", "blog_user", ["type", "id"],
+                 **flag_index_where("blocked", False))
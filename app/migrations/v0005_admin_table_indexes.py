@@ -0,0 +1,23 @@
+"""
+Indexes of the admin tables: case insensitive prefix search on user names, emails and post titles, posts by title.
+
+The admin tables of the dashboard (see general_helpers/admin_tables.py) are paginated and searched in the database:
+  - blog_user lower(name) and lower(email), blog_posts lower(title): the search matches the lower case prefix as a
+    range (lower(column) >= prefix and < prefix followed by the highest character), read from these indexes,
+  - blog_posts (title, id): the posts table sorted by title. The users table is sorted by name or email through
+    their unique indexes.
+"""
+from app.migrations import create_index
+from sqlalchemy import func
+
+INDEXES = [
+    ("ix_blog_user_name_lower", "blog_user", [lambda table: func.lower(table.c.name)]),
+    ("ix_blog_user_email_lower", "blog_user", [lambda table: func.lower(table.c.email)]),
+    ("ix_blog_posts_title_lower", "blog_posts", [lambda table: func.lower(table.c.title)]),
+    ("ix_blog_posts_title", "blog_posts", ["title", "id"]),
+]
+
+
+def upgrade(connection):
+    for name, table_name, columns in INDEXES:
+        create_index(connection, name, table_name, columns)
@@ -0,0 +1,63 @@
+"""
+Full-text search index of the posts (see website/search.py), filled with the posts already in the database.
+
+The index tables used to be created by the first search or post edit after a deploy, from a request, and the posts
+written before were only searchable once "flask rebuild-search-index" had been run by hand:
+  - SQLite: the blog_posts_fts FTS5 table, Postgres: the blog_posts_search tsvector table and its GIN index,
+  - every post is indexed (an index created by a request before this version is emptied and filled again).
+New databases get the tables from db.create_all(), with blog_posts.
+"""
+from sqlalchemy import text
+import html
+import re
+
+BATCH_SIZE = 1000
+
+# The search tables and the indexed text as of this version
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS blog_posts_fts USING fts5("
+    "title, intro, body, meta_tag, tokenize = 'porter unicode61')",
+]
+POSTGRESQL_DDL = [
+    "CREATE TABLE IF NOT EXISTS blog_posts_search ("
+    "post_id INTEGER PRIMARY KEY REFERENCES blog_posts(id) ON DELETE CASCADE, document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_blog_posts_search_document ON blog_posts_search USING GIN (document)",
+]
+SQLITE_INSERT = (
+    "INSERT INTO blog_posts_fts (rowid, title, intro, body, meta_tag) VALUES (:id, :title, :intro, :body, :meta_tag)")
+POSTGRESQL_INSERT = (
+    "INSERT INTO blog_posts_search (post_id, document) VALUES (:id, "
+    "setweight(to_tsvector('english', :title), 'A') || setweight(to_tsvector('english', :intro), 'B') || "
+    "setweight(to_tsvector('english', :meta_tag), 'C') || setweight(to_tsvector('english', :body), 'D'))")
+
+
+def _plain_text(body):
+    # the body is CKEditor html: its text only is indexed
+    return html.unescape(re.sub(r"<[^>]+>", " ", body or ""))
+
+
+def upgrade(connection):
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        ddl, empty, insert = SQLITE_DDL, "DELETE FROM blog_posts_fts", SQLITE_INSERT
+    elif dialect == "postgresql":
+        ddl, empty, insert = POSTGRESQL_DDL, "TRUNCATE blog_posts_search", POSTGRESQL_INSERT
+    else:
+        return
+    for statement in ddl:
+        connection.execute(text(statement))
+    connection.execute(text(empty))
+
+    last_id = 0
+    while True:
+        rows = connection.execute(text(
+            "SELECT id, title, intro, body, meta_tag FROM blog_posts WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        connection.execute(text(insert), [
+            {"id": row[0], "title": row[1] or "", "intro": row[2] or "", "body": _plain_text(row[3]),
+             "meta_tag": row[4] or ""} for row in rows])
+        last_id = rows[-1][0]
+    if dialect == "sqlite":
+        connection.execute(text("INSERT INTO blog_posts_fts (blog_posts_fts) VALUES ('optimize')"))
@@ -4,6 +4,12 @@ from datetime import datetime
 
 class Blog_Bookmarks(db.Model):
     __tablename__ = "blog_bookmarks"
+    # a user can bookmark a post only once, see toggle_bookmark in models/helpers.py
+    # the unique constraint also serves the lookups by user (dashboard), the index the ones by post
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "post_id", name="uq_blog_bookmarks_user_post"),
+        db.Index("ix_blog_bookmarks_post_user", "post_id", "user_id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date_submitted = db.Column(db.DateTime, default=datetime.utcnow)
     post_id = db.Column(db.Integer, db.ForeignKey('blog_posts.id'))
@@ -1,13 +1,16 @@
 from app.extensions import db
+from app.models.flags import Boolean_Flag
 from datetime import datetime
 
 
 class Blog_Comments(db.Model):
     __tablename__ = "blog_comments"
+    # the comments of a post are paged through date_submitted, id (see website/comments.py)
+    __table_args__ = (db.Index("ix_blog_comments_post_date", "post_id", "date_submitted", "id"),)
     id = db.Column(db.Integer, primary_key=True)
     date_submitted = db.Column(db.DateTime, default=datetime.utcnow)
     text = db.Column(db.String(500), nullable=False)
-    blocked = db.Column(db.String(5), default="FALSE")  # TRUE or FALSE
+    blocked = db.Column(Boolean_Flag, default=False, server_default=db.false(), nullable=False)
     if_blocked = db.Column(
         db.String(100), default="[removed]")  # if blocked, show this text
     replies = db.relationship('Blog_Replies', backref='comment')
@@ -20,10 +23,12 @@ class Blog_Comments(db.Model):
 
 class Blog_Replies(db.Model):
     __tablename__ = "blog_replies"
+    # the replies of a comment are paged through date_submitted, id (see website/comments.py)
+    __table_args__ = (db.Index("ix_blog_replies_comment_date", "comment_id", "date_submitted", "id"),)
     id = db.Column(db.Integer, primary_key=True)
     date_submitted = db.Column(db.DateTime, default=datetime.utcnow)
     text = db.Column(db.String(500), nullable=False)
-    blocked = db.Column(db.String(5), default="FALSE")  # TRUE or FALSE
+    blocked = db.Column(Boolean_Flag, default=False, server_default=db.false(), nullable=False)
     if_blocked = db.Column(
         db.String(100), default="[removed]")  # if blocked, show this text
     likes = db.Column(db.Integer, default=0)
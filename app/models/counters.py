@@ -0,0 +1,120 @@
+from app.extensions import db
+from app.models.stats import Blog_Stats
+from sqlalchemy import event
+from collections import Counter
+import atexit
+import threading
+
+# Blog statistics counters (Blog_Stats, row id 1)
+# Every like, bookmark, comment or sign up changes one of the columns of the same row, which makes it the hottest row of
+# the database. Two modes are available, set with STATS_COUNTER_MODE:
+#   - "atomic" (default): the change is applied in SQL (likes_total = likes_total + 1) inside the caller's transaction,
+#     no read-modify-write in Python, so concurrent requests can't overwrite each other's increments.
+#   - "buffered": the changes are added up in memory by every worker once the caller's transaction is committed,
+#     and flushed to the database in one UPDATE every STATS_FLUSH_INTERVAL seconds and when the worker shuts down.
+#     Writers never wait on the stats row, at the cost of the statistics lagging by up to the flush interval.
+
+STATS_COLUMNS = ["user_total", "user_active_total", "posts_approved", "comments_total", "likes_total",
+                 "bookmarks_total"]
+
+_app = None
+_buffer = Counter()
+_buffer_lock = threading.Lock()
+_flush_thread = None
+_stop_flushing = threading.Event()
+
+
+def init_stats_counters(app):
+    global _app
+    app.config.setdefault("STATS_COUNTER_MODE", "atomic")
+    app.config.setdefault("STATS_FLUSH_INTERVAL", 5)
+    _app = app
+
+    if app.config["STATS_COUNTER_MODE"] == "buffered":
+        # deltas are only handed to the worker buffer once the transaction they belong to is committed
+        event.listen(db.session, "after_commit", _move_to_buffer)
+        event.listen(db.session, "after_rollback", _discard_pending)
+        atexit.register(stop_stats_flusher)
+
+
+def increment_stat(column, delta):
+    """
+    Adds delta to a Blog_Stats column, in the caller's transaction: nothing is written until the caller commits.
+    """
+    if column not in STATS_COLUMNS:
+        raise ValueError(f"Unknown statistics column: {column}")
+
+    if _app is not None and _app.config["STATS_COUNTER_MODE"] == "buffered":
+        # a session which hasn't run any SQL yet has no transaction, and its rollback would not discard the delta
+        session = db.session()
+        if not session.in_transaction():
+            session.begin()
+        session.info.setdefault("stats_deltas", Counter())[column] += delta
+        _start_stats_flusher()
+    else:
+        stats_column = getattr(Blog_Stats, column)
+        db.session.query(Blog_Stats).filter(Blog_Stats.id == 1).update(
+            {stats_column: stats_column + delta}, synchronize_session=False)
+
+
+def _move_to_buffer(session):
+    deltas = session.info.pop("stats_deltas", None)
+    if deltas:
+        with _buffer_lock:
+            _buffer.update(deltas)
+
+
+def _discard_pending(session):
+    session.info.pop("stats_deltas", None)
+
+
+def flush_stats():
+    """
+    Writes the buffered deltas to the database in a single UPDATE. Deltas are put back in the buffer if it fails.
+    Returns the flushed deltas.
+    """
+    with _buffer_lock:
+        deltas = {column: delta for column, delta in _buffer.items() if delta}
+        _buffer.clear()
+    if not deltas:
+        return {}
+
+    with _app.app_context():
+        try:
+            db.session.query(Blog_Stats).filter(Blog_Stats.id == 1).update(
+                {getattr(Blog_Stats, column): getattr(Blog_Stats, column) + delta for column, delta in deltas.items()},
+                synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with _buffer_lock:
+                _buffer.update(deltas)
+            raise
+    return deltas
+
+
+def _flush_periodically():
+    while not _stop_flushing.wait(_app.config["STATS_FLUSH_INTERVAL"]):
+        try:
+            flush_stats()
+        except Exception as e:
+            _app.logger.warning(f"Blog statistics could not be flushed, will retry: {e}")
+
+
+def _start_stats_flusher():
+    global _flush_thread
+    if _flush_thread is None:
+        with _buffer_lock:
+            if _flush_thread is None:
+                _flush_thread = threading.Thread(target=_flush_periodically, name="stats-flusher", daemon=True)
+                _flush_thread.start()
+
+
+def stop_stats_flusher():
+    """
+    Stops the background flusher and writes what is left in the buffer. Called when the worker exits.
+    """
+    _stop_flushing.set()
+    if _flush_thread is not None:
+        _flush_thread.join()
+    flush_stats()
@@ -0,0 +1,42 @@
+from sqlalchemy import text
+from sqlalchemy.types import TypeDecorator, Boolean
+
+# Boolean flags: Blog_Posts.admin_approved and featured, Blog_User.blocked, Blog_Comments and Blog_Replies.blocked
+# They used to be String(5) columns holding "TRUE" or "FALSE" and are real booleans since migrations/v0004.
+#   - Queries on the hot paths compare them with db.true() / db.false() (admin_approved == db.true()): written that
+#     way, SQLite can use the partial indexes declared with flag_index_where() (e.g. the approved posts only).
+#   - Compatibility: the legacy "TRUE"/"FALSE" strings are still accepted wherever a flag is written or compared
+#     (user.blocked = request.form[...], Blog_User.blocked == "FALSE") and stored as True/False, so code not yet
+#     updated keeps working. Flags read from the database are always True or False.
+
+LEGACY_VALUES = {"TRUE": True, "FALSE": False, "1": True, "0": False}
+
+
+class Boolean_Flag(TypeDecorator):
+    """
+    Boolean column type also accepting the legacy "TRUE"/"FALSE" strings.
+    """
+    impl = Boolean
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            try:
+                return LEGACY_VALUES[value.strip().upper()]
+            except KeyError:
+                raise ValueError(f"Not a boolean flag value: {value!r}")
+        return None if value is None else bool(value)
+
+    def process_literal_param(self, value, dialect):
+        return self.process_bind_param(value, dialect)
+
+
+def flag_index_where(column_name, value=True):
+    """
+    The dialect options of a partial index covering the rows whose flag is value, written the way the queries
+    compare the flag (SQLite only uses a partial index when the query repeats its WHERE term).
+    """
+    return {
+        "sqlite_where": text(f"{column_name} = {int(value)}"),
+        "postgresql_where": text(column_name if value else f"NOT {column_name}"),
+    }
@@ -1,8 +1,15 @@
-from app.models.stats import Blog_Stats
+from app.models.counters import increment_stat
 from app.models.comments import Blog_Comments, Blog_Replies
 from app.models.posts import Blog_Posts
+from app.models.likes import Blog_Likes
+from app.models.bookmarks import Blog_Bookmarks
+from app.website.search import remove_post_from_index
 from app.extensions import db
-from sqlalchemy import desc
+from sqlalchemy import desc, func, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from collections import namedtuple
 
 # Functions that take the picture's name and output the path to the source file
 def pic_src_post(picture_name):
@@ -15,11 +22,10 @@ def pic_src_user(picture_name):
     return f"../static/Pictures_Users/{picture_name}"
 
 # Functions that update the statistics (Stats)
+# None of them commit: the change belongs to the caller's transaction, so call them before db.session.commit().
+# See models/counters.py for how the increments are applied (atomic in SQL, or buffered per worker).
 def update_stats_comments_total():
-    stats = Blog_Stats.query.get_or_404(1)
-    modify_stats = int(stats.comments_total) + 1
-    stats.comments_total = modify_stats
-    db.session.commit()
+    increment_stat("comments_total", 1)
 
 # note that default users will not be added to the stats
 def update_stats_users_total():
@@ -27,10 +33,7 @@ def update_stats_users_total():
     Counts number of users who created an account. Does not take into acount users who deleted their accounts.
     This function updates the blog statistics database.
     """
-    stats = Blog_Stats.query.get_or_404(1)
-    modify_stats = int(stats.user_total) + 1
-    stats.user_total = modify_stats
-    db.session.commit()
+    increment_stat("user_total", 1)
     
 # note that default users will not be added to the stats
 def update_stats_users_active(num):
@@ -39,14 +42,7 @@ def update_stats_users_active(num):
     This function updates the blog statistics database.
     """
     if num == -1 or num == 1:
-        stats = Blog_Stats.query.get_or_404(1)
-        if num == 1:
-            modify_stats = int(stats.user_active_total) + 1
-            stats.user_active_total = modify_stats
-        else:
-            modify_stats = int(stats.user_active_total) - 1
-            stats.user_active_total = modify_stats
-        db.session.commit()
+        increment_stat("user_active_total", num)
     else:
         return print("Invalid arguments given to def update_stats_users_active function.")
 
@@ -57,15 +53,7 @@ def update_likes(num):
     This function updates the blog statistics database.
     """
     if num == -1 or num == 1:
-        stats = Blog_Stats.query.get_or_404(1)
-        if num == 1:
-            modify_stats = int(stats.likes_total) + 1
-            stats.likes_total = modify_stats
-        else:
-            modify_stats = int(stats.likes_total) - 1
-            stats.likes_total = modify_stats
-            
-        db.session.commit()
+        increment_stat("likes_total", num)
     else:
         return print("Invalid arguments given to def update_likes function.")
 
@@ -76,14 +64,7 @@ def update_bookmarks(num):
     This function updates the blog statistics database.
     """
     if num == -1 or num == 1:
-        stats = Blog_Stats.query.get_or_404(1)
-        if num == 1:
-            modify_stats = int(stats.bookmarks_total) + 1
-            stats.bookmarks_total = modify_stats
-        else:
-            modify_stats = int(stats.bookmarks_total) - 1
-            stats.bookmarks_total = modify_stats
-        db.session.commit()
+        increment_stat("bookmarks_total", num)
     else:
         return print("Invalid arguments given to update_bookmarks function.")
     
@@ -95,17 +76,116 @@ def update_approved_post_stats(num):
     This function updates the blog statistics database.
     """
     if num == -1 or num == 1:
-        stats = Blog_Stats.query.get_or_404(1)
-        if num == 1:
-            modify_stats = int(stats.posts_approved) + 1
-            stats.posts_approved = modify_stats
-        else:
-            modify_stats = int(stats.posts_approved) - 1
-            stats.posts_approved = modify_stats
-        db.session.commit()
+        increment_stat("posts_approved", num)
     else:
         return print("Invalid arguments given to update_approved_post_stats function.")
 
+# Denormalized post counters (like_count, bookmark_count, comment_count, reply_count in Blog_Posts)
+POST_COUNTERS = {
+    "like_count": Blog_Likes,
+    "bookmark_count": Blog_Bookmarks,
+    "comment_count": Blog_Comments,
+    "reply_count": Blog_Replies,
+}
+
+def update_post_counter(post_id, counter, num):
+    """
+    Adds num (1 or -1) to one of the post counters: "like_count", "bookmark_count", "comment_count" or "reply_count".
+    The update is done in SQL (counter = counter + num) and is NOT committed: it belongs to the caller's transaction,
+    together with the like, bookmark, comment or reply being added or deleted.
+    """
+    if counter not in POST_COUNTERS:
+        raise ValueError(f"Unknown post counter: {counter}")
+    column = getattr(Blog_Posts, counter)
+    db.session.query(Blog_Posts).filter(Blog_Posts.id == post_id).update(
+        {column: column + num}, synchronize_session=False)
+
+def recount_post_counters():
+    """
+    Recomputes every post counter from the likes, bookmarks, comments and replies tables, with one grouped query
+    per table. Used to backfill the counters or repair them if they drifted.
+    Returns a dict with the number of posts having a non-zero value for each counter.
+    """
+    repaired = {}
+    for counter, model in POST_COUNTERS.items():
+        counts = db.session.query(model.post_id, func.count(model.id)).filter(
+            model.post_id.isnot(None)).group_by(model.post_id).all()
+
+        db.session.query(Blog_Posts).update({counter: 0}, synchronize_session=False)
+        if counts:
+            db.session.execute(
+                Blog_Posts.__table__.update().where(Blog_Posts.__table__.c.id == bindparam("post_id")).values(
+                    {counter: bindparam("total")}),
+                [{"post_id": post_id, "total": total} for post_id, total in counts]
+            )
+        repaired[counter] = len(counts)
+    db.session.commit()
+    return repaired
+
+# Like and bookmark toggles
+# A click deletes the user's like (or bookmark) if there is one and inserts it otherwise. The unique (user_id, post_id)
+# constraint makes the insert a no-op if a concurrent click of the same user inserted it first, in which case that row
+# is deleted instead: two fast clicks end up as like + unlike, never as a duplicate like. If a third click deleted it
+# in the meantime, nothing changes and the counters are left alone.
+# The post counter and the blog statistics are updated in SQL in the same transaction, which is committed once.
+Toggle_Result = namedtuple("Toggle_Result", ["active", "count"])
+
+def _insert_if_absent(model, **values):
+    """
+    INSERT ... ON CONFLICT DO NOTHING on SQLite and Postgres, a savepoint on other databases.
+    Returns True if the row was inserted.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        result = db.session.execute(insert(model.__table__).values(**values).on_conflict_do_nothing())
+        return result.rowcount == 1
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**values))
+        return True
+    except IntegrityError:
+        return False
+
+def _toggle_post_relation(model, counter, stats_column, user_id, post_id):
+    relation = db.session.query(model).filter(model.user_id == user_id, model.post_id == post_id)
+    if relation.delete(synchronize_session=False):
+        delta = -1
+    elif _insert_if_absent(model, user_id=user_id, post_id=post_id):
+        delta = 1
+    else:
+        # inserted by a concurrent click: delete it, unless yet another click already did (delta 0)
+        delta = -relation.delete(synchronize_session=False)
+
+    column = getattr(Blog_Posts, counter)
+    if delta:
+        db.session.query(Blog_Posts).filter(Blog_Posts.id == post_id).update(
+            {column: column + delta}, synchronize_session=False)
+    count = db.session.query(column).filter(Blog_Posts.id == post_id).scalar()
+    if count is None:
+        db.session.rollback()
+        return None
+    if delta:
+        increment_stat(stats_column, delta)
+    db.session.commit()
+    return Toggle_Result(delta == 1, count)
+
+def toggle_like(user_id, post_id):
+    """
+    Likes or un-likes a post in a single transaction.
+    Returns Toggle_Result(active, count): whether the user now likes the post and the post's new like_count,
+    or None if the post does not exist.
+    """
+    return _toggle_post_relation(Blog_Likes, "like_count", "likes_total", user_id, post_id)
+
+def toggle_bookmark(user_id, post_id):
+    """
+    Bookmarks or un-bookmarks a post in a single transaction.
+    Returns Toggle_Result(active, count): whether the user now has the post bookmarked and the post's new
+    bookmark_count, or None if the post does not exist.
+    """
+    return _toggle_post_relation(Blog_Bookmarks, "bookmark_count", "bookmarks_total", user_id, post_id)
+
 # deleting a comment
 # comments which have replies will be blocked instead of deleted.
 # they will present information as [deleted]
@@ -124,11 +204,12 @@ def delete_comment(commentId):
         replies = db.session.query(Blog_Replies).filter(
             Blog_Replies.comment_id == commentId).first()
         if replies:
-            the_comment.blocked = "TRUE"
+            the_comment.blocked = True
             the_comment.if_blocked = "[deleted]"
             db.session.commit()
         else:
             db.session.delete(the_comment)
+            update_post_counter(the_comment.post_id, "comment_count", -1)
             db.session.commit()
         return "success"
     else:
@@ -160,9 +241,10 @@ def delete_reply(replyId):
         # if reply is the latest comment, delete, if not, block
         if all_replies[0][0] == replyId:
             db.session.delete(the_reply)
+            update_post_counter(the_reply.post_id, "reply_count", -1)
             db.session.commit()
         else:
-            the_reply.blocked = "TRUE"
+            the_reply.blocked = True
             the_reply.if_blocked = "[deleted]"
             db.session.commit()
         return "success"
@@ -170,6 +252,37 @@ def delete_reply(replyId):
         print("You had an issue with the delete_reply function.")
         return 404
 
+# deleting a post
+# its likes, bookmarks, comments and replies are deleted with it, and it is removed from the search index
+def delete_post(post_id):
+    """
+    Takes the post ID. Deletes the post and everything attached to it, and updates the blog statistics.
+    Not committed: call db.session.commit() afterwards.
+    """
+    post = db.session.get(Blog_Posts, post_id)
+    if post is None:
+        return 404
+    for model, stats_column in ((Blog_Likes, "likes_total"), (Blog_Bookmarks, "bookmarks_total"),
+                                (Blog_Replies, None), (Blog_Comments, "comments_total")):
+        deleted = db.session.query(model).filter(model.post_id == post_id).delete(synchronize_session=False)
+        if deleted and stats_column:
+            increment_stat(stats_column, -deleted)
+    if post.admin_approved:
+        update_approved_post_stats(-1)
+    remove_post_from_index(post_id)
+    db.session.delete(post)
+    return "success"
+
+# blocking (or unblocking) a user blocks (or unblocks) all of their comments and replies
+def block_comments_replies(user_id, blocked):
+    """
+    Takes the user ID and True to block or False to unblock.
+    Not committed: call db.session.commit() afterwards.
+    """
+    for model in (Blog_Comments, Blog_Replies):
+        db.session.query(model).filter(model.user_id == user_id).update(
+            {model.blocked: blocked}, synchronize_session=False)
+
 # Change the authorship of all post
 def change_authorship_of_all_post(current_author_id, new_author_id):
     """
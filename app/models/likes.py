@@ -3,6 +3,12 @@ from datetime import datetime
 
 class Blog_Likes(db.Model):
     __tablename__ = "blog_likes"
+    # a user can like a post only once, see toggle_like in models/helpers.py
+    # the unique constraint also serves the lookups by user, the index the ones by post (counts, post deletion)
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "post_id", name="uq_blog_likes_user_post"),
+        db.Index("ix_blog_likes_post_user", "post_id", "user_id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date_submitted = db.Column(db.DateTime, default=datetime.utcnow)
     post_id = db.Column(db.Integer, db.ForeignKey('blog_posts.id'))
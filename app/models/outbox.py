@@ -0,0 +1,29 @@
+from app.extensions import db
+from datetime import datetime
+
+# Emails waiting to be sent (or already sent) by the outbox worker, see general_helpers/mailer.py
+# They are added in the same transaction as what triggered them (e.g. a Blog_Contact message),
+# so a message is never lost if the SMTP server is slow or down.
+# status can be: pending, sending, sent, or failed (gave up after OUTBOX_MAX_ATTEMPTS)
+
+class Blog_Outbox(db.Model):
+    __tablename__ = "blog_outbox"
+    # the worker picks the oldest pending messages that are due
+    __table_args__ = (db.Index("ix_blog_outbox_due", "status", "next_attempt_at", "id"),)
+    id = db.Column(db.Integer, primary_key=True)
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+    from_addr = db.Column(db.String(200))
+    to_addr = db.Column(db.String(200), nullable=False)
+    reply_to = db.Column(db.String(200))
+    subject = db.Column(db.String(300), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(500))
+    date_sent = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<Outbox {self.id}: {self.status} {self.subject}>"
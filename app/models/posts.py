@@ -1,8 +1,19 @@
 from app.extensions import db
+from app.models.flags import Boolean_Flag, flag_index_where
 from datetime import datetime
 
 class Blog_Posts(db.Model):
     __tablename__ = "blog_posts"
+    # the home feed, the theme listings and search only read approved posts, paged through date_to_post, id (keyset
+    # pagination): partial indexes holding the approved posts only. The dashboards list the posts awaiting approval.
+    # The admin table of the posts is sorted by title, id and searched by title prefix (lower(title), below).
+    __table_args__ = (
+        db.Index("ix_blog_posts_published_theme", "theme_id", "date_to_post", "id",
+                 **flag_index_where("admin_approved", True)),
+        db.Index("ix_blog_posts_published", "date_to_post", "id", **flag_index_where("admin_approved", True)),
+        db.Index("ix_blog_posts_pending", "author_id", **flag_index_where("admin_approved", False)),
+        db.Index("ix_blog_posts_title", "title", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date_submitted = db.Column(db.DateTime, default=datetime.utcnow)
     date_to_post = db.Column(db.DateTime, default=datetime.utcnow)
@@ -18,9 +29,15 @@ class Blog_Posts(db.Model):
     picture_alt = db.Column(db.String(200))
     meta_tag = db.Column(db.String(200))
     title_tag = db.Column(db.String(200))
-    admin_approved = db.Column(db.String(5), default="FALSE")
+    admin_approved = db.Column(Boolean_Flag, default=False, server_default=db.false(), nullable=False)
     # featured is not being used at the moment, in the future can be used to 'feature' a post on a top modal, or similar
-    featured = db.Column(db.String(5), default="FALSE")
+    featured = db.Column(Boolean_Flag, default=False, server_default=db.false(), nullable=False)
+    # denormalized counters, maintained in the same transaction as the likes, bookmarks, comments and replies
+    # use "flask recount-post-counters" to rebuild them
+    like_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    bookmark_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    comment_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    reply_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
     likes = db.relationship('Blog_Likes', backref='post')
     comments = db.relationship('Blog_Comments', backref='target_post')
     replies = db.relationship('Blog_Replies', backref='target_post')
@@ -30,3 +47,6 @@ class Blog_Posts(db.Model):
     
     def __repr__(self):
         return f"<Post {self.id}: {self.title}, Theme: {self.theme_id}>"
+
+
+db.Index("ix_blog_posts_title_lower", db.func.lower(Blog_Posts.title))
@@ -1,10 +1,13 @@
 from app.extensions import db
+from app.models.flags import Boolean_Flag, flag_index_where
 from flask_login import UserMixin
 from datetime import datetime
 
 
 class Blog_User(UserMixin, db.Model):
     __tablename__ = "blog_user"
+    # the about page lists the active (not blocked) authors
+    __table_args__ = (db.Index("ix_blog_user_active_type", "type", "id", **flag_index_where("blocked", False)),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, unique=True)
     email = db.Column(db.String(200), nullable=False, unique=True)
@@ -16,7 +19,7 @@ class Blog_User(UserMixin, db.Model):
         db.String(), default="Picture_default.jpg")
     # type can be: admin, super_admin, author, or user
     type = db.Column(db.String(100), nullable=False, default="user")
-    blocked = db.Column(db.String(5), default="FALSE")
+    blocked = db.Column(Boolean_Flag, default=False, server_default=db.false(), nullable=False)
     admin_notes = db.Column(db.Text)
     posts = db.relationship('Blog_Posts', backref='author')
     comments = db.relationship('Blog_Comments', backref='user')
@@ -26,3 +29,8 @@ class Blog_User(UserMixin, db.Model):
 
     def __repr__(self):
         return f"<User: {self.id} {self.name} {self.email}>"
+
+
+# the admin tables search the users by name or email prefix, whatever the case
+db.Index("ix_blog_user_name_lower", db.func.lower(Blog_User.name))
+db.Index("ix_blog_user_email_lower", db.func.lower(Blog_User.email))
@@ -169,4 +169,69 @@ function deleteCommentOrReply(event, postId, isComment, commentOrReplyId) {
                 deletedMsgP.firstElementChild.textContent = "Request failed."
             }
         })
-}
\ No newline at end of file
+}
+
+// Load more comments / replies in post.html
+// The button holds the cursor of the next page in its data-cursor attribute and is removed after the last page
+function commentOrReplyElement(item, isReply) {
+    let div = document.createElement("div");
+    div.classList.add("ALL-no-m-p", "ALL-comment", isReply ? "mb-1" : "mb-2");
+    div.id = isReply ? `reply-id-${item.id}` : `comment-id-${item.id}`;
+    let header = document.createElement("p");
+    header.classList.add("ALL-no-m-p", "ALL-grey");
+    let small = document.createElement("small");
+    let name = document.createElement("b");
+    name.textContent = item.user ? item.user.name : "";
+    small.appendChild(name);
+    small.append(` - ${new Date(item.date_submitted).toLocaleDateString("en-GB", { day: "2-digit", month: "long", year: "numeric" })}`);
+    header.appendChild(small);
+    let text = document.createElement("p");
+    text.classList.add("ALL-no-m-p");
+    text.textContent = item.text;
+    div.appendChild(header);
+    div.appendChild(text);
+    return div
+}
+
+function moreRepliesButton(postId, commentId, cursor) {
+    let button = document.createElement("button");
+    button.type = "button";
+    button.classList.add("btn", "btn-link", "ALL-grey", "ml-4");
+    button.dataset.cursor = cursor;
+    button.textContent = "Load more replies";
+    button.onclick = () => loadMoreReplies(button, postId, commentId);
+    return button
+}
+
+function loadMoreComments(button, postId) {
+    fetch(`/post/${postId}/comments?cursor=${encodeURIComponent(button.dataset.cursor)}`)
+        .then((res) => res.json())
+        .then((data) => {
+            let comments = document.getElementById("comments");
+            data["comments"].forEach((comment) => {
+                let div = commentOrReplyElement(comment, false);
+                let replies = document.createElement("div");
+                replies.classList.add("ml-4");
+                replies.id = `replies-${comment.id}`;
+                comment["replies"].forEach((reply) => replies.appendChild(commentOrReplyElement(reply, true)));
+                div.appendChild(replies);
+                if (comment["more_replies_cursor"]) {
+                    div.appendChild(moreRepliesButton(postId, comment.id, comment["more_replies_cursor"]));
+                }
+                comments.appendChild(div);
+            });
+            data["next_cursor"] ? button.dataset.cursor = data["next_cursor"] : button.remove();
+        })
+        .catch((e) => alert("Could not load more comments"));
+}
+
+function loadMoreReplies(button, postId, commentId) {
+    fetch(`/post/${postId}/comments/${commentId}/replies?cursor=${encodeURIComponent(button.dataset.cursor)}`)
+        .then((res) => res.json())
+        .then((data) => {
+            let replies = document.getElementById(`replies-${commentId}`);
+            data["replies"].forEach((reply) => replies.appendChild(commentOrReplyElement(reply, true)));
+            data["next_cursor"] ? button.dataset.cursor = data["next_cursor"] : button.remove();
+        })
+        .catch((e) => alert("Could not load more replies"));
+}
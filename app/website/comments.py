@@ -0,0 +1,123 @@
+from app.extensions import db
+from app.models.comments import Blog_Comments, Blog_Replies
+from app.general_helpers.pagination import keyset_paginate, encode_cursor
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from collections import namedtuple
+
+# Comment threads of a blog post
+# A page of comments (newest first) is loaded with its first replies (oldest first) in a bounded number of queries,
+# whatever the size of the thread:
+#   1. the page of comments
+#   2. their authors (selectinload)
+#   3. the first REPLIES_PER_COMMENT replies of every comment of the page, with the total number of replies of each
+#      comment, in a single windowed query
+#   4. the authors of those replies (selectinload)
+# The rest is loaded on demand through the "load more comments" / "load more replies" JSON endpoints,
+# which page with the same (date_submitted, id) cursors.
+
+COMMENTS_PER_PAGE = 25
+REPLIES_PER_COMMENT = 5
+REPLIES_PER_PAGE = 25
+
+Comment_Thread = namedtuple("Comment_Thread", ["comment", "replies", "more_replies_cursor"])
+Comments_Page = namedtuple("Comments_Page", ["threads", "next_cursor"])
+
+
+def _first_replies(comment_ids):
+    """
+    Returns {comment_id: ([replies], total number of replies)} for the given comments,
+    holding at most REPLIES_PER_COMMENT replies per comment.
+    """
+    if not comment_ids:
+        return {}
+
+    ranked = db.session.query(
+        Blog_Replies.id.label("reply_id"),
+        func.row_number().over(
+            partition_by=Blog_Replies.comment_id,
+            order_by=(Blog_Replies.date_submitted, Blog_Replies.id)
+        ).label("row_number"),
+        func.count(Blog_Replies.id).over(partition_by=Blog_Replies.comment_id).label("total")
+    ).filter(Blog_Replies.comment_id.in_(comment_ids)).subquery()
+
+    rows = db.session.query(Blog_Replies, ranked.c.total).join(
+        ranked, ranked.c.reply_id == Blog_Replies.id
+    ).filter(ranked.c.row_number <= REPLIES_PER_COMMENT).options(
+        selectinload(Blog_Replies.user)
+    ).order_by(Blog_Replies.comment_id, ranked.c.row_number).all()
+
+    replies = {}
+    for reply, total in rows:
+        replies.setdefault(reply.comment_id, ([], total))[0].append(reply)
+    return replies
+
+
+def load_comment_threads(post_id, cursor=None):
+    """
+    Returns a Comments_Page: the Comment_Thread of every comment of the page and the cursor of the next page.
+    """
+    query = db.session.query(Blog_Comments).filter(
+        Blog_Comments.post_id == post_id
+    ).options(selectinload(Blog_Comments.user))
+
+    page = keyset_paginate(query, [Blog_Comments.date_submitted, Blog_Comments.id],
+                           cursor=cursor, per_page=COMMENTS_PER_PAGE)
+
+    replies = _first_replies([comment.id for comment in page.rows])
+    threads = []
+    for comment in page.rows:
+        comment_replies, total = replies.get(comment.id, ([], 0))
+        more_replies_cursor = None
+        if total > len(comment_replies):
+            last = comment_replies[-1]
+            more_replies_cursor = encode_cursor([last.date_submitted, last.id], "next")
+        threads.append(Comment_Thread(comment, comment_replies, more_replies_cursor))
+
+    return Comments_Page(threads, page.next_cursor)
+
+
+def load_replies(post_id, comment_id, cursor=None):
+    """
+    Returns a Keyset_Page of the replies of a comment of the post, oldest first.
+    """
+    query = db.session.query(Blog_Replies).filter(
+        Blog_Replies.post_id == post_id,
+        Blog_Replies.comment_id == comment_id
+    ).options(selectinload(Blog_Replies.user))
+
+    return keyset_paginate(query, [Blog_Replies.date_submitted, Blog_Replies.id],
+                           cursor=cursor, per_page=REPLIES_PER_PAGE, descending=False)
+
+
+# JSON serialization for the load more endpoints
+def _text(comment_or_reply):
+    return comment_or_reply.if_blocked if comment_or_reply.blocked else comment_or_reply.text
+
+
+def _user_json(user):
+    if not user:
+        return None
+    return {"id": user.id, "name": user.name, "picture": user.picture}
+
+
+def reply_to_json(reply):
+    return {
+        "id": reply.id,
+        "comment_id": reply.comment_id,
+        "text": _text(reply),
+        "date_submitted": reply.date_submitted.isoformat(),
+        "user": _user_json(reply.user),
+    }
+
+
+def thread_to_json(thread):
+    comment = thread.comment
+    return {
+        "id": comment.id,
+        "text": _text(comment),
+        "date_submitted": comment.date_submitted.isoformat(),
+        "user": _user_json(comment.user),
+        "replies": [reply_to_json(reply) for reply in thread.replies],
+        "more_replies_cursor": thread.more_replies_cursor,
+    }
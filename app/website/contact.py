@@ -1,25 +1,23 @@
-import os  # getting .env variables
-from dotenv import load_dotenv  # getting .env variables
-import smtplib
+from app.general_helpers.mailer import queue_email
 
 # Email the Blog owner receives whenever a user sends a message through the contact form
+# The email is not sent during the request: it is added to the outbox in the same transaction as the Blog_Contact
+# message and sent by the outbox workers (general_helpers/mailer.py).
+# The account used to send it is set with the EMAIL_ADDRESS and EMAIL_PASSWORD variables of the .env file (see config.py)
 
-load_dotenv()  # used to get .env variables, where username and password for the email account are stored
-EMAIL = os.getenv('EMAIL_ADDRESS')# put your email here, used for the sender and receiver
-PASSWORD = os.getenv('EMAIL_PASSWORD')  # put your password here
-
-def send_email(form_user_name, form_user_email, form_user_message):
-    SUBJECT = f"Subject: Travel Blog New Message from {form_user_name}"
+def queue_contact_email(form_user_name, form_user_email, form_user_message):
+    """
+    Adds the contact email to the outbox, in the caller's transaction (not committed).
+    Call notify_outbox() once the transaction is committed.
+    Line breaks are removed from the name and email, which end up in the email headers.
+    """
+    form_user_name = " ".join(form_user_name.split())
+    form_user_email = "".join(form_user_email.split())
+    SUBJECT = f"Travel Blog New Message from {form_user_name}"
     MESSAGE = f"""\
 Contact name: {form_user_name}
 Contact email: {form_user_email}
 Message:
 {form_user_message}
     """
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com") as connection:
-            connection.login(EMAIL, PASSWORD)
-            connection.sendmail(from_addr=EMAIL, to_addrs=EMAIL,
-                                msg=f"{SUBJECT}\n\n{MESSAGE}")
-    except:
-        return "There was an error sending your message."
+    return queue_email(SUBJECT, MESSAGE, reply_to=form_user_email)
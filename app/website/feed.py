@@ -0,0 +1,151 @@
+from app.extensions import db
+from app.models.themes import Blog_Theme
+from app.models.posts import Blog_Posts
+from app.models.user import Blog_User
+from app.general_helpers.pagination import keyset_paginate
+from app.general_helpers.database import use_primary
+from flask import current_app
+from sqlalchemy import desc, func
+from collections import namedtuple
+from datetime import datetime
+import threading
+
+# Home page feed: the latest 3 approved posts of every theme, built with a single windowed query
+# and kept in a per-worker cache, keyed on the page cache content versions it is built from (FEED_VERSIONS, see
+# general_helpers/page_cache.py). These are shared by all the workers, so the cache is rebuilt when:
+#   - any worker calls bump_content_version() on one of them (post approved, disallowed, edited or deleted, theme
+#     added or deleted, user renamed or deleted)
+#   - one of them expires (PAGE_CACHE_MAX_AGE), or the next scheduled post reaches its date_to_post
+# Concurrent rebuilds are collapsed into a single flight: only one thread queries the database,
+# the others wait for it and reuse its result.
+
+POSTS_PER_THEME = 3
+FEED_VERSIONS = ["posts", "themes", "users"]
+
+# Plain records are cached instead of ORM objects, which are bound to the session of the request that loaded them
+Feed_Post = namedtuple("Feed_Post", [
+    "id", "title", "intro", "picture_v", "picture_h", "picture_s", "picture_alt",
+    "date_to_post", "theme_id", "theme", "author_name"
+])
+Home_Feed = namedtuple("Home_Feed", ["posts_themes", "posts_all", "forth_theme_post_ids"])
+
+# Theme listings (/all/<index>) are paginated with a cursor on (date_to_post, id), see general_helpers/pagination.py
+POSTS_PER_PAGE = 25
+INTRO_MAX_LENGTH = 300
+
+Listing_Post = namedtuple("Listing_Post", [
+    "id", "title", "intro", "picture_h", "picture_alt", "date_to_post", "author_name"
+])
+
+_feed_entry = None  # (version, expires, feed), replaced as a whole so readers never see a half-built entry
+_build_lock = threading.Lock()
+
+
+def _feed_version():
+    """
+    Returns the current tokens of the FEED_VERSIONS, which change whenever one of them is bumped in any worker.
+    """
+    versions = current_app.extensions["page_cache"].get_versions(FEED_VERSIONS)
+    return tuple(version["token"] for version in versions)
+
+
+def _fresh_feed(version):
+    """
+    Returns the cached feed if it was built for this version and no scheduled post went live since, else None.
+    """
+    entry = _feed_entry
+    if entry is None:
+        return None
+    entry_version, expires, feed = entry
+    if entry_version != version or (expires is not None and datetime.utcnow() >= expires):
+        return None
+    return feed
+
+
+def _query_home_feed(now):
+    """
+    Runs the windowed query and returns (Home_Feed, expires).
+    expires is the date_to_post of the next scheduled approved post, or None if no post is scheduled.
+    """
+    posts_themes = [(theme.theme, theme.picture, theme.id)
+                    for theme in db.session.query(Blog_Theme).order_by(Blog_Theme.id)]
+
+    ranked = db.session.query(
+        Blog_Posts.id.label("post_id"),
+        func.row_number().over(
+            partition_by=Blog_Posts.theme_id,
+            order_by=desc(Blog_Posts.date_to_post)
+        ).label("row_number")
+    ).filter(
+        Blog_Posts.admin_approved == db.true(),
+        Blog_Posts.date_to_post <= now
+    ).subquery()
+
+    rows = db.session.query(
+        Blog_Posts.id, Blog_Posts.title, Blog_Posts.intro,
+        Blog_Posts.picture_v, Blog_Posts.picture_h, Blog_Posts.picture_s, Blog_Posts.picture_alt,
+        Blog_Posts.date_to_post, Blog_Posts.theme_id, Blog_Theme.theme, Blog_User.name
+    ).join(ranked, ranked.c.post_id == Blog_Posts.id
+    ).join(Blog_Theme, Blog_Theme.id == Blog_Posts.theme_id
+    ).outerjoin(Blog_User, Blog_User.id == Blog_Posts.author_id
+    ).filter(ranked.c.row_number <= POSTS_PER_THEME
+    ).order_by(Blog_Posts.theme_id, ranked.c.row_number).all()
+
+    posts_all = [Feed_Post(*row) for row in rows]
+    forth_theme_post_ids = [post.id for post in posts_all if post.theme_id == 4]
+
+    expires = db.session.query(func.min(Blog_Posts.date_to_post)).filter(
+        Blog_Posts.admin_approved == db.true(),
+        Blog_Posts.date_to_post > now
+    ).scalar()
+
+    return Home_Feed(posts_themes, posts_all, forth_theme_post_ids), expires
+
+
+def get_home_feed():
+    """
+    Returns the Home_Feed (posts_themes, posts_all, forth_theme_post_ids) used by the home page,
+    from cache when it is still valid.
+    """
+    global _feed_entry
+    version = _feed_version()
+    feed = _fresh_feed(version)
+    if feed is not None:
+        return feed
+
+    with _build_lock:
+        # another thread may have rebuilt the feed while this one was waiting for the lock
+        feed = _fresh_feed(version)
+        if feed is not None:
+            return feed
+
+        use_primary()
+        feed, expires = _query_home_feed(datetime.utcnow())
+        _feed_entry = (version, expires, feed)
+        return feed
+
+
+def _listing_post(row):
+    intro = row.intro[:INTRO_MAX_LENGTH] + '...' if len(row.intro) > INTRO_MAX_LENGTH else row.intro
+    return Listing_Post(row.id, row.title, intro, row.picture_h, row.picture_alt, row.date_to_post, row.name)
+
+
+def get_posts_listing(theme_id, cursor=None):
+    """
+    Returns one Keyset_Page of approved and published posts, newest first, with their intros already truncated.
+    theme_id 0 lists the posts of all themes. cursor is the token of the page to show, None for the first page.
+    The post body is never loaded.
+    """
+    query = db.session.query(
+        Blog_Posts.id, Blog_Posts.title, Blog_Posts.intro, Blog_Posts.picture_h, Blog_Posts.picture_alt,
+        Blog_Posts.date_to_post, Blog_User.name
+    ).outerjoin(Blog_User, Blog_User.id == Blog_Posts.author_id
+    ).filter(
+        Blog_Posts.admin_approved == db.true(),
+        Blog_Posts.date_to_post <= datetime.utcnow()
+    )
+    if theme_id != 0:
+        query = query.filter(Blog_Posts.theme_id == theme_id)
+
+    return keyset_paginate(query, [Blog_Posts.date_to_post, Blog_Posts.id], cursor=cursor,
+                           per_page=POSTS_PER_PAGE, row_factory=_listing_post)
@@ -1,6 +1,10 @@
 from flask import Blueprint, render_template, request, jsonify, make_response
-from app.extensions import db
-from app.website.contact import send_email
+from app.extensions import db, page_cache
+from app.website.contact import queue_contact_email
+from app.general_helpers.mailer import notify_outbox
+from app.website.feed import get_home_feed, get_posts_listing
+from app.website.comments import load_comment_threads, load_replies, thread_to_json, reply_to_json
+from app.website.search import search_posts, search_result_to_json, RESULTS_PER_PAGE
 from app.models.contact import Blog_Contact
 from app.models.themes import Blog_Theme
 from app.models.posts import Blog_Posts
@@ -8,7 +12,9 @@ from app.models.user import Blog_User
 from app.models.likes import Blog_Likes
 from app.models.bookmarks import Blog_Bookmarks
 from app.models.comments import Blog_Comments, Blog_Replies
-from app.models.helpers import update_likes, update_bookmarks, delete_comment, delete_reply
+from app.models.helpers import update_post_counter, toggle_like, toggle_bookmark, delete_comment, delete_reply
+from app.general_helpers.page_cache import bump_content_version
+from app.general_helpers.rendering import render_page
 from flask_login import current_user
 from datetime import datetime
 from sqlalchemy import desc
@@ -16,60 +22,56 @@ from sqlalchemy import desc
 website = Blueprint('website', __name__, static_folder="../static", template_folder="../template")
 
 @website.route("/")
+@page_cache.cached(lambda: ["posts", "themes", "users"])
 def home():
-    posts_themes = [(theme.theme, theme.picture, theme.id) for theme in db.session.query(Blog_Theme).all()]
-    theme_ids = [theme[2] for theme in posts_themes]
-    
-    posts_all = []
-    forth_theme_post_ids = []
-    for theme_id in theme_ids:
-        query = db.session.query(Blog_Posts).filter(
-            Blog_Posts.admin_approved == "TRUE",
-            Blog_Posts.date_to_post <= datetime.utcnow(),
-            Blog_Posts.theme_id == theme_id
-        ).order_by(desc(Blog_Posts.date_to_post)).limit(3)
-        posts_all.append(query.all())
-        if theme_id == 4:
-            forth_theme_post_ids.extend([post.id for post in query])
-
-    posts_all = sum(posts_all, [])
-
-    return render_template('website/index.html', posts_all=posts_all, posts_themes=posts_themes,
-                           logged_in=current_user.is_authenticated, forth_theme_post_ids=forth_theme_post_ids)
+    feed = get_home_feed()
+
+    return render_template('website/index.html', posts_all=feed.posts_all, posts_themes=feed.posts_themes,
+                           logged_in=current_user.is_authenticated, forth_theme_post_ids=feed.forth_theme_post_ids)
 
 @website.route("/all/<int:index>")
+@page_cache.cached(lambda index: ["posts", "themes", "users"])
 def all(index):
     index = int(index)
-    all_blog_posts = None
     chosen_theme = ""
-    intros = []
 
     if index != 0:
         chosen_theme = db.session.query(Blog_Theme).filter_by(id=index).first().theme
-        all_blog_posts = db.session.query(Blog_Posts).filter(
-            Blog_Posts.theme_id == index,
-            Blog_Posts.admin_approved == "TRUE",
-            Blog_Posts.date_to_post <= datetime.utcnow()
-        ).order_by(desc(Blog_Posts.date_to_post)).limit(25)
-    else:
-        all_blog_posts = db.session.query(Blog_Posts).filter(
-            Blog_Posts.admin_approved == "TRUE",
-            Blog_Posts.date_to_post <= datetime.utcnow()
-        ).order_by(desc(Blog_Posts.date_to_post)).limit(25)
 
-    intros = [post.intro[:300] + '...' if len(post.intro) > 300 else post.intro for post in all_blog_posts]
+    page = get_posts_listing(index, request.args.get("cursor"))
 
-    return render_template('website/all_posts.html', all_blog_posts=all_blog_posts, chosen_theme=chosen_theme,
-                           intros=intros, logged_in=current_user.is_authenticated)
+    return render_page('website/all_posts.html', all_blog_posts=page.rows, chosen_theme=chosen_theme, index=index,
+                       next_cursor=page.next_cursor, prev_cursor=page.prev_cursor,
+                       logged_in=current_user.is_authenticated)
 
 @website.route("/about/")
+@page_cache.cached(lambda: ["users"])
 def about():
     authors_all = db.session.query(Blog_User).filter(
-        Blog_User.blocked == "FALSE", Blog_User.type == "author"
+        Blog_User.blocked == db.false(), Blog_User.type == "author"
     ).order_by(desc(Blog_User.id)).limit(25)
     
     return render_template('website/about.html', authors_all=authors_all, logged_in=current_user.is_authenticated)
 
+@website.route("/search")
+@page_cache.cached(lambda: ["posts"])
+def search():
+    query = request.args.get("q", "").strip()
+    page = request.args.get("page", 1, type=int)
+    results = search_posts(query, page) if query else []
+
+    return render_template('website/search.html', query=query, results=results, page=page,
+                           has_next=len(results) == RESULTS_PER_PAGE, logged_in=current_user.is_authenticated)
+
+@website.route("/search/json")
+@page_cache.cached(lambda: ["posts"])
+def search_json():
+    query = request.args.get("q", "").strip()
+    page = request.args.get("page", 1, type=int)
+    results = search_posts(query, page) if query else []
+
+    return jsonify({"query": query, "page": page, "results": [search_result_to_json(result) for result in results]})
+
 @website.route("/contact/", methods=['POST', 'GET'])
 def contact():
     if request.method == "POST":
@@ -81,9 +83,9 @@ def contact():
         
         try:
             db.session.add(new_contact)
+            queue_contact_email(contact_name, contact_email, contact_message)
             db.session.commit()
-            
-            send_email(contact_name, contact_email, contact_message)
+            notify_outbox()
             
             return render_template('website/contact.html', msg_sent=True, logged_in=current_user.is_authenticated)
         
@@ -93,14 +95,13 @@ def contact():
     return render_template('website/contact.html', msg_sent=False, logged_in=current_user.is_authenticated)
 
 @website.route("/post/<int:index>", methods=["GET", "POST"])
+@page_cache.cached(lambda index: [f"post:{index}", "themes", "users"])
 def blog_post(index):
     blog_post = db.session.query(Blog_Posts).filter(
         Blog_Posts.id == index,
-        Blog_Posts.admin_approved == "TRUE",
+        Blog_Posts.admin_approved == db.true(),
         Blog_Posts.date_to_post <= datetime.utcnow()
     ).order_by(Blog_Posts.date_submitted.desc()).first()
-    
-    post_likes = db.session.query(Blog_Likes).filter(Blog_Likes.post_id == index).all()
 
     user_liked = False
     user_bookmarked = False
@@ -122,17 +123,27 @@ def blog_post(index):
         if bookmark:
             user_bookmarked = True
 
-    comments = db.session.query(Blog_Comments).filter(
-        Blog_Comments.post_id == index
-    ).order_by(Blog_Comments.date_submitted.desc()).limit(25)
+    comments_page = load_comment_threads(index)
 
-    replies = db.session.query(Blog_Replies).filter(
-        Blog_Replies.post_id == index
-    ).order_by(Blog_Replies.date_submitted.asc()).limit(100)
+    return render_page('website/post.html', blog_posts=blog_post, logged_in=current_user.is_authenticated,
+                       comment_threads=comments_page.threads, comments_next_cursor=comments_page.next_cursor,
+                       user_liked=user_liked, user_bookmarked=user_bookmarked)
 
-    return render_template('website/post.html', blog_posts=blog_post, logged_in=current_user.is_authenticated,
-                           comments=comments, replies=replies, post_likes=post_likes, user_liked=user_liked,
-                           user_bookmarked=user_bookmarked)
+# Load more comments (with their first replies) of a post: JSON, paginated with the cursor given by the previous page
+@website.route("/post/<int:index>/comments")
+@page_cache.cached(lambda index: [f"post:{index}", "users"])
+def more_comments(index):
+    comments_page = load_comment_threads(index, request.args.get("cursor"))
+    return jsonify({"comments": [thread_to_json(thread) for thread in comments_page.threads],
+                    "next_cursor": comments_page.next_cursor})
+
+# Load more replies of a comment: JSON, paginated with the cursor given by the comment or the previous page
+@website.route("/post/<int:index>/comments/<int:comment_id>/replies")
+@page_cache.cached(lambda index, comment_id: [f"post:{index}", "users"])
+def more_replies(index, comment_id):
+    replies_page = load_replies(index, comment_id, request.args.get("cursor"))
+    return jsonify({"replies": [reply_to_json(reply) for reply in replies_page.rows],
+                    "next_cursor": replies_page.next_cursor})
 
 @website.route("/comment_post/<int:index>", methods=["POST"])
 def post_comment(index):
@@ -147,7 +158,9 @@ def post_comment(index):
             reply = Blog_Replies(
                 text=data['reply'], post_id=index, user_id=current_user.id, comment_id=int(data['commentId']))
             db.session.add(reply)
+            update_post_counter(index, "reply_count", 1)
             db.session.commit()
+            bump_content_version(f"post:{index}")
             
             return make_response(jsonify({"message": "Reply added"}), 200)
         
@@ -155,7 +168,9 @@ def post_comment(index):
             comment = Blog_Comments(
                 text=data['comment'], post_id=index, user_id=current_user.id)
             db.session.add(comment)
+            update_post_counter(index, "comment_count", 1)
             db.session.commit()
+            bump_content_version(f"post:{index}")
             
             return make_response(jsonify({"message": "Comment added"}), 200)
         
@@ -178,6 +193,7 @@ def post_delete_comment(index):
             res = delete_reply(int(data['replyId']))
             
             if res == "success":
+                bump_content_version(f"post:{index}")
                 return make_response(jsonify({"message": "Successfully deleted"}), 200)
             else:
                 return make_response(jsonify({"message": "Reply not found"}), 404)
@@ -186,6 +202,7 @@ def post_delete_comment(index):
             res = delete_comment(int(data['commentId']))
             
             if res == "success":
+                bump_content_version(f"post:{index}")
                 return make_response(jsonify({"message": "Successfully deleted"}), 200)
             else:
                 return make_response(jsonify({"message": "Comment not found"}), 404)
@@ -198,57 +215,20 @@ def post_delete_comment(index):
 
 @website.route("/like_post/<int:index>", methods=["POST"])
 def post_like(index):
-    post = db.session.query(Blog_Posts).filter_by(id=index).first()
+    result = toggle_like(current_user.id, index)
 
-    if not post:
+    if not result:
         return jsonify({"error": "Post does not exist"}, 400)
 
-    post_likes = db.session.query(Blog_Likes).filter(
-        Blog_Likes.post_id == index
-    ).all()
-
-    like = db.session.query(Blog_Likes).filter(
-        Blog_Likes.user_id == current_user.id,
-        Blog_Likes.post_id == index
-    ).first()
-
-    if like:
-        db.session.delete(like)
-        db.session.commit()
-        update_likes(-1)
-        has_liked = "false"
-    else:
-        like = Blog_Likes(user_id=current_user.id, post_id=index)
-        db.session.add(like)
-        db.session.commit()
-        update_likes(1)
-        has_liked = "true"
+    bump_content_version(f"post:{index}")
 
-    return jsonify({"likes": len(post_likes), "user_liked": has_liked})
+    return jsonify({"likes": result.count, "user_liked": "true" if result.active else "false"})
 
 @website.route("/bookmark_post/<int:index>", methods=["POST"])
 def post_bookmark(index):
-    post = db.session.query(Blog_Posts).filter_by(id=index).first()
+    result = toggle_bookmark(current_user.id, index)
 
-    if not post:
+    if not result:
         return jsonify({"error": "Post does not exist"}, 400)
 
-    bookmark = db.session.query(Blog_Bookmarks).filter(
-        Blog_Bookmarks.user_id == current_user.id,
-        Blog_Bookmarks.post_id == index
-    ).first()
-
-    if bookmark:
-        db.session.delete(bookmark)
-        db.session.commit()
-        update_bookmarks(-1)
-        has_bookmarked = "false"
-    else:
-        bookmark = Blog_Bookmarks(user_id=current_user.id, post_id=index)
-        db.session.add(bookmark)
-        db.session.commit()
-        update_bookmarks(1)
-        has_bookmarked = "true"
-
-    return jsonify({"user_bookmarked": has_bookmarked})
-
+    return jsonify({"user_bookmarked": "true" if result.active else "false"})
\ No newline at end of file
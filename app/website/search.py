@@ -0,0 +1,229 @@
+from app.extensions import db
+from app.models.posts import Blog_Posts
+from markupsafe import Markup, escape
+from sqlalchemy import text, literal, or_, bindparam, event
+from collections import namedtuple
+from datetime import datetime
+import html
+import re
+
+# Full-text search over the posts' title, intro, body and meta_tag
+# SQLite: an FTS5 virtual table (blog_posts_fts) whose rowid is the post id, ranked with bm25.
+# Postgres: a blog_posts_search table holding a weighted tsvector per post, with a GIN index, ranked with ts_rank_cd.
+# Other databases fall back to a LIKE search on the title and intro.
+#
+# The index tables are part of the schema: created and filled with the existing posts by migrations/v0006, and
+# created with blog_posts by db.create_all() on a new database (after_create event below). Requests never run DDL.
+# The index is kept in sync incrementally: index_post() when a post is submitted, edited or approved and
+# remove_post_from_index() when it is deleted, both in the caller's transaction.
+# Every post is indexed, approval and date_to_post are checked at query time.
+# "flask rebuild-search-index" recreates the whole index.
+
+RESULTS_PER_PAGE = 20
+# highlight markers, replaced by <mark> once the text has been escaped
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+Search_Result = namedtuple("Search_Result", ["id", "title", "snippet", "date_to_post", "rank"])
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _plain_text(body):
+    """
+    The body is CKEditor html: index its text only.
+    """
+    return html.unescape(re.sub(r"<[^>]+>", " ", body or ""))
+
+
+def create_search_index(connection):
+    """
+    Creates the search tables if they don't exist yet (migrations and db.create_all() only).
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS blog_posts_fts USING fts5("
+            "title, intro, body, meta_tag, tokenize = 'porter unicode61')"))
+    elif dialect == "postgresql":
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS blog_posts_search ("
+            "post_id INTEGER PRIMARY KEY REFERENCES blog_posts(id) ON DELETE CASCADE, document TSVECTOR NOT NULL)"))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_blog_posts_search_document ON blog_posts_search USING GIN (document)"))
+
+
+def drop_search_index(connection):
+    """
+    Drops the search tables, before blog_posts (db.drop_all()): a new blog_posts must not find a stale index.
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS blog_posts_fts"))
+    elif dialect == "postgresql":
+        connection.execute(text("DROP TABLE IF EXISTS blog_posts_search"))
+
+
+event.listen(Blog_Posts.__table__, "after_create", lambda target, connection, **kw: create_search_index(connection))
+event.listen(Blog_Posts.__table__, "before_drop", lambda target, connection, **kw: drop_search_index(connection))
+
+
+def _index_rows(connection, dialect, rows):
+    """
+    Writes (id, title, intro, body, meta_tag) rows to the index, replacing what was indexed for those posts.
+    connection is db.session or a Connection (migrations).
+    """
+    if not rows:
+        return
+    params = [{"id": row[0], "title": row[1] or "", "intro": row[2] or "", "body": _plain_text(row[3]),
+               "meta_tag": row[4] or ""} for row in rows]
+    if dialect == "sqlite":
+        connection.execute(text("DELETE FROM blog_posts_fts WHERE rowid = :id"), params)
+        connection.execute(text(
+            "INSERT INTO blog_posts_fts (rowid, title, intro, body, meta_tag) "
+            "VALUES (:id, :title, :intro, :body, :meta_tag)"), params)
+    elif dialect == "postgresql":
+        connection.execute(text(
+            "INSERT INTO blog_posts_search (post_id, document) VALUES (:id, "
+            "setweight(to_tsvector('english', :title), 'A') || setweight(to_tsvector('english', :intro), 'B') || "
+            "setweight(to_tsvector('english', :meta_tag), 'C') || setweight(to_tsvector('english', :body), 'D')) "
+            "ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document"), params)
+
+
+def index_post(post):
+    """
+    Adds or refreshes a post in the search index, in the caller's transaction (not committed).
+    The post must have an id: flush the session first for new posts.
+    """
+    _index_rows(db.session, _dialect(), [(post.id, post.title, post.intro, post.body, post.meta_tag)])
+
+
+def remove_post_from_index(post_id):
+    """
+    Removes a post from the search index, in the caller's transaction (not committed).
+    """
+    dialect = _dialect()
+    if dialect == "sqlite":
+        db.session.execute(text("DELETE FROM blog_posts_fts WHERE rowid = :id"), {"id": post_id})
+    elif dialect == "postgresql":
+        db.session.execute(text("DELETE FROM blog_posts_search WHERE post_id = :id"), {"id": post_id})
+
+
+def rebuild_search_index(batch_size=1000):
+    """
+    Empties and refills the search index from the posts table, reading the posts in batches.
+    Returns the number of posts indexed.
+    """
+    connection = db.session.connection()
+    create_search_index(connection)
+    indexed = index_all_posts(connection, batch_size)
+    db.session.commit()
+    return indexed
+
+
+def index_all_posts(connection, batch_size=1000):
+    """
+    Empties the search index and adds every post to it, reading the posts in batches, on a Connection (not
+    committed). Returns the number of posts indexed.
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        connection.execute(text("DELETE FROM blog_posts_fts"))
+    elif dialect == "postgresql":
+        connection.execute(text("TRUNCATE blog_posts_search"))
+    else:
+        return 0
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(text(
+            "SELECT id, title, intro, body, meta_tag FROM blog_posts WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": batch_size}).fetchall()
+        if not rows:
+            break
+        _index_rows(connection, dialect, rows)
+        indexed += len(rows)
+        last_id = rows[-1][0]
+    if dialect == "sqlite":
+        connection.execute(text("INSERT INTO blog_posts_fts (blog_posts_fts) VALUES ('optimize')"))
+    return indexed
+
+
+def _fts5_query(query):
+    """
+    Turns what the user typed into a safe FTS5 query: every word must match, the last one as a prefix.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _highlighted(value):
+    """
+    Escapes the text and turns the highlight markers into <mark> tags.
+    """
+    escaped = str(escape(value or ""))
+    return Markup(escaped.replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>"))
+
+
+def search_posts(query, page=1):
+    """
+    Returns up to RESULTS_PER_PAGE Search_Results (best match first) among approved and published posts,
+    with the matches of the title and of the snippet highlighted.
+    """
+    page = max(page, 1)
+    params = {"now": datetime.utcnow(), "limit": RESULTS_PER_PAGE, "offset": (page - 1) * RESULTS_PER_PAGE}
+    dialect = _dialect()
+
+    if dialect == "sqlite":
+        params["query"] = _fts5_query(query)
+        if not params["query"]:
+            return []
+        rows = db.session.execute(text(
+            "SELECT p.id, highlight(blog_posts_fts, 0, :start, :end) AS title, "
+            "snippet(blog_posts_fts, -1, :start, :end, '...', 24) AS snippet, p.date_to_post, "
+            "bm25(blog_posts_fts, 10.0, 5.0, 1.0, 2.0) AS rank "
+            "FROM blog_posts_fts JOIN blog_posts p ON p.id = blog_posts_fts.rowid "
+            "WHERE blog_posts_fts MATCH :query AND p.admin_approved = 1 AND p.date_to_post <= :now "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"
+        ).bindparams(bindparam("now", type_=db.DateTime)).columns(date_to_post=db.DateTime),
+            dict(params, start=_MARK_START, end=_MARK_END))
+    elif dialect == "postgresql":
+        params["query"] = query
+        rows = db.session.execute(text(
+            "SELECT p.id, ts_headline('english', p.title, q, :options_title) AS title, "
+            "ts_headline('english', p.intro, q, :options_snippet) AS snippet, p.date_to_post, "
+            "ts_rank_cd(s.document, q) AS rank "
+            "FROM blog_posts_search s JOIN blog_posts p ON p.id = s.post_id, "
+            "websearch_to_tsquery('english', :query) q "
+            "WHERE s.document @@ q AND p.admin_approved AND p.date_to_post <= :now "
+            "ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+        ).bindparams(bindparam("now", type_=db.DateTime)).columns(date_to_post=db.DateTime),
+            dict(params,
+                 options_title=f"StartSel={_MARK_START}, StopSel={_MARK_END}, HighlightAll=true",
+                 options_snippet=f"StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=35, MinWords=15"))
+    else:
+        pattern = f"%{query}%"
+        rows = db.session.query(
+            Blog_Posts.id, Blog_Posts.title, Blog_Posts.intro, Blog_Posts.date_to_post, literal(0)
+        ).filter(
+            Blog_Posts.admin_approved == db.true(),
+            Blog_Posts.date_to_post <= params["now"],
+            or_(Blog_Posts.title.ilike(pattern), Blog_Posts.intro.ilike(pattern))
+        ).order_by(Blog_Posts.date_to_post.desc()).limit(params["limit"]).offset(params["offset"])
+
+    return [Search_Result(row[0], _highlighted(row[1]), _highlighted(row[2]), row[3], row[4]) for row in rows]
+
+
+def search_result_to_json(result):
+    return {
+        "id": result.id,
+        "title": str(result.title),
+        "snippet": str(result.snippet),
+        "date_to_post": result.date_to_post.isoformat(),
+        "rank": result.rank,
+    }
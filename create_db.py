@@ -6,7 +6,7 @@ from app.models.posts import Blog_Posts
 from app.models.themes import Blog_Theme
 from app.models.stats import Blog_Stats
 from app.dummy_data import authors, posts, themes, comments
-from app.account.helpers import hash_password
+from app.account.helpers import hash_password, hash_passwords
 from app.models.helpers import update_stats_users_total, update_stats_users_active
 
 # Constants for admin, default author, and default user
@@ -88,20 +88,22 @@ def create_themes():
 # Function to create dummy user accounts
 def create_dummy_accounts():
     if not Blog_User.query.filter_by(type="dummy").first():
+        # hashed in parallel in the hashing pool
+        passwords = hash_passwords(["password123"] * len(authors.authors_data))
         for idx, author_data in enumerate(authors.authors_data):
             dummy_user = Blog_User(
                 name=author_data["name"],
                 email=f"{idx}@example.com",
-                password=hash_password("password123"),
+                password=passwords[idx],
                 type="dummy",
                 about=authors.authors_about,
                 picture=author_data["picture"]
             )
             db.session.add(dummy_user)
-        db.session.commit()
 
         update_stats_users_total()
         update_stats_users_active(1)
+        db.session.commit()
 
 # Function to create dummy posts
 def create_dummy_posts():
@@ -1,11 +1,11 @@
 from app import create_app
 from create_db import create_admin_acct, create_themes, create_dummie_accts, create_posts, create_comments, create_stats, create_likes_and_bookmarks, create_contact_db
-from app.extensions import db
+from app.migrations import upgrade_database
 
 app = create_app()
 
 with app.app_context():
-    db.create_all()
+    upgrade_database()
     create_admin_acct()
     create_themes()
     create_stats()
@@ -0,0 +1,96 @@
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.migrations import upgrade_database
+from app.models.stats import Blog_Stats
+from app.models.user import Blog_User
+from app.general_helpers.dataset import generate_dataset
+from app.website.search import rebuild_search_index
+from app.general_helpers.query_budget import QUERY_BUDGETS, query_budget
+from flask.testing import FlaskClient
+from werkzeug.exceptions import HTTPException
+from urllib.parse import urlsplit
+import pytest
+
+# Every app of the tests runs on its own SQLite file database (in a temporary directory), at the latest schema
+# version, with the background workers and the files written next to the code (static assets, caches) turned off.
+
+
+def _test_settings(directory):
+    return {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{directory / 'blog.db'}",
+        "SQLALCHEMY_REPLICA_URIS": [],
+        "WTF_CSRF_ENABLED": False,
+        "OUTBOX_WORKERS": 0,
+        "IMAGE_WORKERS": 1,
+        "STATIC_ASSETS_FINGERPRINT": False,
+        "JINJA_BYTECODE_CACHE_DIR": None,
+        "PAGE_CACHE_DIR": str(directory / "page_cache"),
+        "PAGE_CACHE_VERSION_DIR": str(directory / "page_cache_versions"),
+        "METRICS_DIR": None,
+        "SLOW_QUERY_LOG_FILE": None,
+        "PASSWORD_HASH_ITERATIONS": 1000,
+    }
+
+
+@pytest.fixture(scope="session")
+def make_app(tmp_path_factory):
+    """
+    Factory of apps on a new database: make_app(STATS_COUNTER_MODE="buffered", ...) overrides the test config.
+    """
+    def make_app(**settings):
+        directory = tmp_path_factory.mktemp("app")
+        config = type("Test_Config", (Config,), {**_test_settings(directory), **settings})
+        app = create_app(config)
+        with app.app_context():
+            upgrade_database()
+            db.session.add(Blog_Stats())
+            db.session.commit()
+        return app
+    return make_app
+
+
+@pytest.fixture(scope="session")
+def seeded_app(make_app):
+    """
+    App on a database holding a small synthetic dataset and an admin: enough rows for every page to list some, and
+    for SQLite to pick the plans it would pick in production.
+    """
+    app = make_app(PAGE_CACHE_ENABLED=False)
+    with app.app_context():
+        generate_dataset(users=300, posts=300, comments=2000, replies=2000, likes=5000, bookmarks=1000)
+        db.session.add(Blog_User(name="Test Admin", email="admin@test.test", password="-", type="admin"))
+        db.session.commit()
+        rebuild_search_index()
+    return app
+
+
+class Budgeted_Client(FlaskClient):
+    """
+    Test client failing the test (Query_Budget_Exceeded, with the statements grouped by shape) when a request runs
+    more queries than the QUERY_BUDGETS of its endpoint. Requests to endpoints without a budget are not counted.
+    Every request runs in a fresh app context, as in a real worker.
+    """
+
+    def open(self, *args, **kwargs):
+        path = args[0] if args and isinstance(args[0], str) else kwargs.get("path", "/")
+        method = kwargs.get("method", "GET")
+        try:
+            endpoint, _ = self.application.url_map.bind("localhost").match(urlsplit(path).path, method)
+        except HTTPException:
+            endpoint = None
+        budget = QUERY_BUDGETS.get(endpoint)
+        if budget is None:
+            return super().open(*args, **kwargs)
+        with self.application.app_context():
+            with query_budget(budget, label=f"{method} {path} [{endpoint}]"):
+                return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def budgeted_client(seeded_app):
+    """
+    Budgeted_Client of the seeded app.
+    """
+    return Budgeted_Client(seeded_app, seeded_app.response_class, use_cookies=True)
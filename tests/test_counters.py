@@ -0,0 +1,68 @@
+from app.extensions import db
+from app.models.counters import increment_stat, flush_stats
+from app.models.stats import Blog_Stats
+import threading
+import pytest
+
+# Concurrent increments of the blog statistics: none may be lost, in either counter mode (see models/counters.py).
+
+THREADS = 8
+INCREMENTS = 50
+
+
+def _increment_concurrently(app):
+    """
+    THREADS threads committing INCREMENTS likes_total increments each, every one in its own transaction.
+    """
+    start = threading.Barrier(THREADS)
+    errors = []
+
+    def worker():
+        with app.app_context():
+            start.wait()
+            try:
+                for _ in range(INCREMENTS):
+                    increment_stat("likes_total", 1)
+                    db.session.commit()
+            except Exception as e:
+                errors.append(e)
+                db.session.rollback()
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def _likes_total(app):
+    with app.app_context():
+        db.session.expire_all()
+        return db.session.get(Blog_Stats, 1).likes_total or 0
+
+
+@pytest.mark.parametrize("mode", ["atomic", "buffered"])
+def test_concurrent_increments_are_not_lost(make_app, mode):
+    # the periodic flush is left to the test: the buffered total is only checked after flush_stats()
+    app = make_app(STATS_COUNTER_MODE=mode, STATS_FLUSH_INTERVAL=3600)
+    before = _likes_total(app)
+
+    _increment_concurrently(app)
+    if mode == "buffered":
+        assert _likes_total(app) == before
+        flush_stats()
+
+    assert _likes_total(app) == before + THREADS * INCREMENTS
+
+
+def test_rolled_back_increments_are_not_counted(make_app):
+    app = make_app(STATS_COUNTER_MODE="buffered", STATS_FLUSH_INTERVAL=3600)
+    before = _likes_total(app)
+    with app.app_context():
+        increment_stat("likes_total", 1)
+        db.session.rollback()
+        increment_stat("likes_total", 1)
+        db.session.commit()
+    flush_stats()
+    assert _likes_total(app) == before + 1
@@ -0,0 +1,45 @@
+from app.extensions import db
+from app.general_helpers.dataset import generate_dataset
+from app.general_helpers.database import replicate_sqlite
+from app.general_helpers.page_cache import Filesystem_Cache_Backend, Page_Cache, bump_content_version
+from app.models.user import Blog_User
+from app.website.feed import get_home_feed
+
+# The cached home feed (website/feed.py) is keyed on the shared content versions, so a write handled by another
+# worker, which only bumps them, makes it stale too. Like every page cache fill, it is built from the primary database.
+
+
+def test_feed_is_rebuilt_when_another_worker_bumps_its_versions(make_app):
+    app = make_app()
+    with app.app_context():
+        generate_dataset(users=20, themes=4, posts=40, comments=0, replies=0, likes=0, bookmarks=0)
+        db.session.commit()
+        post = get_home_feed().posts_all[0]
+        author = db.session.query(Blog_User).filter(Blog_User.name == post.author_name).first()
+        author.name = "Renamed Author"
+        db.session.commit()
+        assert get_home_feed().posts_all[0].author_name == post.author_name
+
+        # another worker only shares the version directory with this one
+        other_worker = Page_Cache()
+        other_worker.versions = Filesystem_Cache_Backend(app.config["PAGE_CACHE_VERSION_DIR"])
+        other_worker.bump("users")
+        assert get_home_feed().posts_all[0].author_name == "Renamed Author"
+
+
+def test_cached_pages_are_built_from_the_primary(make_app, tmp_path):
+    replica = tmp_path / "replica.db"
+    app = make_app(SQLALCHEMY_REPLICA_URIS=[f"sqlite:///{replica}"])
+    with app.app_context():
+        generate_dataset(users=20, themes=4, posts=40, comments=0, replies=0, likes=0, bookmarks=0)
+        db.session.commit()
+        replicate_sqlite(db.engine.url.database, [str(replica)])
+
+        # the replica lags behind this rename
+        db.session.query(Blog_User).update({Blog_User.name: "Renamed " + Blog_User.name}, synchronize_session=False)
+        db.session.commit()
+        bump_content_version("users")
+
+    client = app.test_client()
+    for page in ("/", "/all/0"):
+        assert b"by Renamed " in client.get(page).data, page
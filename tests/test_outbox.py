@@ -0,0 +1,90 @@
+from app.extensions import db
+from app.general_helpers.mailer import drain_outbox
+from app.models.contact import Blog_Contact
+from app.models.outbox import Blog_Outbox
+import socket
+import pytest
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+# The outbox worker (general_helpers/mailer.py) against a local aiosmtpd server: contact form messages are saved and
+# sent once, and a malformed message fails for good without holding back the rest of the outbox.
+
+
+class _Recorder:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    recorder = _Recorder()
+    controller = aiosmtpd_controller.Controller(recorder, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield controller, recorder
+    controller.stop()
+
+
+def _mail_app(make_app, controller, **settings):
+    return make_app(MAIL_SERVER=controller.hostname, MAIL_PORT=controller.port, MAIL_USE_SSL=False,
+                    MAIL_USERNAME="blog@test.test", MAIL_PASSWORD=None, **settings)
+
+
+def _contact(app, name, email="reader@test.test", message="Hello"):
+    return app.test_client().post("/contact/", data={"contact_name": name, "contact_email": email,
+                                                    "contact_message": message})
+
+
+def test_contact_emails_are_sent_once(make_app, smtp_server):
+    controller, recorder = smtp_server
+    app = _mail_app(make_app, controller)
+    for i in range(3):
+        assert _contact(app, f"Reader {i}").status_code == 200
+    with app.app_context():
+        assert drain_outbox() == (3, 0)
+        assert drain_outbox() == (0, 0)
+        assert {message.status for message in Blog_Outbox.query} == {"sent"}
+    assert len(recorder.messages) == 3
+    assert all(message.rcpt_tos == ["blog@test.test"] for message in recorder.messages)
+
+
+def test_line_breaks_are_removed_from_the_headers(make_app, smtp_server):
+    controller, recorder = smtp_server
+    app = _mail_app(make_app, controller)
+    assert _contact(app, "Reader\r\nBcc: victim@test.test", email="reader@test.test\r\n").status_code == 200
+    with app.app_context():
+        assert drain_outbox() == (1, 0)
+    assert recorder.messages[0].rcpt_tos == ["blog@test.test"]
+    assert b"Travel Blog New Message from Reader Bcc: victim@test.test" in recorder.messages[0].content
+
+
+def test_malformed_message_fails_without_blocking_the_outbox(make_app, smtp_server):
+    controller, recorder = smtp_server
+    app = _mail_app(make_app, controller)
+    with app.app_context():
+        db.session.add(Blog_Outbox(from_addr="blog@test.test", to_addr="blog@test.test", subject="Bad\r\nheader",
+                                   body="-"))
+        db.session.add(Blog_Outbox(from_addr="blog@test.test", to_addr="blog@test.test", subject="Good", body="-"))
+        db.session.commit()
+        assert drain_outbox() == (1, 1)
+        statuses = {message.subject: message.status for message in Blog_Outbox.query}
+        assert statuses == {"Bad\r\nheader": "failed", "Good": "sent"}
+    assert len(recorder.messages) == 1
+
+
+def test_contact_is_saved_without_an_email_address(make_app):
+    app = make_app(MAIL_USERNAME=None)
+    assert _contact(app, "Reader").status_code == 200
+    with app.app_context():
+        assert Blog_Contact.query.count() == 1
+        assert Blog_Outbox.query.count() == 0
@@ -0,0 +1,40 @@
+from app.extensions import db
+from app.general_helpers.query_budget import query_budget, Query_Budget_Exceeded
+from app.general_helpers.query_plans import pages_to_check
+from app.models.user import Blog_User
+import pytest
+
+# Every page must stay within the query budget of its endpoint (QUERY_BUDGETS in general_helpers/query_budget.py):
+# an N+1 shows up as one more query per row listed.
+
+
+def test_query_budget_reports_repeated_shapes(seeded_app):
+    with seeded_app.app_context():
+        with pytest.raises(Query_Budget_Exceeded) as exceeded:
+            with query_budget(2, label="user lookups"):
+                for user_id in range(1, 6):
+                    db.session.get(Blog_User, user_id)
+    message = str(exceeded.value)
+    assert message.startswith("user lookups: 5 queries for a budget of 2")
+    assert "5 x SELECT ... FROM blog_user WHERE blog_user.id = ?" in message
+
+
+def test_pages_stay_within_their_query_budgets(seeded_app, budgeted_client):
+    with seeded_app.app_context():
+        pages = pages_to_check()
+
+    over = []
+    for description, user_id, path in pages:
+        with budgeted_client.session_transaction() as session:
+            session.clear()
+            if user_id is not None:
+                session["_user_id"] = str(user_id)
+                session["_fresh"] = True
+        try:
+            response = budgeted_client.get(path)
+        except Query_Budget_Exceeded as e:
+            over.append(f"{path} ({description}): {e}")
+        else:
+            # a page failing before its queries would pass its budget
+            assert response.status_code < 400, f"{path} ({description}): {response.status_code}"
+    assert not over, "\n\n".join(over)
@@ -0,0 +1,38 @@
+from app.extensions import db
+from app.general_helpers.query_plans import check_query_plans, explain, plan_problems
+
+# The queries of the website and account pages must be answered from an index (see general_helpers/query_plans.py).
+
+
+def _problems(statement):
+    """
+    plan_problems of the plan SQLite gives for the statement.
+    """
+    with db.engine.connect() as connection:
+        return plan_problems(explain(connection, statement), statement)
+
+
+def test_plan_problems(make_app):
+    with make_app().app_context():
+        assert _problems("SELECT * FROM blog_comments WHERE text = 'x'") == ["SCAN blog_comments"]
+        assert _problems("SELECT * FROM blog_posts AS p WHERE p.intro = 'x'") == ["SCAN p"]
+        assert _problems("SELECT * FROM blog_theme JOIN blog_comments c ON c.post_id = blog_theme.id") == ["SCAN c"]
+        assert _problems("SELECT * FROM blog_likes WHERE post_id = 1 AND user_id = 1") == []
+        assert _problems("SELECT * FROM blog_theme t") == []
+    assert plan_problems(["SCAN blog_posts USING INDEX ix_blog_posts_published"]) == []
+    assert plan_problems(["SEARCH c USING AUTOMATIC COVERING INDEX (post_id=?)"]) == [
+        "SEARCH c USING AUTOMATIC COVERING INDEX (post_id=?)"]
+
+
+def test_pages_do_not_scan_tables(seeded_app):
+    with seeded_app.app_context():
+        plans = check_query_plans()
+
+    # the check only means something if the pages ran their queries on the hot tables
+    statements = " ".join(plan.statement for plan in plans)
+    for table in ("blog_posts", "blog_comments", "blog_replies", "blog_likes", "blog_bookmarks", "blog_posts_fts"):
+        assert f"FROM {table}" in statements or f"JOIN {table}" in statements, f"no query on {table}"
+
+    failing = [plan for plan in plans if plan.problems]
+    assert not failing, "full table scans:\n" + "\n".join(
+        f"{plan.page}\n  {plan.statement}\n  " + "\n  ".join(plan.plan) for plan in failing)